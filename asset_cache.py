@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+
+import pygame
+
+# Persistent cache of decoded, scaled images
+# Decoding a PNG and scaling it to the size the game draws it at is the bulk
+# of image loading, and it gives the same result on every launch. The cache
+# stores the scaled RGBA pixels on disk keyed by a hash of the source file and
+# the target size, so warm starts just read the pixels back.
+#
+# Cache entries are named "<file>-<sha1>-<width>x<height>.rgba". Editing a
+# source image changes its hash, so stale entries are simply never looked up
+# again. To avoid re-hashing every file on every launch, the hash of each
+# source is remembered in index.json together with its size and mtime, and
+# only recomputed when those change. index.json is only read on the first
+# lookup, so a start that finds everything in the asset pack never opens it.
+
+ENTRY_HEADER = struct.Struct("<II") # width, height
+
+class AssetCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock = threading.Lock() # load() and store() are called from loader worker threads
+        self.index = None # source path -> {"size", "mtime_ns", "sha1"}, read on first use
+
+    def _load_index(self):
+        # Called with the lock held
+        if self.index is None:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError):
+                self.index = {}
+        return self.index
+
+    def source_hash(self, path):
+        """Returns the SHA-1 of the file at path, reusing the stored hash if the file hasn't changed."""
+        stat = os.stat(path)
+        with self.lock:
+            known = self._load_index().get(path)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha1"]
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        with self.lock:
+            self._load_index()[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": digest}
+        return digest
+
+    def entry_path(self, path, size):
+        return os.path.join(self.cache_dir, f"{os.path.basename(path)}-{self.source_hash(path)}-{size[0]}x{size[1]}.rgba")
+
+    def load(self, path, size):
+        """Returns the cached scaled image for path, or None if it isn't cached yet."""
+        try:
+            with open(self.entry_path(path, size), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < ENTRY_HEADER.size:
+            return None # Empty or truncated entry, rebuild it
+        width, height = ENTRY_HEADER.unpack_from(data, 0)
+        pixels = memoryview(data)[ENTRY_HEADER.size:]
+        if len(pixels) != width * height * 4:
+            return None # Truncated entry, rebuild it
+        return pygame.image.frombuffer(pixels, (width, height), "RGBA")
+
+    def store(self, path, size, image):
+        """Saves a scaled image so the next launch can skip decoding it."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entry_path = self.entry_path(path, size)
+            temp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(ENTRY_HEADER.pack(*image.get_size()))
+                f.write(pygame.image.tobytes(image, "RGBA"))
+            os.replace(temp_path, entry_path) # Never leave a half-written entry behind
+            self.save_index()
+        except OSError as e:
+            print(f"Could not cache {path}: {e}")
+
+    def save_index(self):
+        with self.lock:
+            contents = json.dumps(self._load_index(), indent=1, sort_keys=True)
+            temp_path = f"{self.index_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(contents)
+            os.replace(temp_path, self.index_path)
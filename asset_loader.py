@@ -0,0 +1,125 @@
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+# Background asset loading
+# Image and sound files are decoded on a small thread pool so the main thread
+# can keep drawing frames. Finished assets are queued and handed back to the
+# main thread in poll(), which runs convert_alpha() (this needs the display,
+# so it must not happen on a worker) and then calls the asset's callback.
+#
+# Every asset belongs to a group ("core", "boss", ...) so the game can wait
+# for just the assets it needs right now and let the rest finish later.
+#
+# If an AssetPack is given, assets found in it are taken from the pack instead
+# of the loose files. Packed images are already decoded and scaled, so they skip
+# the worker pool entirely. Otherwise, if an AssetCache is given, scaled images
+# are read back from it and only decoded (and then cached) on a cache miss.
+
+class AssetLoader:
+    def __init__(self, max_workers=4, pack=None, cache=None):
+        self.pack = pack
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asset-loader")
+        self.finished = queue.Queue() # (group, path, asset, on_loaded, error) from the workers
+        self.total = {}   # group -> number of assets submitted
+        self.pending = {} # group -> number of assets not yet handed to the main thread
+        self.failed = []  # (path, error message) for assets that could not be loaded
+
+    def load_image(self, path, size, on_loaded, group="core"):
+        """Decodes an image (scaled to size if given) and calls on_loaded(surface) on the main thread."""
+        if self.pack is not None and self.pack.has_image(path, size):
+            self._count(group)
+            self.finished.put((group, path, self.pack.image(path, size), on_loaded, None))
+        else:
+            self._submit(group, path, on_loaded, self._decode_image, path, size)
+
+    def load_sound(self, path, on_loaded, group="core"):
+        """Decodes a sound file and calls on_loaded(sound) on the main thread."""
+        self._submit(group, path, on_loaded, pygame.mixer.Sound, self.open_file(path))
+
+    def load_generated(self, name, make, on_loaded, group="core"):
+        """Builds an asset in code by calling make() on a worker, then calls on_loaded(asset) on the main thread."""
+        self._submit(group, name, on_loaded, make)
+
+    def has_file(self, path):
+        return (self.pack is not None and self.pack.has_file(path)) or os.path.exists(path)
+
+    def open_file(self, path):
+        """Returns something pygame can load path from: the packed copy if there is one, else the path."""
+        if self.pack is not None and self.pack.has_file(path):
+            return self.pack.file(path)
+        return path
+
+    def _count(self, group):
+        self.total[group] = self.total.get(group, 0) + 1
+        self.pending[group] = self.pending.get(group, 0) + 1
+
+    def _submit(self, group, path, on_loaded, decode, *args):
+        self._count(group)
+        self.executor.submit(self._run, group, path, on_loaded, decode, args)
+
+    def _run(self, group, path, on_loaded, decode, args):
+        # Runs on a worker thread
+        try:
+            asset = decode(*args)
+            self.finished.put((group, path, asset, on_loaded, None))
+        except Exception as e: # Any decoder error (bad file, corrupt cache or pack) must still resolve the asset
+            self.finished.put((group, path, None, on_loaded, e))
+
+    def _decode_image(self, path, size):
+        if self.cache is not None and size is not None:
+            image = self.cache.load(path, size)
+            if image is not None:
+                return image
+        image = pygame.image.load(path)
+        if size is not None:
+            image = pygame.transform.scale(image, size)
+            if self.cache is not None:
+                self.cache.store(path, size, image)
+        return image
+
+    def poll(self):
+        """Hands finished assets to their callbacks. Must be called from the main thread."""
+        applied = 0
+        while True:
+            try:
+                item = self.finished.get_nowait()
+            except queue.Empty:
+                return applied
+            self._apply(*item)
+            applied += 1
+
+    def _apply(self, group, path, asset, on_loaded, error):
+        self.pending[group] -= 1
+        if error is not None:
+            self.failed.append((path, str(error)))
+            print(f"Could not load {path}: {error}")
+            return
+        if isinstance(asset, pygame.Surface) and pygame.display.get_surface() is not None:
+            asset = asset.convert_alpha() # Match the display format for fast blits
+        on_loaded(asset)
+
+    def is_done(self, *groups):
+        """True when every asset in the given groups (or in all groups if none given) has been handed over."""
+        groups = groups or tuple(self.pending)
+        return all(self.pending.get(group, 0) == 0 for group in groups)
+
+    def progress(self, *groups):
+        """Fraction (0.0 to 1.0) of the assets in the given groups that have been handed over."""
+        groups = groups or tuple(self.total)
+        total = sum(self.total.get(group, 0) for group in groups)
+        if total == 0:
+            return 1.0
+        pending = sum(self.pending.get(group, 0) for group in groups)
+        return (total - pending) / total
+
+    def wait(self, *groups):
+        """Blocks until the given groups are loaded (for tools that have no frame loop)."""
+        while not self.is_done(*groups):
+            self._apply(*self.finished.get())
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,137 @@
+import io
+import json
+import mmap
+import os
+import struct
+
+import pygame
+
+# Packed asset archive
+# A single file holding every game asset so startup does one open() instead of
+# one per loose file. Images are stored as raw RGBA pixels already scaled to
+# the size the game draws them at, and are mapped straight into Surfaces with
+# pygame.image.frombuffer(), so no PNG is decoded at runtime. Sounds and music
+# are stored as the original file bytes.
+#
+# Layout:
+#   header  - MAGIC, format version, index offset and length (see HEADER)
+#   data    - entry payloads, each starting on a DATA_ALIGNMENT boundary
+#   index   - JSON object: entry name -> {"kind", "offset", "length", ...}
+#
+# Image entries are named "<file>@<width>x<height>", sound and music entries
+# use the file name. Build a pack with `python shark-copy.py --build-asset-pack`.
+
+MAGIC = b"DXPK"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxQI") # magic, version, index offset, index length
+DATA_ALIGNMENT = 16
+PACK_FILE = "assets.pak"
+
+def image_entry_name(path, size):
+    name = os.path.basename(path)
+    if size is None:
+        return name
+    return f"{name}@{size[0]}x{size[1]}"
+
+class AssetPack:
+    """Read-only view of a pack file, memory-mapped for its whole lifetime."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_start, index_length = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError(f"{path} is not a version {VERSION} asset pack")
+        self.index = json.loads(bytes(self.data[index_start:index_start + index_length]).decode("utf-8"))
+
+    def has_image(self, path, size):
+        return image_entry_name(path, size) in self.index
+
+    def has_file(self, path):
+        return os.path.basename(path) in self.index
+
+    def _view(self, entry):
+        return memoryview(self.data)[entry["offset"]:entry["offset"] + entry["length"]]
+
+    def image(self, path, size):
+        """Returns a Surface that reads its pixels directly from the mapped file."""
+        entry = self.index[image_entry_name(path, size)]
+        return pygame.image.frombuffer(self._view(entry), tuple(entry["size"]), entry["format"])
+
+    def file(self, path):
+        """Returns the stored bytes of a sound or music file as a file-like object."""
+        return io.BytesIO(self._view(self.index[os.path.basename(path)]))
+
+    def close(self):
+        self.data.close()
+
+def open_asset_pack(path):
+    """Opens the pack at path, or returns None if there isn't a usable one."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return AssetPack(path)
+    except (OSError, ValueError) as e:
+        print(f"Could not open asset pack {path}: {e}")
+        return None
+
+class AssetPackBuilder:
+    """Collects assets through the same load_image()/load_sound() calls the game
+    makes on its AssetLoader, then writes them all to a pack file."""
+
+    def __init__(self):
+        self.images = {} # entry name -> (path, size)
+        self.files = {}  # entry name -> path
+
+    def load_image(self, path, size, on_loaded=None, group=None):
+        self.images[image_entry_name(path, size)] = (path, size)
+
+    def load_sound(self, path, on_loaded=None, group=None):
+        self.add_file(path)
+
+    def load_generated(self, name, make=None, on_loaded=None, group=None):
+        pass # Generated assets are cached by whatever builds them, not packed
+
+    def has_file(self, path):
+        return os.path.exists(path)
+
+    def add_file(self, path):
+        self.files[os.path.basename(path)] = path
+
+    def write(self, out_path):
+        index = {}
+        with open(out_path, "wb") as f:
+            f.write(bytes(HEADER.size)) # Filled in once the index position is known
+            for name, (path, size) in self.images.items():
+                try:
+                    image = pygame.image.load(path)
+                except (pygame.error, OSError) as e:
+                    print(f"Skipping {path}: {e}")
+                    continue
+                if size is not None:
+                    image = pygame.transform.scale(image, size)
+                pixels = pygame.image.tobytes(image, "RGBA")
+                index[name] = {"kind": "image", "size": list(image.get_size()), "format": "RGBA",
+                               "offset": _write_aligned(f, pixels), "length": len(pixels)}
+            for name, path in self.files.items():
+                if not os.path.exists(path):
+                    print(f"Skipping {path}: file not found")
+                    continue
+                with open(path, "rb") as source:
+                    contents = source.read()
+                index[name] = {"kind": "file", "offset": _write_aligned(f, contents), "length": len(contents)}
+
+            index_bytes = json.dumps(index, sort_keys=True).encode("utf-8")
+            index_offset = _write_aligned(f, index_bytes)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, index_offset, len(index_bytes)))
+        print(f"Wrote {len(index)} assets to {out_path} ({(index_offset + len(index_bytes)) // 1024} KB)")
+
+def _write_aligned(f, payload):
+    # Pads the file to the next DATA_ALIGNMENT boundary, writes payload there and returns its offset
+    offset = (f.tell() + DATA_ALIGNMENT - 1) // DATA_ALIGNMENT * DATA_ALIGNMENT
+    f.write(bytes(offset - f.tell()))
+    f.write(payload)
+    return offset
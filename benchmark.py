@@ -0,0 +1,332 @@
+import argparse
+import contextlib
+import gc
+import importlib.util
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # Headless: draw into an offscreen software surface
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from frame_profiler import percentile
+from level_file import LevelFileWriter
+
+# Scenario benchmarks
+# Runs scripted gameplay scenarios with fixed seeds and a fixed 60 fps time
+# step, and reports frames per second and per-phase timings (the same phases
+# as the F3 profiler overlay). Every scenario is run twice:
+#   sim    - update_gameplay() only
+#   render - update_gameplay() plus draw_gameplay() into a software surface
+#
+# Usage:
+#   python benchmark.py                    # all scenarios
+#   python benchmark.py --only boss        # scenarios whose name contains "boss"
+#   python benchmark.py --json results.json
+#
+# Before the scenarios it checks that resuming from an idle screen (the pause
+# menu sleeps between events) gives the first frame a normal time step.
+#
+# Sound is switched off while benchmarking; mixing happens on the audio
+# thread and would only add noise to the numbers.
+
+GAME_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shark-copy.py")
+BENCHMARK_SEED = 1234
+FRAME_MS = 1000 / 60
+DEFAULT_FRAMES = 300
+STRESS_FRAMES = 60 # The stress scenario is slow enough that fewer frames still give stable numbers
+STRESS_ENEMIES = 5000
+STRESS_COINS = 50000
+FLASHLIGHT_BRIGHTNESS_LEVELS = (0.0, 0.25, 0.5, 0.75, 1.0)
+RENDER_SCALES = (0.75, 0.5) # Full scale is what every other scenario runs at
+QUALITY_PRESETS = ("medium", "low") # Likewise for the "high" preset
+LARGE_WORLD_LEVEL = 10 # Not one of the game's levels
+LARGE_WORLD_SCREENS = 10 # Screens per side
+LARGE_WORLD_PILLAR_SPACING = 400
+LARGE_WORLD_COINS = 10000
+STREAMED_WORLD_LEVEL = 11
+STREAMED_WORLD_ENEMIES = 40 # Per chunk, about as dense as the large world
+STREAMED_WORLD_COINS = 80   # Likewise
+MAZE_SEED = 7
+MAZE_SIZE = (100, 100) # Cells, 10 x 13 screens
+IDLE_RESUME_WAIT_MS = 250 # As long as the game sleeps on an idle screen
+BENCHMARK_HEALTH = 10 ** 9 # Keeps the player (and boss) alive for the whole run
+MODES = ("sim", "render")
+
+def load_game():
+    spec = importlib.util.spec_from_file_location("lost_in_the_dark", GAME_FILE)
+    game = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(game)
+    return game
+
+@contextlib.contextmanager
+def quiet():
+    # The game prints on every hit, spawn and level change
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+class SimulatedClock:
+    """Stands in for the game's Clock so every frame advances timers by exactly one 60 fps step."""
+
+    def get_time(self):
+        return int(FRAME_MS)
+
+    def tick(self, framerate=0):
+        return int(FRAME_MS)
+
+class ScriptedKeys:
+    """Stands in for pygame.key.get_pressed(): walks right, down, left and up in turn."""
+
+    PATTERN = ((pygame.K_RIGHT,), (pygame.K_DOWN,), (pygame.K_LEFT,), (pygame.K_UP,))
+    STEP_FRAMES = 45
+
+    def __init__(self):
+        self.pressed = ()
+
+    def advance(self, frame):
+        self.pressed = self.PATTERN[(frame // self.STEP_FRAMES) % len(self.PATTERN)]
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+# --- Scenarios ---
+
+def start_level(game, level_num):
+    if game.level_stream is not None: # Left over from the streamed world
+        game.level_stream.shutdown()
+        game.level_stream = None
+    game.generated_level = None # Or from the maze
+    game.reset_game()
+    game.level = level_num
+    game.ensure_level_coins(level_num)
+    game.player_health = BENCHMARK_HEALTH
+    game.game_state = game.BOSS_FIGHT if level_num == 3 else game.PLAYING
+
+def setup_level(level_num):
+    return lambda game: start_level(game, level_num)
+
+def setup_boss_with_ghosts(game):
+    start_level(game, 3)
+    game.boss = game.Boss(game.WIDTH // 2 - 50, game.HEIGHT // 4, 3)
+    game.boss.health = game.boss.max_health = BENCHMARK_HEALTH
+    for i in range(game.MAX_HELPER_GHOSTS):
+        game.enemies.append(game.Enemy(game.boss.rect.centerx - 100 + i * 60, game.boss.rect.bottom + 40, 3))
+    game.last_ghost_spawn_time = 0
+
+def setup_stress(game):
+    start_level(game, 0)
+    game.enemies = [game.Enemy(random.randint(0, game.WIDTH - 30), random.randint(0, game.HEIGHT - 30), 0)
+                    for _ in range(STRESS_ENEMIES)]
+    game.clear_coins()
+    game.add_coins(game.generate_coins(0, STRESS_COINS))
+
+def setup_flashlight(brightness):
+    def setup(game):
+        start_level(game, 0)
+        game.game_settings["brightness"] = brightness
+    return setup
+
+def setup_render_scale(scale):
+    def setup(game):
+        start_level(game, 0)
+        game.game_settings["render_scale"] = scale
+    return setup
+
+def setup_quality(quality):
+    def setup(game):
+        setup_stress(game) # Enough enemies out of the light for the skipped updates to show
+        game.game_settings["quality"] = quality
+    return setup
+
+def setup_large_world(game):
+    # Draw cost should match a one-screen level however large the level is
+    width, height = game.WIDTH * LARGE_WORLD_SCREENS, game.HEIGHT * LARGE_WORLD_SCREENS
+    game.level_sizes[LARGE_WORLD_LEVEL] = (width, height)
+    walls = [pygame.Rect(0, 0, width, 20), pygame.Rect(0, height - 20, width, 20),
+             pygame.Rect(0, 0, 20, height), pygame.Rect(width - 20, 0, 20, height)]
+    walls += [pygame.Rect(x, y, 40, 40) for x in range(LARGE_WORLD_PILLAR_SPACING, width, LARGE_WORLD_PILLAR_SPACING)
+              for y in range(LARGE_WORLD_PILLAR_SPACING, height, LARGE_WORLD_PILLAR_SPACING)]
+    game.walls_by_level[LARGE_WORLD_LEVEL] = walls
+    game.level_indexes.pop(LARGE_WORLD_LEVEL, None)
+    start_level(game, LARGE_WORLD_LEVEL)
+    game.player.center = (width // 2 + 200, height // 2 + 200) # Between pillars
+    game.enemies = [game.Enemy(random.randint(0, width - 30), random.randint(0, height - 30), LARGE_WORLD_LEVEL)
+                    for _ in range(STRESS_ENEMIES)]
+    game.add_coins(game.generate_coins(LARGE_WORLD_LEVEL, LARGE_WORLD_COINS))
+
+def setup_streamed_world(game):
+    # The large world again, but read from a level file a few chunks at a time
+    width, height = game.WIDTH * LARGE_WORLD_SCREENS, game.HEIGHT * LARGE_WORLD_SCREENS
+    start = (width // 2 + 200, height // 2 + 200)
+    writer = LevelFileWriter(STREAMED_WORLD_LEVEL, (width, height), start)
+    for wall in ((0, 0, width, 20), (0, height - 20, width, 20), (0, 0, 20, height), (width - 20, 0, 20, height)):
+        writer.add_wall(wall)
+    for x in range(LARGE_WORLD_PILLAR_SPACING, width, LARGE_WORLD_PILLAR_SPACING):
+        for y in range(LARGE_WORLD_PILLAR_SPACING, height, LARGE_WORLD_PILLAR_SPACING):
+            writer.add_wall((x, y, 40, 40))
+    for chunk_x in range(0, width, writer.chunk_size):
+        for chunk_y in range(0, height, writer.chunk_size):
+            for _ in range(STREAMED_WORLD_ENEMIES):
+                x = random.randint(chunk_x, min(chunk_x + writer.chunk_size, width) - 30)
+                y = random.randint(chunk_y, min(chunk_y + writer.chunk_size, height) - 30)
+                writer.add_enemy(x, y, [(x, y), (x + 100, y), (x + 100, y + 100), (x, y + 100)] if random.random() < 0.25 else None)
+            writer.add_coins(chunk_x, chunk_y, STREAMED_WORLD_COINS)
+    path = os.path.join(tempfile.gettempdir(), "benchmark-streamed-world.lvl")
+    writer.write(path)
+
+    start_level(game, 0)
+    game.load_level_file(path)
+    game.reset_game() # Starts in the streamed level
+    game.player_health = BENCHMARK_HEALTH
+    game.game_state = game.PLAYING
+
+def setup_maze(game):
+    start_level(game, 0)
+    game.load_generated_level(MAZE_SEED, MAZE_SIZE)
+    game.reset_game() # Starts in the maze
+    game.player_health = BENCHMARK_HEALTH
+    game.game_state = game.PLAYING
+
+SCENARIOS = [(f"level-{n}", setup_level(n), DEFAULT_FRAMES) for n in range(4)]
+SCENARIOS.append(("boss-max-ghosts", setup_boss_with_ghosts, DEFAULT_FRAMES))
+SCENARIOS.append((f"stress-{STRESS_ENEMIES}-enemies-{STRESS_COINS}-coins", setup_stress, STRESS_FRAMES))
+SCENARIOS += [(f"flashlight-{b:.2f}", setup_flashlight(b), DEFAULT_FRAMES) for b in FLASHLIGHT_BRIGHTNESS_LEVELS]
+SCENARIOS += [(f"render-scale-{scale}", setup_render_scale(scale), DEFAULT_FRAMES) for scale in RENDER_SCALES]
+SCENARIOS.append((f"large-world-{LARGE_WORLD_SCREENS}x{LARGE_WORLD_SCREENS}-screens", setup_large_world, DEFAULT_FRAMES))
+SCENARIOS.append((f"streamed-world-{LARGE_WORLD_SCREENS}x{LARGE_WORLD_SCREENS}-screens", setup_streamed_world, DEFAULT_FRAMES))
+SCENARIOS.append((f"maze-{MAZE_SIZE[0]}x{MAZE_SIZE[1]}", setup_maze, DEFAULT_FRAMES))
+SCENARIOS += [(f"quality-{quality}-stress", setup_quality(quality), STRESS_FRAMES) for quality in QUALITY_PRESETS]
+
+# --- Checks ---
+
+def check_idle_resume(game):
+    """Returns how far the boss's timers advance on the first frame after sleeping on an idle screen
+    (resuming a boss fight from the pause screen). It should be one frame, not the time slept."""
+    saved_clock = game.clock
+    game.clock = pygame.time.Clock() # The real clock, the wait has to show up in it
+    try:
+        with quiet():
+            start_level(game, 3)
+            game.boss = game.Boss(game.WIDTH // 2 - 50, game.HEIGHT // 4, 3)
+            game.clock.tick(60)
+            pygame.event.clear()
+            game.wait_for_idle_event(IDLE_RESUME_WAIT_MS) # Nothing to wake it up headless, so the whole wait
+            game.clock.tick(60)
+            before = game.boss.state_timer
+            game.update_gameplay(10000, ScriptedKeys())
+            return game.boss.state_timer - before
+    finally:
+        game.clock = saved_clock
+
+# --- Runner ---
+
+def prepare(game):
+    """One-time setup shared by every scenario: display, sprites, no sound, fixed clock."""
+    game.init_display()
+    game.load_sprites()
+    with quiet():
+        game.get_asset_loader().wait()
+    game.game_settings["sound_enabled"] = False
+    game.clock = SimulatedClock()
+    game.frame_profiler.set_recording(True)
+
+def run_scenario(game, name, setup, frames, mode):
+    """Runs one scenario in one mode and returns its result dict."""
+    saved_settings = dict(game.game_settings)
+    random.seed(BENCHMARK_SEED)
+    with quiet():
+        setup(game)
+    random.seed(BENCHMARK_SEED)
+    keys = ScriptedKeys()
+    profiler = game.frame_profiler
+    render = mode == "render"
+    frame_times = []
+    phase_totals = {}
+    current_time = 10000 # Well past the start so no hit immunity or cooldown is active
+
+    gc.collect()
+    start = time.perf_counter()
+    with quiet():
+        for frame in range(frames):
+            keys.advance(frame)
+            profiler.begin_frame()
+            if game.game_state in (game.PLAYING, game.BOSS_FIGHT):
+                game.update_gameplay(current_time, keys)
+            if render:
+                game.draw_gameplay(current_time)
+                profiler.mark("ui")
+                pygame.display.flip()
+                profiler.mark("flip")
+            profiler.end_frame()
+            frame_times.append(profiler.last_frame_ms)
+            for phase, ms in profiler.last_frame.items():
+                phase_totals[phase] = phase_totals.get(phase, 0.0) + ms
+            current_time += int(FRAME_MS)
+    elapsed = time.perf_counter() - start
+
+    game.game_settings.clear()
+    game.game_settings.update(saved_settings)
+    return {
+        "scenario": name,
+        "mode": mode,
+        "frames": frames,
+        "fps": round(frames / elapsed, 1),
+        "avg_ms": round(sum(frame_times) / frames, 4),
+        "p99_ms": round(percentile(frame_times, 0.99), 4),
+        "phases": {phase: round(total / frames, 4) for phase, total in phase_totals.items()},
+    }
+
+def run_benchmarks(only=None, frames=None, modes=MODES, game=None):
+    """Runs every scenario whose name contains only (all if None). frames overrides each scenario's frame count."""
+    if game is None:
+        game = load_game()
+        prepare(game)
+    results = []
+    for name, setup, scenario_frames in SCENARIOS:
+        if only and only not in name:
+            continue
+        for mode in modes:
+            results.append(run_scenario(game, name, setup, frames or scenario_frames, mode))
+    return results
+
+def print_results(results):
+    print(f"{'scenario':<36}{'mode':<8}{'fps':>9}{'avg ms':>9}{'p99 ms':>9}  slowest phases")
+    for result in results:
+        slowest = sorted(result["phases"].items(), key=lambda item: item[1], reverse=True)[:3]
+        phases = ", ".join(f"{phase} {ms:.2f}" for phase, ms in slowest)
+        print(f"{result['scenario']:<36}{result['mode']:<8}{result['fps']:>9.1f}{result['avg_ms']:>9.3f}{result['p99_ms']:>9.3f}  {phases}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the scripted gameplay benchmarks")
+    parser.add_argument("--only", metavar="TEXT", help="only run scenarios whose name contains TEXT")
+    parser.add_argument("--frames", type=int, metavar="N", help="frames per scenario (overrides the defaults)")
+    parser.add_argument("--mode", choices=MODES, help="run only the sim or only the render variant")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    args = parser.parse_args()
+
+    game = load_game()
+    prepare(game)
+    resume_ms = check_idle_resume(game)
+    print(f"Idle resume: boss advanced {resume_ms} ms on the first frame after a {IDLE_RESUME_WAIT_MS} ms wait")
+    if resume_ms > 2 * FRAME_MS:
+        print("The idle wait leaked into the resumed frame's delta")
+        sys.exit(1)
+
+    results = run_benchmarks(args.only, args.frames, (args.mode,) if args.mode else MODES, game)
+    if not results:
+        print(f"No scenario matches '{args.only}'")
+        sys.exit(1)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print(f"Wrote {args.json}")
+
+if __name__ == "__main__":
+    main()
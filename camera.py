@@ -0,0 +1,146 @@
+import math
+from collections import OrderedDict
+
+import pygame
+
+# Camera and culling
+# Levels can be larger than the screen. The camera is a screen-sized rect in
+# world coordinates that follows the player (clamped to the level), and the
+# world View draws relative to its top-left corner. Nothing outside it needs
+# drawing, so the level's contents are kept in spatial grids:
+#   - SpatialGrid buckets rects into GRID_CELL_SIZE squares, so finding what
+#     overlaps the camera (or the player) only looks at the few cells it
+#     covers, however large the level is
+#   - ChunkCache renders the static part of the level (background, walls,
+#     doors, windows and their labels) into CHUNK_SIZE squares the first time
+#     they come into view and keeps the most recently used ones. A frame then
+#     blits a handful of chunk surfaces instead of redrawing every wall and
+#     re-rendering every label
+# Levels that fit on one screen behave exactly as before: the camera stays at
+# (0, 0) and the same few chunks are reused every frame.
+
+GRID_CELL_SIZE = 128
+CHUNK_SIZE = 256
+MAX_CHUNKS = 64
+
+class SpatialGrid:
+    """Uniform grid of rects. Items are any objects (kept by identity, so dicts and Rects work too);
+    each is listed in every cell its rect touches."""
+
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}      # (cx, cy) -> {id(item): item}, dicts so results keep insertion order
+        self.item_cells = {} # id(item) -> (x0, y0, x1, y1) range of cells it is listed in
+
+    def __len__(self):
+        return len(self.item_cells)
+
+    def __contains__(self, item):
+        return id(item) in self.item_cells
+
+    def _cell_range(self, rect):
+        size = self.cell_size
+        return rect[0] // size, rect[1] // size, (rect[0] + max(rect[2], 1) - 1) // size, (rect[1] + max(rect[3], 1) - 1) // size
+
+    def insert(self, item, rect):
+        cell_range = self._cell_range(rect)
+        self.item_cells[id(item)] = cell_range
+        x0, y0, x1, y1 = cell_range
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), {})[id(item)] = item
+
+    def remove(self, item):
+        cell_range = self.item_cells.pop(id(item), None)
+        if cell_range is None:
+            return
+        x0, y0, x1, y1 = cell_range
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is not None:
+                    cell.pop(id(item), None)
+                    if not cell:
+                        del self.cells[(cx, cy)]
+
+    def move(self, item, rect):
+        """Updates a moving item (inserting it if needed). Cheap when it stays within the same cells."""
+        if self.item_cells.get(id(item)) != self._cell_range(rect):
+            self.remove(item)
+            self.insert(item, rect)
+
+    def query(self, rect):
+        """Items whose cells overlap rect. May include items that are close to rect without touching it."""
+        x0, y0, x1, y1 = self._cell_range(rect)
+        cells = self.cells
+        if x0 == x1 and y0 == y1:
+            cell = cells.get((x0, y0))
+            return list(cell.values()) if cell else []
+        found = {}
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    found.update(cell)
+        return list(found.values())
+
+    def clear(self):
+        self.cells.clear()
+        self.item_cells.clear()
+
+class Camera:
+    def __init__(self, width, height):
+        self.rect = pygame.Rect(0, 0, width, height)
+
+    def follow(self, target, world_size):
+        """Centers on target, without showing anything outside the world (centered if the world is smaller)."""
+        self.rect.center = target.center
+        self.rect.clamp_ip(pygame.Rect(0, 0, *world_size))
+        return self.rect
+
+class ChunkCache:
+    """Prerendered CHUNK_SIZE squares of a static layer. draw_chunk(view, chunk_rect) draws one chunk
+    through a View positioned on it; the cache is emptied whenever the key passed to draw() changes."""
+
+    def __init__(self, draw_chunk, chunk_size=CHUNK_SIZE, max_chunks=MAX_CHUNKS):
+        self.draw_chunk = draw_chunk
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict() # (cx, cy) -> Surface, least recently used first
+        self.key = None
+        self.rendered = 0 # Chunks drawn since the last clear, for the curious
+
+    def clear(self):
+        self.chunks.clear()
+        self.rendered = 0
+
+    def discard(self, area):
+        """Drops the chunks overlapping area (world coordinates) so they are redrawn when next in view."""
+        size = self.chunk_size
+        for cx in range(area.left // size, (area.right - 1) // size + 1):
+            for cy in range(area.top // size, (area.bottom - 1) // size + 1):
+                self.chunks.pop((cx, cy), None)
+
+    def draw(self, view, area, key):
+        """Blits every chunk overlapping area (world coordinates) onto view, rendering missing ones."""
+        key = (key, view.scale)
+        if key != self.key:
+            self.clear()
+            self.key = key
+        size = self.chunk_size
+        x0, y0 = area.left // size, area.top // size
+        x1, y1 = (area.right - 1) // size, (area.bottom - 1) // size
+        pixels = math.ceil(size * view.scale) + 1 # One extra so rounding never leaves a gap between chunks
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                surface = self.chunks.get((cx, cy))
+                if surface is None:
+                    surface = pygame.Surface((pixels, pixels), 0, view.surface)
+                    self.draw_chunk(view.subview(surface, (cx * size, cy * size)), pygame.Rect(cx * size, cy * size, size, size))
+                    self.chunks[(cx, cy)] = surface
+                    self.rendered += 1
+                    if len(self.chunks) > self.max_chunks:
+                        self.chunks.popitem(last=False)
+                else:
+                    self.chunks.move_to_end((cx, cy))
+                view.surface.blit(surface, view.to_point((cx * size, cy * size)))
@@ -0,0 +1,76 @@
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Clearance field
+# How far every point of a level is from the nearest wall (or the edge of the
+# level), sampled at the center of each CLEARANCE_CELL x CLEARANCE_CELL cell.
+# It is built once per level, with NumPy, by taking for each wall the exact
+# distance from the cells around it to the wall's rect and keeping the
+# smallest value seen in every cell. Distances stop at MAX_CLEARANCE, which
+# is more than anything in the game asks about, so each wall only touches the
+# cells within that distance of it.
+#
+# Lookups are one array index:
+#   clearance(x, y) - distance to the nearest wall, accurate to within half a
+#                     cell diagonal (the distance from a point to its cell's center)
+#   is_clear(x, y, radius) - True if there is certainly no wall within radius;
+#                     False only means the field can't tell, so callers check
+#                     the nearby walls themselves (is_rect_clear() for a rect)
+#   gradient(x, y)  - the direction in which clearance grows, i.e. away from
+#                     the nearest walls
+# Without NumPy there is no field and callers check the walls directly.
+
+CLEARANCE_AVAILABLE = np is not None
+CLEARANCE_CELL = 10
+MAX_CLEARANCE = 120
+
+class ClearanceField:
+    def __init__(self, walls, size, cell=CLEARANCE_CELL, max_clearance=MAX_CLEARANCE):
+        width, height = size
+        self.cell = cell
+        self.cols, self.rows = math.ceil(width / cell), math.ceil(height / cell)
+        self.slack = cell * math.sqrt(0.5) # Furthest a point can be from its cell's center
+        xs = (np.arange(self.cols, dtype=np.float32) + 0.5) * cell
+        ys = (np.arange(self.rows, dtype=np.float32) + 0.5) * cell
+        # Indexed [y, x] so the flattened values run along rows
+        field = np.minimum(np.minimum(ys, height - ys)[:, None], np.minimum(xs, width - xs)[None, :])
+        np.minimum(field, max_clearance, out=field)
+        for wall in walls:
+            x0, x1 = max(0, int((wall.left - max_clearance) // cell)), min(self.cols, int((wall.right + max_clearance) // cell) + 1)
+            y0, y1 = max(0, int((wall.top - max_clearance) // cell)), min(self.rows, int((wall.bottom + max_clearance) // cell) + 1)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            dx = np.maximum(np.maximum(wall.left - xs[x0:x1], xs[x0:x1] - wall.right), 0.0)
+            dy = np.maximum(np.maximum(wall.top - ys[y0:y1], ys[y0:y1] - wall.bottom), 0.0)
+            region = field[y0:y1, x0:x1]
+            np.minimum(region, np.sqrt(dy[:, None] * dy[:, None] + dx[None, :] * dx[None, :]), out=region)
+        self.values = array("f", field.astype(np.float32).tobytes()) # Plain floats index much faster than NumPy scalars
+
+    def clearance(self, x, y):
+        col, row = int(x // self.cell), int(y // self.cell)
+        if not (0 <= col < self.cols and 0 <= row < self.rows): # Outside the level, use the nearest edge cell
+            col, row = min(max(col, 0), self.cols - 1), min(max(row, 0), self.rows - 1)
+        return self.values[row * self.cols + col]
+
+    def is_clear(self, x, y, radius):
+        return self.clearance(x, y) - self.slack > radius
+
+    def is_rect_clear(self, rect):
+        """is_clear() for the circle around rect."""
+        x, y, width, height = rect
+        return self.clearance(x + width / 2, y + height / 2) - self.slack > math.hypot(width, height) / 2
+
+    def gradient(self, x, y):
+        """Unit vector pointing away from the nearest walls, or (0.0, 0.0) where clearance is level."""
+        step = self.cell
+        gx = self.clearance(x + step, y) - self.clearance(x - step, y)
+        gy = self.clearance(x, y + step) - self.clearance(x, y - step)
+        length = math.hypot(gx, gy)
+        if length == 0:
+            return 0.0, 0.0
+        return gx / length, gy / length
@@ -0,0 +1,167 @@
+import time
+from collections import deque
+
+import pygame
+
+# Per-phase frame profiler
+# Works like StartupTimer, but for every frame: the main loop calls mark(phase)
+# after each phase, and the time since the previous mark is added to that
+# phase. Each frame's numbers go into a rolling window, from which the overlay
+# shows the average and 99th percentile of every phase plus a graph of recent
+# frame times.
+#
+# While the overlay is off (and nothing else, like the metrics recorder, has
+# asked for timings with set_recording()), begin_frame(), mark() and
+# end_frame() return straight away, so leaving the calls in the loop costs
+# almost nothing.
+#
+# Other tools can follow the phases by adding themselves to listeners. Each
+# listener gets begin_frame(), attribute(phase) after every mark and
+# end_frame(profiler) once the frame's timings are final.
+
+PROFILER_WINDOW = 240        # Frames kept for the averages, percentiles and graph
+PROFILER_REFRESH_FRAMES = 15 # Overlay text is re-rendered this often, not every frame
+FRAME_BUDGET_MS = 1000 / 60
+
+PROFILER_FONT_SIZE = 14
+PROFILER_BG_COLOR = (0, 0, 0, 180)
+PROFILER_TEXT_COLOR = (220, 220, 220)
+PROFILER_GRAPH_COLOR = (80, 200, 80)
+PROFILER_OVER_BUDGET_COLOR = (230, 70, 70)
+
+def percentile(values, fraction):
+    """Returns the value below which the given fraction of values fall (values need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class FrameProfiler:
+    def __init__(self, phases, window=PROFILER_WINDOW):
+        self.phases = list(phases) # Display order; phases first seen in mark() are added at the end
+        self.window = window
+        self.enabled = False # Overlay shown
+        self.recording = False # Timings wanted even with the overlay hidden
+        self.timing = False # enabled or recording
+        self.listeners = [] # See above (sampling profiler, watchdog)
+        self.history = {phase: deque(maxlen=window) for phase in self.phases} # phase -> ms per frame
+        self.frame_times = deque(maxlen=window) # Total ms of each profiled frame
+        self.current = {}
+        self.last_frame = {} # phase -> ms of the most recently finished frame
+        self.last_frame_ms = 0.0
+        self.frame_start = 0.0
+        self.last_time = 0.0
+        self.frames_since_refresh = PROFILER_REFRESH_FRAMES
+        self.lines = [] # Rendered text lines of the overlay
+        self.font = None # Monospaced so the columns line up, created on first draw
+        self.panel = None # Translucent background, rebuilt only when its size changes
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.timing = self.enabled or self.recording
+        if self.enabled:
+            # Start from a clean window so old numbers don't linger
+            for samples in self.history.values():
+                samples.clear()
+            self.frame_times.clear()
+            self.frames_since_refresh = PROFILER_REFRESH_FRAMES
+
+    def set_recording(self, recording):
+        self.recording = recording
+        self.timing = self.enabled or self.recording
+
+    def begin_frame(self):
+        if not self.timing:
+            return
+        for listener in self.listeners:
+            listener.begin_frame()
+        self.current.clear()
+        self.frame_start = self.last_time = time.perf_counter()
+
+    def mark(self, phase):
+        """Adds the time since the previous mark (or begin_frame) to phase."""
+        if not self.timing:
+            return
+        for listener in self.listeners:
+            listener.attribute(phase)
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + (now - self.last_time) * 1000
+        self.last_time = now
+
+    def end_frame(self):
+        if not self.timing or self.frame_start == 0.0:
+            return
+        self.last_frame = dict(self.current)
+        self.last_frame_ms = (self.last_time - self.frame_start) * 1000
+        for listener in self.listeners:
+            listener.end_frame(self)
+        if not self.enabled:
+            return # Only the recorder wants this frame, skip the overlay's history
+        for phase, ms in self.current.items():
+            if phase not in self.history:
+                self.phases.append(phase)
+                self.history[phase] = deque(maxlen=self.window)
+        for phase, samples in self.history.items():
+            samples.append(self.current.get(phase, 0.0)) # Phases skipped this frame count as 0
+        self.frame_times.append(self.last_frame_ms)
+        self.frames_since_refresh += 1
+
+    def draw(self, surface):
+        """Draws the overlay in the bottom-left corner of surface."""
+        if not self.enabled:
+            return
+        if self.font is None:
+            self.font = pygame.font.SysFont("dejavusansmono,couriernew,monospace", PROFILER_FONT_SIZE)
+        font = self.font
+        if self.frames_since_refresh >= PROFILER_REFRESH_FRAMES:
+            self._render_lines(font)
+            self.frames_since_refresh = 0
+        if not self.lines:
+            return
+
+        line_height = font.get_linesize()
+        graph_height = 60
+        width = max(max(line.get_width() for line in self.lines), self.window) + 16
+        height = len(self.lines) * line_height + graph_height + 24
+        x, y = 10, surface.get_height() - height - 10
+
+        if self.panel is None or self.panel.get_size() != (width, height):
+            self.panel = pygame.Surface((width, height), pygame.SRCALPHA)
+            self.panel.fill(PROFILER_BG_COLOR)
+        surface.blit(self.panel, (x, y))
+        for i, line in enumerate(self.lines):
+            surface.blit(line, (x + 8, y + 8 + i * line_height))
+
+        # Frame time graph, one column per frame, scaled so two frame budgets fill it
+        graph_bottom = y + height - 8
+        scale = graph_height / (FRAME_BUDGET_MS * 2)
+        for i, ms in enumerate(self.frame_times):
+            bar_height = min(graph_height, int(ms * scale))
+            color = PROFILER_OVER_BUDGET_COLOR if ms > FRAME_BUDGET_MS else PROFILER_GRAPH_COLOR
+            pygame.draw.line(surface, color, (x + 8 + i, graph_bottom), (x + 8 + i, graph_bottom - bar_height))
+        budget_y = graph_bottom - int(FRAME_BUDGET_MS * scale)
+        pygame.draw.line(surface, PROFILER_TEXT_COLOR, (x + 8, budget_y), (x + 8 + self.window, budget_y))
+
+    def _render_lines(self, font):
+        if not self.frame_times:
+            self.lines = []
+            return
+        average = sum(self.frame_times) / len(self.frame_times)
+        rows = [f"{'phase':<11}{'avg ms':>8}{'p99 ms':>8}",
+                f"{'frame':<11}{average:8.2f}{percentile(self.frame_times, 0.99):8.2f}"]
+        for phase in self.phases:
+            samples = self.history[phase]
+            if samples:
+                rows.append(f"{phase:<11}{sum(samples) / len(samples):8.2f}{percentile(samples, 0.99):8.2f}")
+        self.lines = [font.render(row, True, PROFILER_TEXT_COLOR) for row in rows]
+
+    def report(self):
+        """Prints the averages and 99th percentiles of the current window."""
+        if not self.frame_times:
+            return
+        print("--- Frame time breakdown ---")
+        for phase in self.phases:
+            samples = self.history[phase]
+            if samples:
+                print(f"  {phase:<12} avg {sum(samples) / len(samples):6.2f} ms  p99 {percentile(samples, 0.99):6.2f} ms")
+        print(f"  {'frame':<12} avg {sum(self.frame_times) / len(self.frame_times):6.2f} ms  p99 {percentile(self.frame_times, 0.99):6.2f} ms")
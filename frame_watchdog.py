@@ -0,0 +1,173 @@
+import gc
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+# Long-frame watchdog
+# Averages hide the odd 40 ms hitch (a music load, a slow dodge search, a GC
+# pause). The watchdog flags every frame that goes over budget and records
+# enough to find out why:
+#   - the loop phase that was running when the frame went over budget
+#   - the main thread's stack at that moment, captured by a background thread
+#     that checks the running frame a few times per budget
+#   - the last WATCHDOG_EVENT_LOG_SIZE game events (state changes, input,
+#     music, garbage collections...) from an in-memory ring buffer
+# Each long frame is appended as one JSON line to the dump file. The file is
+# written by the watchdog thread, so a spike never pays for disk I/O too.
+#
+# The watchdog is a FrameProfiler listener: phases are assigned lap-style, so
+# the phase running at capture time is the one marked next. Like the sampling
+# profiler, it lowers sys.setswitchinterval() while running so the main thread
+# hands over the GIL soon after the budget runs out, rather than up to 5 ms
+# later at the next C call.
+
+WATCHDOG_BUDGET_MS = 1000 / 60
+WATCHDOG_CHECKS_PER_BUDGET = 4
+WATCHDOG_EVENT_LOG_SIZE = 200
+
+def format_stack(frame):
+    lines = []
+    for entry in traceback.extract_stack(frame):
+        line = f"{os.path.basename(entry.filename)}:{entry.lineno} in {entry.name}"
+        lines.append(f"{line}: {entry.line}" if entry.line else line)
+    return lines
+
+class FrameWatchdog:
+    def __init__(self, dump_path, budget_ms=WATCHDOG_BUDGET_MS, thread_id=None):
+        self.dump_path = dump_path
+        self.budget_ms = budget_ms
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.start_time = time.perf_counter()
+        self.events = deque(maxlen=WATCHDOG_EVENT_LOG_SIZE) # (seconds since start, message)
+        self.lock = threading.Lock()
+        self.frame = 0
+        self.frame_start = None # perf_counter() when the running frame began, None between frames
+        self.capture = None # Stack captured while the running frame was over budget
+        self.long_frames = 0
+        self.worst_ms = 0.0
+        self.reports = queue.Queue() # Long frame records waiting to be written
+        self.running = False
+        self.thread = None
+        self.saved_switch_interval = None
+        self.gc_start = None
+        gc.callbacks.append(self._on_gc)
+
+    def log(self, message):
+        """Adds an entry to the recent events ring buffer."""
+        self.events.append((round(time.perf_counter() - self.start_time, 3), message))
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self.gc_start = time.perf_counter()
+        elif self.gc_start is not None:
+            ms = (time.perf_counter() - self.gc_start) * 1000
+            self.gc_start = None
+            self.log(f"gc generation {info['generation']}: {info['collected']} collected in {ms:.2f} ms")
+
+    def start(self):
+        self.saved_switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.saved_switch_interval, self.budget_ms / 1000 / WATCHDOG_CHECKS_PER_BUDGET))
+        self.running = True
+        self.thread = threading.Thread(target=self._watch_loop, name="frame-watchdog", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.saved_switch_interval is not None:
+            sys.setswitchinterval(self.saved_switch_interval)
+            self.saved_switch_interval = None
+        self._write_reports()
+        if self.long_frames:
+            print(f"Watchdog: {self.long_frames} frames over {self.budget_ms:.1f} ms (worst {self.worst_ms:.1f} ms), details in {self.dump_path}")
+
+    # --- Watchdog thread ---
+
+    def _watch_loop(self):
+        interval = self.budget_ms / 1000 / WATCHDOG_CHECKS_PER_BUDGET
+        while self.running:
+            time.sleep(interval)
+            with self.lock:
+                frame_id, start, captured = self.frame, self.frame_start, self.capture is not None
+            if start is not None and not captured:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if elapsed_ms > self.budget_ms:
+                    self._capture(frame_id, elapsed_ms)
+            self._write_reports()
+
+    def _capture(self, frame_id, elapsed_ms):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = format_stack(frame)
+        del frame
+        with self.lock:
+            if self.frame == frame_id and self.frame_start is not None:
+                self.capture = {"at_ms": round(elapsed_ms, 2), "phase": None, "stack": stack}
+
+    def _write_reports(self):
+        if self.reports.empty():
+            return
+        try:
+            directory = os.path.dirname(self.dump_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.dump_path, "a", encoding="utf-8") as f:
+                while True:
+                    try:
+                        report = self.reports.get_nowait()
+                    except queue.Empty:
+                        break
+                    f.write(json.dumps(report) + "\n")
+        except OSError as e:
+            print(f"Watchdog could not write {self.dump_path}: {e}")
+
+    # --- FrameProfiler listener ---
+
+    def begin_frame(self):
+        with self.lock:
+            self.frame += 1
+            self.capture = None
+            self.frame_start = time.perf_counter()
+
+    def attribute(self, phase):
+        capture = self.capture # Read once, the watchdog thread may set it at any moment
+        if capture is not None and capture["phase"] is None:
+            capture["phase"] = phase
+
+    def end_frame(self, profiler):
+        with self.lock:
+            self.frame_start = None
+            capture, self.capture = self.capture, None
+        duration_ms = profiler.last_frame_ms
+        if duration_ms <= self.budget_ms:
+            return
+
+        self.long_frames += 1
+        self.worst_ms = max(self.worst_ms, duration_ms)
+        phase_ms = {phase: round(ms, 3) for phase, ms in profiler.last_frame.items()}
+        if capture is not None and capture["phase"] is not None:
+            phase = capture["phase"]
+        else:
+            phase = max(phase_ms, key=phase_ms.get, default="unknown") # No stack in time, blame the slowest phase
+        self.log(f"long frame {self.frame}: {duration_ms:.1f} ms in {phase}")
+        self.reports.put({
+            "frame": self.frame,
+            "time": round(time.perf_counter() - self.start_time, 3),
+            "duration_ms": round(duration_ms, 2),
+            "budget_ms": round(self.budget_ms, 2),
+            "phase": phase,
+            "phase_ms": phase_ms,
+            "stack_at_ms": capture["at_ms"] if capture else None,
+            "stack": capture["stack"] if capture else None,
+            "recent_events": list(self.events),
+        })
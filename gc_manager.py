@@ -0,0 +1,164 @@
+import gc
+import time
+
+# Garbage collection scheduling
+# The game loop allocates Rects, Surfaces, lists and strings every frame, so
+# CPython's cyclic collector runs every few hundred frames, whenever its
+# allocation counters say so, including in the middle of a boss attack. Once
+# started, the manager switches automatic collection off and runs the same
+# collections itself at the end of a frame:
+#   - in idle states (menus, pause screen) whatever is due is collected
+#     straight away, and a full collection is run once on entering them
+#   - during gameplay a due collection only runs if the frame has enough
+#     budget left for it (judged from how long that generation took before);
+#     otherwise it waits for a later frame, unless so much has piled up that
+#     waiting any longer would let memory grow (GC_FORCE_FACTOR times the
+#     normal threshold). Full collections always wait for the next idle state
+#
+# Long-lived objects (sprites, level data, sounds) are moved out of the
+# collector's way with gc.freeze() after loading, so each collection only has
+# to look at objects created since. Freezing everything cleanly takes a full
+# collection first, so that only happens where a pause goes unnoticed (menus,
+# the loading screen, reset_game()); data created during gameplay is frozen
+# as it is, without collecting.
+#
+# Every collection, scheduled or not, is timed through gc.callbacks;
+# take_frame_stats() hands the numbers to the metrics stream.
+
+GC_FRAME_BUDGET_MS = 1000 / 60
+GC_SPARE_MARGIN_MS = 2.0 # Budget kept free on top of a collection's expected cost
+GC_FORCE_FACTOR = 4      # Collect regardless of budget once this many times over the threshold
+GC_INITIAL_ESTIMATE_MS = (0.1, 0.5, 5.0) # Expected cost per generation until one has been measured
+
+class GCManager:
+    def __init__(self, frame_budget_ms=GC_FRAME_BUDGET_MS):
+        self.frame_budget_ms = frame_budget_ms
+        self.started = False
+        self.frame_start = 0.0
+        self.was_idle = False
+        self.collection_start = None
+        self.freeze_pending = False
+        self.estimate_ms = list(GC_INITIAL_ESTIMATE_MS) # Recent cost of each generation
+
+        # Totals for the session
+        self.collections = [0, 0, 0]
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.deferred = 0 # Frames a due collection waited for spare budget
+        self.forced = 0   # Collections run without enough budget because too much had piled up
+
+        self._reset_frame_stats()
+
+    def _reset_frame_stats(self):
+        self.frame_stats = {"count": 0, "ms": 0.0, "collected": 0, "generation": -1, "deferred": 0}
+
+    def start(self):
+        """Takes over collection scheduling from the interpreter."""
+        if self.started:
+            return
+        self.started = True
+        gc.callbacks.append(self._on_gc)
+        gc.disable()
+
+    def stop(self):
+        if not self.started:
+            return
+        self.started = False
+        gc.callbacks.remove(self._on_gc)
+        gc.enable()
+
+    def freeze(self):
+        """Collects, then moves every surviving object out of future collections. This is a full
+        collection, so only call it where a pause won't be felt (menus, loading, reset_game())."""
+        if not self.started:
+            return
+        self.freeze_pending = False
+        gc.unfreeze() # Give previously frozen objects (e.g. the last level's) a chance to be freed
+        gc.collect()
+        gc.freeze()
+
+    def freeze_new(self):
+        """Moves the objects created since the last freeze out of future collections without collecting
+        first. Cheap enough for gameplay; any garbage frozen with them is freed by the next freeze()."""
+        if self.started:
+            gc.freeze()
+
+    def freeze_when_idle(self):
+        """Runs freeze() at the end of the next idle frame."""
+        self.freeze_pending = True
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self.collection_start = time.perf_counter()
+            return
+        if self.collection_start is None:
+            return
+        ms = (time.perf_counter() - self.collection_start) * 1000
+        self.collection_start = None
+        generation = info["generation"]
+        self.collections[generation] += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.estimate_ms[generation] = self.estimate_ms[generation] * 0.7 + ms * 0.3
+        stats = self.frame_stats
+        stats["count"] += 1
+        stats["ms"] += ms
+        stats["collected"] += info["collected"]
+        stats["generation"] = max(stats["generation"], generation)
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+
+    def end_frame(self, idle):
+        """Runs a due collection if the frame can afford it. idle is True in menus and on the pause screen."""
+        if not self.started:
+            return
+        if idle and self.freeze_pending:
+            self.freeze() # Collects as well
+        elif idle and not self.was_idle:
+            gc.collect() # Just entered a menu: clear out everything gameplay left behind
+        self.was_idle = idle
+
+        generation = self._due_generation()
+        if generation is None:
+            return
+        if idle:
+            gc.collect(generation)
+            return
+
+        generation = min(generation, 1) # Full collections wait for the next menu
+        spare_ms = self.frame_budget_ms - (time.perf_counter() - self.frame_start) * 1000
+        if spare_ms >= self.estimate_ms[generation] + GC_SPARE_MARGIN_MS:
+            gc.collect(generation)
+        elif gc.get_count()[0] >= gc.get_threshold()[0] * GC_FORCE_FACTOR:
+            self.forced += 1
+            gc.collect(generation) # Too much piled up, collect even without the budget
+        else:
+            self.deferred += 1
+            self.frame_stats["deferred"] += 1
+
+    def _due_generation(self):
+        """The generation the interpreter would collect now, or None if nothing is due."""
+        count0, count1, count2 = gc.get_count()
+        threshold0, threshold1, threshold2 = gc.get_threshold()
+        if count0 < threshold0:
+            return None
+        if count2 >= threshold2 and threshold2 > 0:
+            return 2
+        if count1 >= threshold1:
+            return 1
+        return 0
+
+    def take_frame_stats(self):
+        """Returns the collections since the previous call (for the metrics stream) and starts counting again."""
+        stats = self.frame_stats
+        stats["ms"] = round(stats["ms"], 3)
+        self._reset_frame_stats()
+        return stats
+
+    def report(self):
+        if not any(self.collections):
+            return
+        print(f"GC: {self.collections[0]}/{self.collections[1]}/{self.collections[2]} collections (gen 0/1/2), "
+              f"{self.total_ms:.1f} ms total, worst {self.max_ms:.2f} ms, "
+              f"{self.deferred} deferred, {self.forced} forced, {gc.get_freeze_count()} objects frozen")
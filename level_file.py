@@ -0,0 +1,259 @@
+import json
+import mmap
+import queue
+import re
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+# Chunked level files
+# A level stored as a grid of square chunks, so a world much larger than the
+# screen (or than is worth keeping in memory) can be loaded piece by piece.
+# Each chunk holds CHUNK_TILES x CHUNK_TILES wall tiles plus the doors,
+# windows, enemy spawns (with their patrol routes) and coin budget that fall
+# inside it. Chunks with nothing in them are not stored at all.
+#
+# Layout (the same framing as asset packs):
+#   header - MAGIC, format version, index offset and length (see HEADER)
+#   data   - one zlib-compressed JSON payload per chunk
+#   index  - JSON object: level number, size, tile size, chunk size in tiles,
+#            player start and "cx,cy" -> [offset, length] of every stored chunk
+#
+# Chunk payload:
+#   tiles   - rows of WALL_TILE and FLOOR_TILE characters
+#   doors   - the game's door dicts, with "rect" as [x, y, width, height]
+#   windows - likewise
+#   enemies - {"pos": [x, y], "patrol": [[x, y], ...] or null}
+#   coins   - how many coins to scatter over the chunk
+# Positions are world pixels. Doors, windows and spawns belong to the chunk
+# their position falls in.
+#
+# ChunkStreamer keeps the chunks around a point loaded: missing ones are read
+# and decoded on a worker thread and handed to the main thread in poll() (like
+# AssetLoader), and chunks that have fallen out of range are evicted.
+
+MAGIC = b"DXLV"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxQI") # magic, version, index offset, index length
+TILE_SIZE = 20
+CHUNK_TILES = 32 # 640 pixel chunks
+WALL_TILE, FLOOR_TILE = "#", "."
+LOAD_RADIUS = 1 # Chunks loaded on every side of the one the player is in...
+KEEP_RADIUS = 2 # ...and evicted once further away than this, so walking along a border doesn't reload them
+
+class LevelChunk:
+    """One decoded chunk; walls are merged into as few Rects as practical."""
+
+    def __init__(self, coords, rect, walls, doors, windows, enemies, coins):
+        self.coords = coords
+        self.rect = rect
+        self.walls = walls
+        self.doors = doors
+        self.windows = windows
+        self.enemies = enemies # (x, y, patrol points or None)
+        self.coins = coins
+
+class LevelFile:
+    """Read-only view of a level file, memory-mapped for its whole lifetime. Chunks can be read from any thread."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_start, index_length = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError(f"{path} is not a version {VERSION} level file")
+        index = json.loads(bytes(self.data[index_start:index_start + index_length]).decode("utf-8"))
+        self.level = index["level"]
+        self.size = tuple(index["size"])
+        self.start = tuple(index["start"])
+        self.tile_size = index["tile_size"]
+        self.chunk_size = index["tile_size"] * index["chunk_tiles"]
+        self.chunks = {tuple(int(n) for n in key.split(",")): tuple(entry) for key, entry in index["chunks"].items()}
+
+    def chunk_coords(self, x, y):
+        return int(x // self.chunk_size), int(y // self.chunk_size)
+
+    def chunk_rect(self, coords):
+        return pygame.Rect(coords[0] * self.chunk_size, coords[1] * self.chunk_size, self.chunk_size, self.chunk_size)
+
+    def read_chunk(self, coords):
+        """Decodes the chunk at coords (which must be one of self.chunks)."""
+        offset, length = self.chunks[coords]
+        payload = json.loads(zlib.decompress(self.data[offset:offset + length]).decode("utf-8"))
+        rect = self.chunk_rect(coords)
+        walls = wall_rects(payload["tiles"], rect.left, rect.top, self.tile_size)
+        doors = [dict(item, rect=pygame.Rect(item["rect"])) for item in payload["doors"]]
+        windows = [dict(item, rect=pygame.Rect(item["rect"])) for item in payload["windows"]]
+        enemies = [(*spawn["pos"], [tuple(point) for point in spawn["patrol"]] if spawn["patrol"] else None)
+                   for spawn in payload["enemies"]]
+        return LevelChunk(coords, rect, walls, doors, windows, enemies, payload["coins"])
+
+    def close(self):
+        self.data.close()
+
+def wall_rects(rows, left, top, tile_size):
+    """Merges the WALL_TILEs of rows (strings) into Rects: runs along each row, each extended downwards
+    while the next row has the same run."""
+    rects = []
+    open_runs = {} # (first column, end column) -> Rect still growing
+    for row_index, row in enumerate(rows):
+        runs = {}
+        for match in re.finditer(re.escape(WALL_TILE) + "+", row):
+            run = match.span()
+            rect = open_runs.get(run)
+            if rect is None:
+                rect = pygame.Rect(left + run[0] * tile_size, top + row_index * tile_size, (run[1] - run[0]) * tile_size, 0)
+                rects.append(rect)
+            rect.height += tile_size
+            runs[run] = rect
+        open_runs = runs
+    return rects
+
+class LevelFileWriter:
+    """Builds a level file. Only chunks that have something in them are kept (and written)."""
+
+    def __init__(self, level, size, start, tile_size=TILE_SIZE, chunk_tiles=CHUNK_TILES):
+        self.level = level
+        self.size = size
+        self.start = start
+        self.tile_size = tile_size
+        self.chunk_tiles = chunk_tiles
+        self.chunk_size = tile_size * chunk_tiles
+        self.chunks = {} # (cx, cy) -> {"tiles": bytearray or None, "doors", "windows", "enemies", "coins"}
+
+    def _chunk(self, x, y):
+        coords = (int(x // self.chunk_size), int(y // self.chunk_size))
+        chunk = self.chunks.get(coords)
+        if chunk is None:
+            chunk = self.chunks[coords] = {"tiles": None, "doors": [], "windows": [], "enemies": [], "coins": 0}
+        return chunk
+
+    def add_wall(self, rect):
+        """Marks every tile rect touches as wall, so walls are rounded outwards to whole tiles."""
+        rect = pygame.Rect(rect)
+        size, per_chunk = self.tile_size, self.chunk_tiles
+        for tile_y in range(rect.top // size, (rect.bottom - 1) // size + 1):
+            for tile_x in range(rect.left // size, (rect.right - 1) // size + 1):
+                chunk = self._chunk(tile_x * size, tile_y * size)
+                if chunk["tiles"] is None:
+                    chunk["tiles"] = bytearray(FLOOR_TILE * per_chunk * per_chunk, "ascii")
+                chunk["tiles"][tile_y % per_chunk * per_chunk + tile_x % per_chunk] = ord(WALL_TILE)
+
+    def add_door(self, rect, cost, target, **extra):
+        self._chunk(*rect[:2])["doors"].append({"rect": list(rect), "cost": cost, "target": target, "type": "door", **extra})
+
+    def add_window(self, rect, cost, target, **extra):
+        self._chunk(*rect[:2])["windows"].append({"rect": list(rect), "cost": cost, "target": target, "type": "window", **extra})
+
+    def add_enemy(self, x, y, patrol=None):
+        self._chunk(x, y)["enemies"].append({"pos": [x, y], "patrol": [list(point) for point in patrol] if patrol else None})
+
+    def add_coins(self, x, y, count):
+        """Adds count to the coin budget of the chunk containing (x, y)."""
+        self._chunk(x, y)["coins"] += count
+
+    def write(self, path):
+        index = {"level": self.level, "size": list(self.size), "start": list(self.start), "tile_size": self.tile_size,
+                 "chunk_tiles": self.chunk_tiles, "chunks": {}}
+        per_chunk = self.chunk_tiles
+        with open(path, "wb") as f:
+            f.write(bytes(HEADER.size)) # Filled in once the index position is known
+            for (cx, cy), chunk in sorted(self.chunks.items()):
+                tiles = chunk["tiles"] or bytearray(FLOOR_TILE * per_chunk * per_chunk, "ascii")
+                payload = dict(chunk, tiles=[tiles[row * per_chunk:(row + 1) * per_chunk].decode("ascii")
+                                             for row in range(per_chunk)])
+                data = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+                index["chunks"][f"{cx},{cy}"] = [f.tell(), len(data)]
+                f.write(data)
+            index_bytes = json.dumps(index, sort_keys=True).encode("utf-8")
+            index_offset = f.tell()
+            f.write(index_bytes)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, index_offset, len(index_bytes)))
+        print(f"Wrote {len(self.chunks)} chunks of level {self.level} to {path} ({(index_offset + len(index_bytes)) // 1024} KB)")
+
+class ChunkStreamer:
+    """Keeps the chunks of a LevelFile around a point loaded. on_loaded(chunk) and on_evicted(chunk) are
+    called on the main thread, from update() and poll()."""
+
+    def __init__(self, level_file, on_loaded, on_evicted, load_radius=LOAD_RADIUS, keep_radius=KEEP_RADIUS):
+        self.level_file = level_file
+        self.on_loaded = on_loaded
+        self.on_evicted = on_evicted
+        self.load_radius = load_radius
+        self.keep_radius = keep_radius
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-streamer")
+        self.finished = queue.Queue() # (coords, chunk, error) from the worker
+        self.loaded = {}     # (cx, cy) -> LevelChunk
+        self.pending = set() # Coordinates submitted to the worker and not yet polled
+        self.failed = set()  # Coordinates that could not be read; not retried
+        self.center = None   # Chunk the last update() was in
+
+    def _distance(self, coords):
+        return max(abs(coords[0] - self.center[0]), abs(coords[1] - self.center[1]))
+
+    def update(self, position):
+        """Evicts chunks that are now out of range and queues loading the ones that came into range."""
+        center = self.level_file.chunk_coords(*position)
+        if center == self.center:
+            return
+        self.center = center
+        for coords in [coords for coords in self.loaded if self._distance(coords) > self.keep_radius]:
+            self.on_evicted(self.loaded.pop(coords))
+        radius = self.load_radius
+        for cx in range(center[0] - radius, center[0] + radius + 1):
+            for cy in range(center[1] - radius, center[1] + radius + 1):
+                coords = (cx, cy)
+                if (coords in self.level_file.chunks and coords not in self.loaded and coords not in self.pending
+                        and coords not in self.failed):
+                    self.pending.add(coords)
+                    self.executor.submit(self._read, coords)
+
+    def _read(self, coords):
+        # Runs on the worker thread
+        try:
+            self.finished.put((coords, self.level_file.read_chunk(coords), None))
+        except (ValueError, KeyError, zlib.error) as e:
+            self.finished.put((coords, None, e))
+
+    def poll(self):
+        """Hands finished chunks to on_loaded. Must be called from the main thread."""
+        applied = 0
+        while True:
+            try:
+                item = self.finished.get_nowait()
+            except queue.Empty:
+                return applied
+            applied += self._apply(*item)
+
+    def _apply(self, coords, chunk, error):
+        self.pending.discard(coords)
+        if error is not None:
+            self.failed.add(coords)
+            print(f"Could not read chunk {coords} of {self.level_file.path}: {error}")
+            return 0
+        if self._distance(coords) > self.keep_radius:
+            return 0 # Out of range again by the time it was read
+        self.loaded[coords] = chunk
+        self.on_loaded(chunk)
+        return 1
+
+    def wait(self):
+        """Blocks until every queued chunk has been handed over (when a level starts)."""
+        while self.pending:
+            self._apply(*self.finished.get())
+
+    def unload_all(self):
+        self.wait()
+        for chunk in self.loaded.values():
+            self.on_evicted(chunk)
+        self.loaded.clear()
+        self.center = None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True) # At most one chunk read to wait for
+        self.level_file.close()
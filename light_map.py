@@ -0,0 +1,139 @@
+import math
+
+import pygame
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Light map
+# Instead of cutting one hard flashlight triangle out of a dark overlay, every
+# light in view is added into a small float buffer (one cell per
+# LIGHT_MAP_SCALE x LIGHT_MAP_SCALE pixels) holding how much red, green and
+# blue light reaches that spot:
+#   - ambient light (the brightness setting) everywhere
+#   - static lights such as torches, baked once per level and reused
+#   - dynamic lights (flashlight cone, laser glow, stomp flash) added each frame,
+#     each only over the cells its radius covers
+# The buffer is clipped, upscaled and multiplied onto the finished frame in a
+# single BLEND_MULT blit. Upscaling goes through half resolution: smoothscale
+# (which softens the cell edges) costs about as much per output pixel as the
+# rest of the light map put together, so the last 2x step is a plain scale.
+#
+# Light values are 0.0 (black) to 1.0 (the frame as drawn); overlapping lights
+# add up and saturate at 1.0. Colors are (r, g, b) multipliers of 0.0 to 1.0.
+# With smooth off (the low quality presets) falloff is linear and the buffer
+# is scaled up without filtering, which is cheaper but shows the cells.
+#
+# Light positions and radii are in world coordinates; world_scale is the size
+# of the lit surface relative to the world (see View), so cells stay
+# LIGHT_MAP_SCALE surface pixels wide at any render scale, and set_origin()
+# follows the camera. Baked static lights are kept per camera position, so a
+# camera that stays put (any single-screen level) bakes them once.
+
+LIGHT_MAP_AVAILABLE = np is not None
+LIGHT_MAP_SCALE = 4
+WHITE_LIGHT = (1.0, 1.0, 1.0)
+
+class LightMap:
+    def __init__(self, width, height, scale=LIGHT_MAP_SCALE, world_scale=1.0, smooth=True):
+        self.width, self.height = width, height
+        self.scale = scale
+        self.smooth = smooth
+        self.cell_size = scale / world_scale # In world units
+        self.cols, self.rows = math.ceil(width / scale), math.ceil(height / scale)
+        # Position of each cell's center relative to the origin; buffers are indexed [x, y, channel] like pygame.surfarray
+        self.cell_offset_x = ((np.arange(self.cols, dtype=np.float32) + 0.5) * self.cell_size)[:, None]
+        self.cell_offset_y = ((np.arange(self.rows, dtype=np.float32) + 0.5) * self.cell_size)[None, :]
+        self.set_origin(0, 0)
+        self.buffer = np.zeros((self.cols, self.rows, 3), dtype=np.float32)
+        self.baked = {} # (level key, ambient, origin) -> ambient plus that level's static lights
+        self.small = pygame.Surface((self.cols, self.rows))
+        self.half = pygame.Surface((width // 2, height // 2))
+        self.full = pygame.Surface((width, height))
+
+    def set_origin(self, x, y):
+        """Sets the world position of the lit surface's top-left corner."""
+        self.origin = (x, y)
+        self.cell_x = self.cell_offset_x + x # World position of each cell's center
+        self.cell_y = self.cell_offset_y + y
+
+    def begin(self, ambient, static_key=None, static_lights=()):
+        """Starts a frame from the ambient level plus the baked static lights of static_key."""
+        key = (static_key, round(ambient, 3), self.origin)
+        base = self.baked.get(key)
+        if base is None:
+            self.buffer.fill(ambient)
+            for x, y, radius, intensity, color in static_lights:
+                self.add_point(x, y, radius, intensity, color)
+            base = self.buffer.copy()
+            if len(self.baked) > 32: # Brightness changes and a moving camera would otherwise keep adding entries
+                self.baked.clear()
+            self.baked[key] = base
+        np.copyto(self.buffer, base)
+
+    def _region(self, x, y, radius):
+        """Cell slices covering a circle, or None if it is entirely off screen."""
+        x, y = x - self.origin[0], y - self.origin[1]
+        x0 = max(0, int((x - radius) // self.cell_size))
+        x1 = min(self.cols, int((x + radius) // self.cell_size) + 1)
+        y0 = max(0, int((y - radius) // self.cell_size))
+        y1 = min(self.rows, int((y + radius) // self.cell_size) + 1)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return slice(x0, x1), slice(y0, y1)
+
+    def _add(self, region, amount, color):
+        xs, ys = region
+        self.buffer[xs, ys] += amount[:, :, None] * np.asarray(color, dtype=np.float32)
+
+    def add_point(self, x, y, radius, intensity=1.0, color=WHITE_LIGHT):
+        """Round light with a smooth quadratic falloff to nothing at radius."""
+        region = self._region(x, y, radius)
+        if region is None:
+            return
+        dx = self.cell_x[region[0]] - x
+        dy = self.cell_y[:, region[1]] - y
+        falloff = np.clip(1.0 - np.sqrt(dx * dx + dy * dy) / radius, 0.0, 1.0)
+        self._add(region, intensity * (falloff * falloff if self.smooth else falloff), color)
+
+    def add_cone(self, x, y, angle, half_angle, length, intensity=1.0, color=WHITE_LIGHT, edge=math.radians(8)):
+        """Light shining from (x, y) towards angle, fading with distance and softened over edge radians at the sides."""
+        region = self._region(x, y, length)
+        if region is None:
+            return
+        dx = self.cell_x[region[0]] - x
+        dy = self.cell_y[:, region[1]] - y
+        distance = np.sqrt(dx * dx + dy * dy)
+        off_axis = np.abs((np.arctan2(dy, dx) - angle + math.pi) % (2 * math.pi) - math.pi)
+        sides = np.clip((half_angle - off_axis) / edge + 0.5, 0.0, 1.0)
+        falloff = np.clip(1.0 - distance / length, 0.0, 1.0)
+        self._add(region, intensity * sides * (np.sqrt(falloff) if self.smooth else falloff), color)
+
+    def add_segment(self, start, end, radius, intensity=1.0, color=WHITE_LIGHT):
+        """Glow around a line (e.g. a laser beam), fading to nothing radius pixels away from it."""
+        (x0, y0), (x1, y1) = start, end
+        region = self._region((x0 + x1) / 2, (y0 + y1) / 2, math.hypot(x1 - x0, y1 - y0) / 2 + radius)
+        if region is None:
+            return
+        seg_x, seg_y = x1 - x0, y1 - y0
+        length_sq = max(seg_x * seg_x + seg_y * seg_y, 1e-6)
+        px = self.cell_x[region[0]] - x0
+        py = self.cell_y[:, region[1]] - y0
+        t = np.clip((px * seg_x + py * seg_y) / length_sq, 0.0, 1.0) # Nearest point along the segment
+        dx = px - t * seg_x
+        dy = py - t * seg_y
+        falloff = np.clip(1.0 - np.sqrt(dx * dx + dy * dy) / radius, 0.0, 1.0)
+        self._add(region, intensity * (falloff * falloff if self.smooth else falloff), color)
+
+    def apply(self, surface):
+        """Multiplies the accumulated light onto surface."""
+        np.clip(self.buffer, 0.0, 1.0, out=self.buffer)
+        pygame.surfarray.blit_array(self.small, (self.buffer * 255).astype(np.uint8))
+        if self.smooth:
+            pygame.transform.smoothscale(self.small, self.half.get_size(), self.half)
+            pygame.transform.scale(self.half, (self.width, self.height), self.full)
+        else:
+            pygame.transform.scale(self.small, (self.width, self.height), self.full)
+        surface.blit(self.full, (0, 0), special_flags=pygame.BLEND_MULT)
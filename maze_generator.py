@@ -0,0 +1,235 @@
+import random
+from collections import deque
+
+import pygame
+
+from level_file import TILE_SIZE, WALL_TILE, FLOOR_TILE, wall_rects
+
+# Generated levels
+# generate_maze() builds a level from a seed, so there are as many levels as
+# there are seeds and the same seed always gives the same level. The maze is
+# carved on a grid of cells by a depth-first walk (one path between any two
+# cells), and then a few extra walls are knocked out so it has some loops.
+#
+# Each cell is CELL_TILES x CELL_TILES level file tiles: one tile of wall
+# along its top and left edge and a 60 pixel passage, which a 40x40 player
+# and the 30x30 enemies fit through. The start is the top-left cell, the exit
+# door is in the cell furthest from it (by walking distance) and windows are
+# put in dead ends. Doors and windows cost more the further away they are.
+#
+# Before a level is returned, a flood fill over the tiles finds every
+# position the player's top-left corner can reach from the start; every coin,
+# door and window must be touchable from one of them.
+
+CELL_TILES = 4
+CELL_SIZE = CELL_TILES * TILE_SIZE
+PLAYER_TILES = 2 # The player is 40x40
+ENEMY_SIZE = 30
+COIN_SIZE = 20
+DOOR_SIZE = (50, 60)
+WINDOW_SIZE = (60, 40)
+LOOP_FRACTION = 0.05    # Extra openings, as a fraction of the number of cells
+SAFE_CELLS = 4          # No enemies this close (in cells walked) to the start
+PATROL_PROBABILITY = 0.7 # Enemies in a straight corridor patrol it; the rest wander
+MAX_PATROL_CELLS = 4
+
+class GeneratedLevel:
+    """A level in the game's own structures: wall Rects, door and window dicts (as in doors_by_level),
+    enemy spawns as (x, y, patrol points or None) and coin Rects. size and start are in pixels."""
+
+    def __init__(self, seed, level, size, start, walls, doors, windows, enemies, coins):
+        self.seed = seed
+        self.level = level
+        self.size = size
+        self.start = start
+        self.walls = walls
+        self.doors = doors
+        self.windows = windows
+        self.enemies = enemies
+        self.coins = coins
+
+def generate_maze(seed, cols, rows, level, coins=None, enemies=None, windows=2, exit_target=0, window_targets=(0,)):
+    """Generates and validates a cols x rows cell maze. coins and enemies default to one per 8 and
+    per 25 cells."""
+    rng = random.Random(seed)
+    coins = (cols * rows) // 8 if coins is None else coins
+    enemies = (cols * rows) // 25 if enemies is None else enemies
+
+    open_east, open_south = _carve(rng, cols, rows)
+    depth = _walk_distances(open_east, open_south, cols, rows)
+    tiles = _tiles(open_east, open_south, cols, rows)
+
+    cells = range(cols * rows)
+    exit_cell = max(cells, key=depth.__getitem__)
+    max_depth = max(depth[exit_cell], 1)
+    exit_rect = _centered(exit_cell, cols, DOOR_SIZE)
+    doors = [{"rect": exit_rect, "cost": max(1, coins // 2), "target": exit_target, "type": "door"}]
+
+    dead_ends = [cell for cell in cells if cell not in (0, exit_cell) and _openings(cell, open_east, open_south, cols) == 1]
+    window_list = []
+    for cell in rng.sample(dead_ends, min(windows, len(dead_ends))):
+        cost = max(1, coins * depth[cell] // (max_depth * 4))
+        window_list.append({"rect": _centered(cell, cols, WINDOW_SIZE), "cost": cost,
+                            "target": rng.choice(window_targets), "type": "window"})
+
+    spawn_cells = [cell for cell in cells if depth[cell] >= SAFE_CELLS]
+    enemy_list = []
+    for cell in rng.choices(spawn_cells, k=enemies) if spawn_cells else ():
+        x, y = _centered(cell, cols, (ENEMY_SIZE, ENEMY_SIZE)).topleft
+        patrol = None
+        if rng.random() < PATROL_PROBABILITY:
+            end = _corridor_end(rng, cell, open_east, open_south, cols)
+            if end != cell:
+                patrol = [(x, y), _centered(end, cols, (ENEMY_SIZE, ENEMY_SIZE)).topleft]
+        enemy_list.append((x, y, patrol))
+
+    coin_list = []
+    for cell in rng.choices(range(1, cols * rows), k=coins) if cols * rows > 1 else ():
+        offset = CELL_SIZE - TILE_SIZE - COIN_SIZE # Room left in the passage
+        coin_list.append(_centered(cell, cols, (COIN_SIZE, COIN_SIZE)).move(rng.randint(-offset // 2, offset // 2),
+                                                                        rng.randint(-offset // 2, offset // 2)))
+
+    start = _centered(0, cols, (PLAYER_TILES * TILE_SIZE, PLAYER_TILES * TILE_SIZE)).topleft
+    maze = GeneratedLevel(seed, level, (cols * CELL_SIZE + TILE_SIZE, rows * CELL_SIZE + TILE_SIZE), start,
+                          wall_rects(tiles, 0, 0, TILE_SIZE), doors, window_list, enemy_list, coin_list)
+    unreachable = find_unreachable(tiles, start, [item["rect"] for item in doors + window_list] + coin_list)
+    if unreachable:
+        raise ValueError(f"maze {seed} ({cols}x{rows}) has {len(unreachable)} unreachable items, first at {unreachable[0]}")
+    return maze
+
+def _carve(rng, cols, rows):
+    # Depth-first walk from the top-left cell; returns which cells open to the east and south
+    open_east, open_south = bytearray(cols * rows), bytearray(cols * rows)
+    visited = bytearray(cols * rows)
+    visited[0] = 1
+    stack = [0]
+    while stack:
+        cell = stack[-1]
+        x, y = cell % cols, cell // cols
+        neighbours = []
+        if x > 0 and not visited[cell - 1]: neighbours.append(cell - 1)
+        if x < cols - 1 and not visited[cell + 1]: neighbours.append(cell + 1)
+        if y > 0 and not visited[cell - cols]: neighbours.append(cell - cols)
+        if y < rows - 1 and not visited[cell + cols]: neighbours.append(cell + cols)
+        if not neighbours:
+            stack.pop()
+            continue
+        step = rng.choice(neighbours)
+        _open(open_east, open_south, cols, cell, step)
+        visited[step] = 1
+        stack.append(step)
+
+    for _ in range(int(cols * rows * LOOP_FRACTION)):
+        cell = rng.randrange(cols * rows)
+        x, y = cell % cols, cell // cols
+        if rng.random() < 0.5 and x < cols - 1:
+            open_east[cell] = 1
+        elif y < rows - 1:
+            open_south[cell] = 1
+    return open_east, open_south
+
+def _open(open_east, open_south, cols, a, b):
+    a, b = min(a, b), max(a, b)
+    if b == a + cols:
+        open_south[a] = 1
+    else:
+        open_east[a] = 1
+
+def _neighbours(cell, open_east, open_south, cols):
+    if open_east[cell]: yield cell + 1
+    if open_south[cell]: yield cell + cols
+    if cell % cols > 0 and open_east[cell - 1]: yield cell - 1
+    if cell >= cols and open_south[cell - cols]: yield cell - cols
+
+def _openings(cell, open_east, open_south, cols):
+    return sum(1 for _ in _neighbours(cell, open_east, open_south, cols))
+
+def _walk_distances(open_east, open_south, cols, rows):
+    # Cells walked from the start to every cell
+    depth = [-1] * (cols * rows)
+    depth[0] = 0
+    queue = deque([0])
+    while queue:
+        cell = queue.popleft()
+        for step in _neighbours(cell, open_east, open_south, cols):
+            if depth[step] < 0:
+                depth[step] = depth[cell] + 1
+                queue.append(step)
+    return depth
+
+def _corridor_end(rng, cell, open_east, open_south, cols):
+    # The furthest cell (up to MAX_PATROL_CELLS) reachable in a straight line, in a random open direction
+    directions = [step - cell for step in _neighbours(cell, open_east, open_south, cols)]
+    if not directions:
+        return cell
+    direction = rng.choice(directions)
+    end = cell
+    for _ in range(MAX_PATROL_CELLS):
+        if end + direction not in _neighbours(end, open_east, open_south, cols):
+            break
+        end += direction
+    return end
+
+def _centered(cell, cols, size):
+    # Rect of the given size centered in a cell's passage
+    rect = pygame.Rect(0, 0, *size)
+    rect.center = ((cell % cols) * CELL_SIZE + (CELL_SIZE + TILE_SIZE) // 2,
+                   (cell // cols) * CELL_SIZE + (CELL_SIZE + TILE_SIZE) // 2)
+    return rect
+
+def _tiles(open_east, open_south, cols, rows):
+    # Tile rows as strings: a wall line above every row of cells and left of every column, with the openings cut out
+    wall_line = bytearray(WALL_TILE * (cols * CELL_TILES + 1), "ascii")
+    passage_line = bytearray((WALL_TILE + FLOOR_TILE * (CELL_TILES - 1)) * cols + WALL_TILE, "ascii")
+    gap = FLOOR_TILE.encode("ascii") * (CELL_TILES - 1)
+    lines = []
+    for y in range(rows):
+        top = wall_line[:]
+        if y > 0:
+            for x in range(cols):
+                if open_south[(y - 1) * cols + x]:
+                    top[x * CELL_TILES + 1:(x + 1) * CELL_TILES] = gap
+        lines.append(top.decode("ascii"))
+        passage = passage_line[:]
+        for x in range(cols - 1):
+            if open_east[y * cols + x]:
+                passage[(x + 1) * CELL_TILES] = ord(FLOOR_TILE)
+        lines += [passage.decode("ascii")] * (CELL_TILES - 1)
+    lines.append(wall_line.decode("ascii"))
+    return lines
+
+def find_unreachable(tiles, start, rects):
+    """Flood fills the positions a 40x40 player can reach from start (pixels) through the floor of tiles
+    (rows of WALL_TILE/FLOOR_TILE, which must have a wall border) and returns the rects it can't touch."""
+    width = len(tiles[0])
+    wall = "".join(tiles).encode("ascii").translate(bytes.maketrans(WALL_TILE.encode("ascii") + FLOOR_TILE.encode("ascii"), b"\1\0"))
+    # The player fits with its top-left corner on a tile when none of the PLAYER_TILES x PLAYER_TILES
+    # tiles it covers is a wall: OR the grid with itself shifted left and up, one byte per tile
+    blocked = int.from_bytes(wall, "little")
+    for _ in range(PLAYER_TILES - 1):
+        blocked |= blocked >> 8
+    for _ in range(PLAYER_TILES - 1):
+        blocked |= blocked >> (8 * width)
+    fits = blocked.to_bytes(len(wall), "little")
+
+    first = start[1] // TILE_SIZE * width + start[0] // TILE_SIZE
+    reached = bytearray(len(wall))
+    reached[first] = 1
+    stack = [first]
+    while stack:
+        index = stack.pop()
+        for step in (index - 1, index + 1, index - width, index + width):
+            if not fits[step] and not reached[step]:
+                reached[step] = 1
+                stack.append(step)
+
+    unreachable = []
+    player = PLAYER_TILES * TILE_SIZE
+    for rect in rects:
+        # Player tiles whose 40x40 square overlaps rect
+        x0, x1 = (rect.left - player) // TILE_SIZE + 1, (rect.right - 1) // TILE_SIZE
+        y0, y1 = (rect.top - player) // TILE_SIZE + 1, (rect.bottom - 1) // TILE_SIZE
+        x0, y0 = max(x0, 0), max(y0, 0)
+        if not any(reached[y * width + x0:y * width + x1 + 1].count(1) for y in range(y0, y1 + 1)):
+            unreachable.append(rect)
+    return unreachable
@@ -0,0 +1,133 @@
+import csv
+import json
+import os
+import queue
+import threading
+import time
+
+# Per-frame metrics export
+# Writes one record per sampled frame (whatever metrics dict the game hands
+# over: timings, entity counts, boss state, garbage collections...) to a JSONL
+# or CSV file for offline analysis.
+#
+# The game loop only builds a dict and drops it on a queue; formatting and
+# file I/O happen on a background writer thread. If the writer ever falls so
+# far behind that the queue fills up, records are dropped (and counted)
+# rather than making the game wait. When the file grows past max_bytes it is
+# rotated like a log file: metrics.jsonl -> metrics.jsonl.1 -> .2 ...
+# A CSV file is also rotated when a record brings columns its header doesn't
+# have (e.g. the coin count of a level entered later), so the new file starts
+# with a header that has every column seen so far.
+
+METRICS_FORMATS = ("jsonl", "csv")
+METRICS_QUEUE_SIZE = 1024          # Records waiting for the writer before new ones are dropped
+METRICS_MAX_BYTES = 5 * 1024 * 1024
+METRICS_BACKUPS = 3                # Rotated files kept
+METRICS_FLUSH_INTERVAL = 1.0       # Seconds between flushes to disk
+
+def flatten(record, prefix=""):
+    """Turns nested dicts into flat keys ({"coins": {0: 5}} -> {"coins_0": 5}) for CSV columns."""
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}_"))
+        else:
+            flat[name] = value
+    return flat
+
+class MetricsRecorder:
+    def __init__(self, path, file_format="jsonl", sample_every=1,
+                 max_bytes=METRICS_MAX_BYTES, backups=METRICS_BACKUPS):
+        if file_format not in METRICS_FORMATS:
+            raise ValueError(f"Unknown metrics format '{file_format}', expected one of {METRICS_FORMATS}")
+        self.path = path
+        self.file_format = file_format
+        self.sample_every = max(1, sample_every) # Record every Nth frame
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.start_time = time.perf_counter()
+        self.frame = 0
+        self.dropped = 0 # Records lost because the writer fell behind
+        self.records = queue.Queue(maxsize=METRICS_QUEUE_SIZE)
+
+        self.writer = threading.Thread(target=self._write_loop, name="metrics-writer", daemon=True)
+        self.writer.start()
+
+    def tick(self):
+        """Advances the frame counter. Returns True if this frame should be recorded."""
+        self.frame += 1
+        return self.frame % self.sample_every == 0
+
+    def record(self, metrics):
+        """Queues one frame's metrics. Never blocks."""
+        metrics = {"frame": self.frame, "time": round(time.perf_counter() - self.start_time, 4), **metrics}
+        try:
+            self.records.put_nowait(metrics)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Stops recording and waits for the writer to finish the file."""
+        if self.writer.is_alive():
+            self.records.put(None)
+            self.writer.join()
+        if self.dropped:
+            print(f"Metrics: {self.dropped} records dropped because the writer fell behind")
+
+    # --- Writer thread ---
+
+    def _write_loop(self):
+        out = None
+        csv_writer = None
+        fieldnames = {} # CSV columns seen so far, in order (a dict as an ordered set)
+        last_flush = time.perf_counter()
+        try:
+            while True:
+                try:
+                    metrics = self.records.get(timeout=METRICS_FLUSH_INTERVAL)
+                except queue.Empty:
+                    metrics = False # Nothing new, just flush
+                if metrics is None:
+                    break
+                if metrics:
+                    row = flatten(metrics) if self.file_format == "csv" else None
+                    new_columns = row is not None and not row.keys() <= fieldnames.keys()
+                    if out is not None and (out.tell() >= self.max_bytes or new_columns):
+                        out.close()
+                        out = None
+                        self._rotate()
+                    if out is None:
+                        out, csv_writer = self._open()
+                    if row is not None:
+                        fieldnames.update(dict.fromkeys(row))
+                        if csv_writer is None:
+                            csv_writer = csv.DictWriter(out, fieldnames=list(fieldnames), restval="")
+                            csv_writer.writeheader()
+                        csv_writer.writerow(row)
+                    else:
+                        out.write(json.dumps(metrics, separators=(",", ":")) + "\n")
+                if out is not None and time.perf_counter() - last_flush >= METRICS_FLUSH_INTERVAL:
+                    out.flush()
+                    last_flush = time.perf_counter()
+        except OSError as e:
+            print(f"Metrics recording stopped: {e}")
+        finally:
+            if out is not None:
+                out.close()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return open(self.path, "w", encoding="utf-8", newline=""), None # CSV header is written with the first row
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
@@ -0,0 +1,115 @@
+import time
+
+import pygame
+
+# Music playback without frame hitches
+# pygame.mixer.music stops, opens and starts decoding a file on the calling
+# thread, so every track change used to stall the frame it happened in. Here
+# each track is decoded once, in the background, into a Sound, and played on
+# one of two reserved mixer channels. A transition fades the old channel out
+# and the new one in; the fading itself happens on the audio thread, so the
+# main thread only pays for a couple of channel calls. Pausing pauses the
+# channels instead of stopping them, so resuming never reloads anything.
+#
+# Each transition's main-thread cost is recorded in transition_times.
+
+MUSIC_FADE_MS = 800
+
+class MusicController:
+    def __init__(self, loader, first_channel=0, fade_ms=MUSIC_FADE_MS):
+        self.loader = loader
+        self.fade_ms = fade_ms
+        # Callers must reserve these with pygame.mixer.set_reserved() so sound effects never use them
+        self.channels = [pygame.mixer.Channel(first_channel), pygame.mixer.Channel(first_channel + 1)]
+        self.active = 0 # Index of the channel playing the current track
+        self.tracks = {} # name -> decoded Sound
+        self.current = None # Name of the current track
+        self.pending = None # (name, loops) requested before the track finished loading
+        self.paused = False
+        self.volume = 1.0
+        self.transition_times = [] # (description, milliseconds the main thread spent)
+
+    def preload(self, name, path):
+        """Starts decoding a track in the background so play() never has to wait for it."""
+        self.loader.load_sound(path, lambda sound: self.tracks.__setitem__(name, sound), "music")
+
+    def play(self, name, loops=-1):
+        """Crossfades from the current track to name. Does nothing if name is already playing."""
+        start = time.perf_counter()
+        if name == self.current and self.is_busy():
+            if self.paused:
+                self._unpause()
+            return
+        if name not in self.tracks:
+            # Still decoding: fade out what's playing and start the track once it's ready
+            self.pending = (name, loops)
+            self._fade_out_current()
+            self.current = None
+        else:
+            self.pending = None
+            self._fade_out_current()
+            self.active = 1 - self.active
+            channel = self.channels[self.active]
+            channel.set_volume(self.volume)
+            channel.play(self.tracks[name], loops=loops, fade_ms=self.fade_ms)
+            self.current = name
+        self.paused = False
+        self._record(f"play {name}", start)
+
+    def update(self):
+        """Starts a requested track once it has finished loading. Call once per frame."""
+        if self.pending is not None and self.pending[0] in self.tracks:
+            self.play(*self.pending)
+
+    def _fade_out_current(self):
+        channel = self.channels[self.active]
+        if channel.get_busy():
+            if self.paused:
+                channel.stop() # A paused channel can't fade
+            else:
+                channel.fadeout(self.fade_ms)
+
+    def stop(self):
+        start = time.perf_counter()
+        for channel in self.channels:
+            channel.stop()
+        self.current = None
+        self.pending = None
+        self.paused = False
+        self._record("stop", start)
+
+    def pause(self):
+        start = time.perf_counter()
+        for channel in self.channels:
+            channel.pause()
+        self.paused = True
+        self._record("pause", start)
+
+    def resume(self):
+        """Continues the paused track from where it stopped."""
+        start = time.perf_counter()
+        self._unpause()
+        self._record("resume", start)
+
+    def _unpause(self):
+        for channel in self.channels:
+            channel.unpause()
+        self.paused = False
+
+    def set_volume(self, volume):
+        self.volume = volume
+        self.channels[self.active].set_volume(volume)
+
+    def is_busy(self):
+        """True if a track is playing (or paused, or waiting to start)."""
+        return self.pending is not None or (self.current is not None and self.channels[self.active].get_busy())
+
+    def _record(self, description, start):
+        self.transition_times.append((description, (time.perf_counter() - start) * 1000))
+
+    def report(self):
+        if not self.transition_times:
+            return
+        worst = max(self.transition_times, key=lambda t: t[1])
+        average = sum(ms for _, ms in self.transition_times) / len(self.transition_times)
+        print(f"Music transitions: {len(self.transition_times)}, average {average:.2f} ms, worst {worst[1]:.2f} ms ({worst[0]})")
@@ -0,0 +1,154 @@
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+
+import benchmark
+
+# Performance regression gate
+# Runs the benchmark scenarios and compares them against stored baselines.
+#
+# On a busy machine, noise (other processes, frequency scaling) only ever
+# makes a run slower, so the fastest run is the best estimate of what the
+# code itself costs; that is what gets compared, like timeit does. Each
+# scenario (in each mode) is repeated until that best time has settled: at
+# least MIN_RUNS runs, and the last STABLE_WINDOW runs must not have beaten
+# the earlier best by more than STABLE_TOLERANCE (at most MAX_RUNS runs).
+# Scenarios that are very quick per frame get more frames per run
+# (at least MIN_RUN_SECONDS of work), otherwise timer resolution and
+# scheduling noise swamp them. A scenario whose best of those runs is more than the threshold
+# slower than the baseline's best is a regression, and the gate exits with status 1. (The
+# median is stored in the baseline too, but only for reference.)
+#
+# Usage:
+#   python perf_gate.py --update          # record baselines on this machine
+#   python perf_gate.py                   # compare against them
+#   python perf_gate.py --threshold 0.05 --only boss
+#
+# Baselines are only comparable on the machine they were recorded on, so the
+# file remembers where it came from and the gate warns when that differs.
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_baseline.json")
+DEFAULT_THRESHOLD = 0.10 # Fraction slower than the baseline that counts as a regression
+STABLE_TOLERANCE = 0.02  # Improvement of the best time that still counts as "not settled"
+STABLE_WINDOW = 3
+MIN_RUNS = 5
+MAX_RUNS = 30
+MIN_RUN_SECONDS = 0.25
+
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+EXIT_NO_BASELINE = 2
+
+def machine_info():
+    return {"machine": platform.machine(), "processor": platform.processor(), "system": platform.system(),
+            "python": platform.python_version()}
+
+def measure(game, name, setup, frames, mode, min_runs=MIN_RUNS, max_runs=MAX_RUNS, run_frames=None):
+    """Repeats one scenario until its best frame time is stable. Returns a summary dict.
+    run_frames fixes the frames per run (to match a baseline); otherwise it is picked from a warm-up run."""
+    warm_up = benchmark.run_scenario(game, name, setup, frames, mode) # Not counted
+    if run_frames is None:
+        run_frames = max(frames, math.ceil(MIN_RUN_SECONDS * 1000 / max(warm_up["avg_ms"], 0.001)))
+    frames = run_frames
+    samples = []
+    while True:
+        samples.append(benchmark.run_scenario(game, name, setup, frames, mode)["avg_ms"])
+        if len(samples) < max(STABLE_WINDOW + 1, min_runs):
+            continue
+        best = min(samples)
+        stable = min(samples[:-STABLE_WINDOW]) <= best * (1 + STABLE_TOLERANCE)
+        if stable or len(samples) >= max_runs:
+            return {"best_ms": round(best, 5), "median_ms": round(statistics.median(samples), 5),
+                    "runs": len(samples), "frames": frames, "stable": stable}
+
+def measure_all(only=None, modes=benchmark.MODES, min_runs=MIN_RUNS, max_runs=MAX_RUNS, baseline=None):
+    game = benchmark.load_game()
+    benchmark.prepare(game)
+    results = {}
+    for name, setup, frames in benchmark.SCENARIOS:
+        if only and only not in name:
+            continue
+        for mode in modes:
+            key = f"{name}/{mode}"
+            known = baseline["scenarios"].get(key) if baseline else None
+            run_frames = known.get("frames") if known else None # Same run length as the baseline
+            results[key] = measure(game, name, setup, frames, mode, min_runs, max_runs, run_frames)
+            summary = results[key]
+            note = "" if summary["stable"] else " (not stable)"
+            print(f"  {key:<44}best {summary['best_ms']:9.4f} ms, median {summary['median_ms']:9.4f} ms over {summary['runs']} runs{note}")
+    return results
+
+def load_baseline(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_baseline(path, results, previous=None):
+    scenarios = dict(previous["scenarios"]) if previous else {}
+    scenarios.update(results) # Keep baselines of scenarios that weren't re-run (e.g. with --only)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"machine": machine_info(), "scenarios": scenarios}, f, indent=1, sort_keys=True)
+    print(f"Saved {len(results)} baselines to {path}")
+
+def compare(results, baseline, threshold):
+    """Prints each scenario against its baseline. Returns the keys that regressed."""
+    regressions = []
+    print(f"{'scenario':<44}{'baseline':>11}{'current':>11}{'change':>9}")
+    for key, summary in results.items():
+        known = baseline["scenarios"].get(key)
+        if known is None:
+            print(f"{key:<44}{'-':>11}{summary['best_ms']:>11.4f}{'new':>9}")
+            continue
+        change = summary["best_ms"] / known["best_ms"] - 1
+        regressed = change > threshold
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{key:<44}{known['best_ms']:>11.4f}{summary['best_ms']:>11.4f}{change:>+9.1%}{flag}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if any benchmark scenario got slower than its stored baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE, metavar="PATH", help="baseline file (default perf_baseline.json)")
+    parser.add_argument("--update", action="store_true", help="record new baselines instead of comparing")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, metavar="FRACTION",
+                        help=f"slowdown that counts as a regression (default {DEFAULT_THRESHOLD})")
+    parser.add_argument("--only", metavar="TEXT", help="only run scenarios whose name contains TEXT")
+    parser.add_argument("--mode", choices=benchmark.MODES, help="run only the sim or only the render variant")
+    parser.add_argument("--min-runs", type=int, default=MIN_RUNS, metavar="N")
+    parser.add_argument("--max-runs", type=int, default=MAX_RUNS, metavar="N")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    if not args.update and baseline is None:
+        print(f"No baseline at {args.baseline}, record one with --update")
+        sys.exit(EXIT_NO_BASELINE)
+
+    print("Measuring scenarios...")
+    results = measure_all(args.only, (args.mode,) if args.mode else benchmark.MODES, args.min_runs, args.max_runs,
+                          None if args.update else baseline)
+    if not results:
+        print(f"No scenario matches '{args.only}'")
+        sys.exit(EXIT_NO_BASELINE)
+
+    if args.update:
+        save_baseline(args.baseline, results, baseline)
+        sys.exit(EXIT_OK)
+
+    if baseline.get("machine") != machine_info():
+        print(f"Warning: baseline was recorded on a different machine ({baseline.get('machine')}), results may not be comparable")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} scenario(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(EXIT_REGRESSION)
+    print("No regressions")
+    sys.exit(EXIT_OK)
+
+if __name__ == "__main__":
+    main()
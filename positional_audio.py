@@ -0,0 +1,55 @@
+import math
+
+# Positional audio
+# Sounds that happen somewhere in the level (boss attacks, enemies) are queued
+# with emit() during the frame instead of being played straight away. Once per
+# frame, update() works out every queued emitter's distance and stereo pan
+# relative to the listener (the player) in one pass, drops the ones too quiet
+# to hear before they ever reach the mixer, and plays the rest, loudest first,
+# with per-ear channel volumes.
+
+FULL_VOLUME_DISTANCE = 80   # Closer than this plays at full volume
+SILENT_DISTANCE = 1200      # Further than this can't be heard at all
+PAN_DISTANCE = 400          # Horizontal offset at which a sound is fully in one ear
+AUDIBLE_THRESHOLD = 0.05    # Emitters quieter than this are culled
+
+def attenuation(distance):
+    """Gain (0.0 to 1.0) for a sound at the given distance from the listener."""
+    if distance <= FULL_VOLUME_DISTANCE:
+        return 1.0
+    if distance >= SILENT_DISTANCE:
+        return 0.0
+    falloff = (distance - FULL_VOLUME_DISTANCE) / (SILENT_DISTANCE - FULL_VOLUME_DISTANCE)
+    return (1.0 - falloff) ** 2
+
+class PositionalAudio:
+    def __init__(self, mixer):
+        self.mixer = mixer # SoundMixer used to actually play the audible emitters
+        self.emitters = [] # (name, (x, y)) queued this frame
+        self.culled = 0 # Emitters dropped for being inaudible
+
+    def emit(self, name, position):
+        self.emitters.append((name, position))
+
+    def update(self, listener):
+        """Plays this frame's emitters as heard from listener (x, y). Call once per frame."""
+        if not self.emitters:
+            return
+        listener_x, listener_y = listener
+        audible = []
+        for name, (x, y) in self.emitters:
+            dx = x - listener_x
+            gain = attenuation(math.hypot(dx, y - listener_y))
+            if gain < AUDIBLE_THRESHOLD:
+                self.culled += 1
+                continue
+            pan = max(-1.0, min(1.0, dx / PAN_DISTANCE)) # -1 fully left, 1 fully right
+            audible.append((gain, name, gain * min(1.0, 1.0 - pan), gain * min(1.0, 1.0 + pan)))
+        self.emitters.clear()
+
+        # Loudest first, so voice caps and per-frame de-duplication keep the one the player hears best
+        audible.sort(key=lambda emitter: emitter[0], reverse=True)
+        for gain, name, left, right in audible:
+            channel = self.mixer.play(name)
+            if channel is not None:
+                channel.set_volume(left, right)
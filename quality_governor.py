@@ -0,0 +1,64 @@
+from collections import deque
+
+# Adaptive quality
+# Quality presets trade detail for frame time. game_settings["quality"] holds
+# the name of the current preset and is the only place it is stored: the game
+# reads the preset's values through quality_level() every frame, and with
+# game_settings["auto_quality"] on, the QualityGovernor rewrites the name as
+# frame times change.
+#
+# Preset fields:
+#   light_cell           - light map cell size in pixels (the flashlight mask resolution)
+#   smooth_lighting      - quadratic falloff and smoothed upscaling, or linear and blocky
+#   text_antialias       - antialiased text rendering
+#   effect_lights        - extra lights for boss effects (laser glow, stomp flash)
+#   unlit_enemy_interval - enemies too far away to be in the flashlight move every Nth frame (by N steps)
+
+QUALITY_LEVELS = {
+    "low": {"light_cell": 8, "smooth_lighting": False, "text_antialias": False, "effect_lights": False, "unlit_enemy_interval": 4},
+    "medium": {"light_cell": 6, "smooth_lighting": False, "text_antialias": True, "effect_lights": True, "unlit_enemy_interval": 2},
+    "high": {"light_cell": 4, "smooth_lighting": True, "text_antialias": True, "effect_lights": True, "unlit_enemy_interval": 1},
+}
+QUALITY_ORDER = ("low", "medium", "high")
+
+QUALITY_WINDOW = 60          # Frames in the rolling average
+QUALITY_DOWN_THRESHOLD = 0.9 # Step down when the average is above this fraction of the budget...
+QUALITY_UP_THRESHOLD = 0.6   # ...and up when it is below this one
+QUALITY_UP_HOLD = 300        # Frames to wait after any change before stepping up
+
+class QualityGovernor:
+    """Steps settings["quality"] down quickly when frames run over budget and back up slowly once they have
+    been comfortably under it for a while; the gap between the thresholds keeps it from oscillating."""
+
+    def __init__(self, settings, budget_ms=1000 / 60, window=QUALITY_WINDOW):
+        self.settings = settings
+        self.budget_ms = budget_ms
+        self.frame_times = deque(maxlen=window)
+        self.total_ms = 0.0
+        self.frames_since_change = 0
+
+    def update(self, frame_ms):
+        """Feeds one frame's time. Returns True if the quality changed."""
+        if len(self.frame_times) == self.frame_times.maxlen:
+            self.total_ms -= self.frame_times[0]
+        self.frame_times.append(frame_ms)
+        self.total_ms += frame_ms
+        self.frames_since_change += 1
+        if len(self.frame_times) < self.frame_times.maxlen:
+            return False
+
+        average = self.total_ms / len(self.frame_times)
+        index = QUALITY_ORDER.index(self.settings["quality"])
+        if average > self.budget_ms * QUALITY_DOWN_THRESHOLD and index > 0:
+            return self._set(QUALITY_ORDER[index - 1])
+        if (average < self.budget_ms * QUALITY_UP_THRESHOLD and index < len(QUALITY_ORDER) - 1
+                and self.frames_since_change >= QUALITY_UP_HOLD):
+            return self._set(QUALITY_ORDER[index + 1])
+        return False
+
+    def _set(self, quality):
+        self.settings["quality"] = quality
+        self.frame_times.clear() # Judge the new level on its own frames
+        self.total_ms = 0.0
+        self.frames_since_change = 0
+        return True
@@ -0,0 +1,119 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Sampling profiler
+# cProfile hooks every function call, which slows the per-frame code down so
+# much that its numbers stop meaning anything. This profiler instead wakes up
+# a few hundred times a second on a background thread, grabs the main
+# thread's current stack with sys._current_frames() and counts it. Functions
+# that show up in many samples are where the time goes.
+#
+# Samples are attributed to game loop phases the same way FrameProfiler
+# times them: they are held until the main loop's next mark(phase), and the
+# ones taken before a frame's begin_frame() count as "idle" (waiting in
+# clock.tick()). The result is written in the folded stack format
+# ("phase;outer;...;inner count" per line) that flamegraph.pl, speedscope and
+# inferno read directly.
+#
+# The sampler needs the GIL to read the stack, and by default the main thread
+# only hands it over every 5 ms (sys.getswitchinterval()) unless it calls
+# into C code that releases it. That would hide most of a short frame, so
+# while sampling the switch interval is lowered to a fraction of the sample
+# interval. Rates above a few hundred Hz mostly add overhead.
+
+DEFAULT_SAMPLE_RATE = 200 # Samples per second
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+class SamplingProfiler:
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, thread_id=None):
+        self.interval = 1 / sample_rate
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.lock = threading.Lock()
+        self.pending = [] # Stacks sampled since the last phase mark
+        self.stacks = Counter() # "phase;outer;...;inner" -> samples
+        self.samples = 0
+        self.running = False
+        self.thread = None
+        self.saved_switch_interval = None
+
+    def start(self):
+        self.saved_switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.saved_switch_interval, self.interval / 4))
+        self.running = True
+        self.thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.saved_switch_interval is not None:
+            sys.setswitchinterval(self.saved_switch_interval)
+            self.saved_switch_interval = None
+
+    def _sample_loop(self):
+        next_sample = time.perf_counter()
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return # Main thread has exited
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            with self.lock:
+                self.pending.append(";".join(stack))
+            del frame, stack
+
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.perf_counter() # Fell behind, don't try to catch up
+
+    # --- FrameProfiler listener ---
+
+    def begin_frame(self):
+        self.attribute("idle") # Sampled between frames, mostly waiting in clock.tick()
+
+    def end_frame(self, profiler):
+        pass
+
+    def attribute(self, phase):
+        """Assigns every stack sampled since the previous call to phase."""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for stack in pending:
+            self.stacks[f"{phase};{stack}"] += 1
+        self.samples += len(pending)
+
+    def write(self, path):
+        """Writes the samples so far as folded stacks."""
+        self.attribute("unattributed") # Anything still waiting for a mark
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        print(f"Wrote {self.samples} samples to {path}")
+
+    def report(self):
+        """Prints the share of samples spent in each phase."""
+        if not self.samples:
+            return
+        per_phase = Counter()
+        for stack, count in self.stacks.items():
+            per_phase[stack.split(";", 1)[0]] += count
+        print("--- Sampled time by phase ---")
+        for phase, count in per_phase.most_common():
+            print(f"  {phase:<14} {count / self.samples:6.1%} ({count} samples)")
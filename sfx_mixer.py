@@ -0,0 +1,113 @@
+import pygame
+
+# Sound effect mixer
+# Sound effects play on reserved channel groups, one group per category, so a
+# burst of coin pickups can never take the channels the boss attacks need (and
+# the other way round). Within a group:
+#   - each sound has a voice cap; when it is reached the new play is dropped
+#   - the same sound is only started once per frame, however many times the
+#     game asks for it (e.g. several hits registered in the same frame)
+#   - when every channel is busy, the voice that has been playing the longest
+#     is cut off to make room
+# Each Sound's volume is only set again when the volume setting changes,
+# instead of on every play.
+
+# Channels per category
+CHANNEL_GROUPS = {
+    "ui": 2,
+    "pickups": 3,
+    "combat": 3,
+    "boss": 4,
+}
+
+# Category of each sound (sounds not listed use "ui")
+SOUND_CATEGORIES = {
+    "menu": "ui",
+    "gameover": "ui",
+    "win": "ui",
+    "door": "ui",
+    "coin": "pickups",
+    "hit": "combat",
+    "boss_hit": "boss",
+    "boss_laser_charge": "boss",
+    "boss_laser_fire": "boss",
+    "boss_stomp": "boss",
+    "boss_punch": "boss",
+}
+
+# Maximum simultaneous voices of one sound (sounds not listed get 1)
+VOICE_LIMITS = {
+    "coin": 3,
+    "hit": 2,
+    "boss_hit": 2,
+}
+
+class SoundMixer:
+    def __init__(self, sounds, first_channel=0):
+        self.sounds = sounds # name -> Sound (or None if it failed to load), filled in by the loader
+        self.volume = 1.0
+        self.applied_volume = {} # name -> volume last set on that Sound
+        self.played_this_frame = set()
+        self.frame = 0
+        self.started = {} # channel index -> frame its current voice started
+
+        # Give every category its own block of channels after the ones already reserved
+        self.groups = {}
+        next_channel = first_channel
+        for category, count in CHANNEL_GROUPS.items():
+            self.groups[category] = list(range(next_channel, next_channel + count))
+            next_channel += count
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), next_channel))
+        pygame.mixer.set_reserved(next_channel) # Keep Sound.play() from picking our channels
+        self.channels = {index: pygame.mixer.Channel(index) for group in self.groups.values() for index in group}
+        self.dropped = 0 # Plays skipped because of voice caps or de-duplication
+
+    def begin_frame(self):
+        """Call once per frame before any sounds are played."""
+        self.played_this_frame.clear()
+        self.frame += 1
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def play(self, name):
+        """Plays a sound in its category's channel group. Returns the channel used, or None."""
+        sound = self.sounds.get(name)
+        if sound is None:
+            return None
+        if name in self.played_this_frame:
+            self.dropped += 1
+            return None
+
+        group = self.groups[SOUND_CATEGORIES.get(name, "ui")]
+        voices = [index for index in group if self.channels[index].get_busy() and self.channels[index].get_sound() is sound]
+        if len(voices) >= VOICE_LIMITS.get(name, 1):
+            self.dropped += 1
+            return None
+
+        if self.applied_volume.get(name) != self.volume:
+            sound.set_volume(self.volume)
+            self.applied_volume[name] = self.volume
+
+        index = self._free_channel(group)
+        channel = self.channels[index]
+        channel.set_volume(1.0)
+        channel.play(sound)
+        self.started[index] = self.frame
+        self.played_this_frame.add(name)
+        return channel
+
+    def _free_channel(self, group):
+        for index in group:
+            if not self.channels[index].get_busy():
+                return index
+        # Every channel is busy: steal the oldest voice
+        return min(group, key=lambda index: self.started.get(index, 0))
+
+    def stop(self, name):
+        sound = self.sounds.get(name)
+        if sound is None:
+            return
+        for index in self.groups[SOUND_CATEGORIES.get(name, "ui")]:
+            if self.channels[index].get_sound() is sound:
+                self.channels[index].stop()
@@ -1,13 +1,40 @@
+from startup import StartupTimer
+startup_timer = StartupTimer() # Created before importing pygame so the report includes it
+
 import pygame
 import math
 import random
 import os
 import sys
+import argparse
 import time # Import time module for cooldowns/timers
 
-# Initialize pygame with sound
-pygame.init()
-pygame.mixer.init()
+from asset_loader import AssetLoader
+from asset_pack import AssetPackBuilder, open_asset_pack, PACK_FILE
+from asset_cache import AssetCache
+from music_controller import MusicController
+from sfx_mixer import SoundMixer
+from positional_audio import PositionalAudio
+from sound_bank import SoundBank, SYNTH_AVAILABLE
+from frame_profiler import FrameProfiler
+from metrics_recorder import MetricsRecorder, METRICS_FORMATS
+from sampling_profiler import SamplingProfiler, DEFAULT_SAMPLE_RATE
+from frame_watchdog import FrameWatchdog, WATCHDOG_BUDGET_MS
+from gc_manager import GCManager
+from light_map import LightMap, LIGHT_MAP_AVAILABLE
+from view import View, AutoRenderScale, RENDER_SCALES, fit_viewport
+from camera import Camera, ChunkCache, SpatialGrid
+from level_file import LevelFile, ChunkStreamer
+from maze_generator import generate_maze
+from clearance import ClearanceField, CLEARANCE_AVAILABLE
+from quality_governor import QualityGovernor, QUALITY_LEVELS, QUALITY_ORDER
+
+startup_timer.mark("import pygame")
+
+# Nothing is initialized at import time. The display, fonts, mixer and level
+# data are created the first time they are needed (see init_display(),
+# get_font(), init_audio() and ensure_level_coins()), so tools can import this
+# module without opening a window or touching the audio device.
 
 # Game Constants
 WIDTH, HEIGHT = 800, 600
@@ -26,10 +53,16 @@ ENEMY_COLOR = (255, 0, 0)   # Red for enemies
 BOSS_COLOR = (150, 0, 150) # Purple for boss
 PLAYER_SPEED = 5
 ENEMY_SPEED = 2
+ENEMY_STEER_CLEARANCE = 40 # Wandering enemies closer than this to a wall turn away from it
 BOSS_SPEED = 3 # Boss might need a different speed
 TEXT_COLOR = (255, 255, 255)
 FLASHLIGHT_ANGLE = math.radians(30)
 FLASHLIGHT_LENGTH = 200
+UNLIT_ENEMY_DISTANCE = FLASHLIGHT_LENGTH + 60 # Further from the player than this, an enemy can't be in the light
+LASER_GLOW_RADIUS = 60
+LASER_LIGHT_COLOR = (1.0, 0.35, 0.3)
+STOMP_LIGHT_COLOR = (1.0, 0.6, 0.25)
+TORCH_LIGHT_COLOR = (1.0, 0.75, 0.45)
 
 # Player Damage
 PLAYER_BASIC_DAMAGE = 0.2
@@ -59,15 +92,69 @@ MAX_HELPER_GHOSTS = 3
 # Coin requirement for Boss Door (Adjust as needed)
 COINS_FOR_BOSS_DOOR = 20 # Total coins needed
 
-# Create screen
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Door Explorer")
-
-# Fonts
-font = pygame.font.Font(None, 36)
-title_font = pygame.font.Font(None, 72)
-small_font = pygame.font.Font(None, 24)
-boss_font = pygame.font.Font(None, 28) # Smaller font for boss info
+# Display (created by init_display())
+# Everything is laid out in WIDTH x HEIGHT logical coordinates. The window can
+# be resized or made fullscreen: screen is then the largest 4:3 area in the
+# middle of it (a subsurface, with black bars around it) and ui_view draws
+# logical coordinates onto it at the matching scale. Both are replaced by
+# update_display_layout() whenever the window size changes, which also drops
+# every cache of scaled sprites and prerendered frames sized for the old one.
+screen = None
+ui_view = None
+window_size = (WIDTH, HEIGHT) # Windowed size, kept while fullscreen
+
+def init_display():
+    if screen is None:
+        pygame.display.init()
+        set_display_mode()
+        pygame.display.set_caption("Door Explorer")
+    return screen
+
+def set_display_mode():
+    if game_settings["fullscreen"]:
+        pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+    else:
+        pygame.display.set_mode(window_size, pygame.RESIZABLE)
+    update_display_layout()
+
+def update_display_layout():
+    global screen, ui_view, world_view, pause_backdrop
+    window = pygame.display.get_surface()
+    viewport, scale = fit_viewport(window.get_size(), (WIDTH, HEIGHT))
+    if (screen is not None and (screen.get_parent() or screen) is window
+            and ui_view.scale == scale and screen.get_abs_offset() == viewport.topleft):
+        return # Same layout, keep the caches
+    window.fill(BLACK) # Letterbox bars, never drawn over
+    screen = window if viewport.size == window.get_size() else window.subsurface(viewport)
+    ui_view = View(screen, scale)
+    world_view = None
+    pause_backdrop = None
+
+FULLSCREEN_KEY = pygame.K_F11
+
+def toggle_fullscreen():
+    global window_size
+    if not game_settings["fullscreen"]:
+        window_size = pygame.display.get_surface().get_size() # Restored when leaving fullscreen
+    game_settings["fullscreen"] = not game_settings["fullscreen"]
+    set_display_mode()
+
+def logical_mouse_pos():
+    return ui_view.to_logical(pygame.mouse.get_pos())
+
+# Fonts (created by get_font() on first use)
+FONT_SIZE = 36
+TITLE_FONT_SIZE = 72
+SMALL_FONT_SIZE = 24
+BOSS_FONT_SIZE = 28 # Smaller font for boss info
+fonts = {}
+
+def get_font(size):
+    if size not in fonts:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        fonts[size] = pygame.font.Font(None, size)
+    return fonts[size]
 
 # Game Settings
 game_settings = {
@@ -75,15 +162,67 @@ game_settings = {
     "sound_volume": 0.5,  # 0.0 to 1.0
     "brightness": 0.7,     # 0.0 to 1.0 (affects flashlight darkness)
     "use_custom_models": True,
-    "use_custom_backgrounds": True
+    "use_custom_backgrounds": True,
+    "render_scale": 1.0,          # World and lighting resolution relative to the window (see view.py)
+    "auto_render_scale": False,   # Lower render_scale automatically when frames run over budget
+    "quality": "high",            # Detail preset, see quality_governor.py
+    "auto_quality": False,        # Let the quality governor pick the preset from frame times
+    "fullscreen": False
+}
+
+def quality_level():
+    return QUALITY_LEVELS[game_settings["quality"]]
+
+def text_antialias():
+    return quality_level()["text_antialias"]
+
+# Game States
+MENU = 0
+PLAYING = 1
+PAUSED = 2
+GAME_OVER = 3
+OPTIONS = 4
+BOSS_FIGHT = 5 # New state for the boss fight
+GAME_WON = 6   # New state for winning the game
+LOADING = 7    # Waiting for the assets the next state needs
+game_state = MENU
+
+# Assets are looked up next to this file, not in the working directory
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def asset_path(file):
+    return os.path.join(ASSET_DIR, file)
+
+# Scaled images decoded from loose files are cached here between launches
+ASSET_CACHE_DIR = asset_path(".asset_cache")
+SOUND_CACHE_DIR = os.path.join(ASSET_CACHE_DIR, "sounds") # Synthesized stand-ins for missing sound files
+
+# Background asset loader (created by get_asset_loader() on first use).
+# Uses the packed archive if one has been built, with loose files (through the
+# asset cache) as fallback.
+asset_loader = None
+
+def get_asset_loader():
+    global asset_loader
+    if asset_loader is None:
+        asset_loader = AssetLoader(pack=open_asset_pack(asset_path(PACK_FILE)), cache=AssetCache(ASSET_CACHE_DIR))
+    return asset_loader
+
+# Assets needed before each gameplay state can start; everything else keeps
+# loading in the background while the player is already in the game.
+ASSET_GROUPS_FOR_STATE = {
+    PLAYING: ("core",),
+    BOSS_FIGHT: ("core", "boss"),
 }
 
 # Sound handling
 sounds = {}
-music = {} # Dictionary for music
+music_controller = None # Created by init_audio() once the mixer is open
+sfx_mixer = None # Created by init_audio(); plays sound effects on reserved channel groups
+positional_audio = None # Created by init_audio(); pans and attenuates sounds relative to the player
+MUSIC_CHANNELS = 2 # Mixer channels 0 and 1 are reserved for music crossfades, effects use the ones after
 
 def load_sounds():
-    global sounds
     sound_files = {
         "coin": "coin.wav",
         "door": "door.wav",
@@ -99,148 +238,150 @@ def load_sounds():
         "win": "win.wav" # Sound for winning the game
     }
 
-    # Try to load each sound
+    # Queue each sound on the background loader. Missing files are replaced by a
+    # synthesized stand-in where the sound bank has a recipe, otherwise they stay None
+    loader = get_asset_loader()
+    sound_bank = SoundBank(SOUND_CACHE_DIR)
+    synth_reported = False
     for name, file in sound_files.items():
-        try:
-            sounds[name] = pygame.mixer.Sound(file)
-            print(f"Loaded sound: {file}")
-        except:
-            sounds[name] = None
-            print(f"Could not load sound: {file}")
+        sounds[name] = None
+        group = "boss" if name.startswith("boss_") else "core"
+        on_loaded = lambda sound, name=name: sounds.__setitem__(name, sound)
+        path = asset_path(file)
+        if loader.has_file(path) or not sound_bank.has_recipe(name):
+            loader.load_sound(path, on_loaded, group)
+        else:
+            if not SYNTH_AVAILABLE and not synth_reported:
+                print("NumPy not installed, missing sounds will stay silent instead of being synthesized")
+                synth_reported = True
+            loader.load_generated(f"{file} (synthesized)", lambda name=name: sound_bank.sound(name), on_loaded, group)
+
+music_files = {
+    "menu_music": "menu.wav",
+    "game_music": "game_music.ogg",
+    "boss_music": "boss_music.ogg", # Add boss music
+    "win_music": "win_music.ogg" # Music for winning
+}
 
 def load_music():
-    global music
-    music_files = {
-        "menu_music": "menu.wav",
-        "game_music": "game_music.ogg",
-        "boss_music": "boss_music.ogg", # Add boss music
-        "win_music": "win_music.ogg" # Music for winning
-    }
+    # Decode every track in the background so switching tracks never blocks a frame
     for name, file in music_files.items():
-        try:
-            music[name] = file # Store filename, load with mixer.music.load() later
-            print(f"Found music file: {file}")
-        except:
-            music[name] = None
+        if get_asset_loader().has_file(asset_path(file)):
+            music_controller.preload(name, asset_path(file))
+        else:
             print(f"Could not find music file: {file}")
 
-def play_music(name, loop=-1):
-    if game_settings["sound_enabled"] and name in music and music[name] is not None:
+# The mixer is only opened the first time a sound or track actually plays
+audio_ready = None # None: not tried yet, True: mixer open, False: no audio device
+
+def init_audio():
+    global audio_ready, music_controller, sfx_mixer, positional_audio
+    if audio_ready is None:
         try:
-            pygame.mixer.music.stop() # Stop any currently playing music
-            pygame.mixer.music.load(music[name])
-            pygame.mixer.music.set_volume(game_settings["sound_volume"])
-            pygame.mixer.music.play(loop)
-            print(f"Playing music: {name}")
+            pygame.mixer.init()
+            sfx_mixer = SoundMixer(sounds, first_channel=MUSIC_CHANNELS) # Reserves the music channels too
+            positional_audio = PositionalAudio(sfx_mixer)
+            music_controller = MusicController(get_asset_loader(), first_channel=0)
+            music_controller.set_volume(game_settings["sound_volume"])
+            audio_ready = True
+            load_sounds()
+            load_music()
         except pygame.error as e:
-             print(f"Error playing music '{name}': {e}")
-        except Exception as e:
-            print(f"An unexpected error occurred while playing music '{name}': {e}")
+            audio_ready = False
+            print(f"Could not initialize audio: {e}")
+    return audio_ready
+
+def play_music(name, loop=-1):
+    # Crossfades to the track; if it is still decoding it starts as soon as it's ready
+    log_event(f"play music {name}")
+    if game_settings["sound_enabled"] and init_audio():
+        music_controller.play(name, loop)
 
 def stop_music():
-    pygame.mixer.music.stop()
+    if audio_ready:
+        music_controller.stop()
+
+def pause_music():
+    if audio_ready:
+        music_controller.pause()
+
+def resume_music():
+    if audio_ready:
+        music_controller.resume()
+
+def set_music_volume():
+    if audio_ready:
+        music_controller.set_volume(game_settings["sound_volume"] if game_settings["sound_enabled"] else 0)
+
+def music_is_playing():
+    return bool(audio_ready) and music_controller.is_busy()
 
 def play_sound(name):
-    if game_settings["sound_enabled"] and name in sounds and sounds[name] is not None:
-        try:
-            sounds[name].set_volume(game_settings["sound_volume"])
-            sounds[name].play()
-        except Exception as e:
-            print(f"Error playing sound '{name}': {e}")
+    if game_settings["sound_enabled"] and init_audio():
+        sfx_mixer.set_volume(game_settings["sound_volume"]) # Only reapplied to a Sound when it changed
+        return sfx_mixer.play(name)
+    return None
+
+def play_sound_at(name, position):
+    # Queued and played at the end of the frame, panned and attenuated relative to the player
+    if game_settings["sound_enabled"] and init_audio():
+        sfx_mixer.set_volume(game_settings["sound_volume"])
+        positional_audio.emit(name, position)
 
 def stop_sound(name):
-    if name in sounds and sounds[name] is not None:
-        try:
-            sounds[name].stop()
-            # print(f"Stopped sound: {name}") # Optional: Confirmation message
-        except Exception as e:
-            print(f"Error stopping sound '{name}': {e}")
-    # else:
-        # print(f"Sound '{name}' not loaded or not found to stop.")
+    if audio_ready:
+        sfx_mixer.stop(name)
 
 # Custom models
 player_sprites = {}
 enemy_sprites = {} # Will include default enemy and possibly helper ghosts
 item_sprites = {}
-level_background_image = {}
+level_background_image = None
 boss_sprites = {} # New dictionary for boss sprites
 
+def set_background_image(image):
+    global level_background_image
+    level_background_image = image
+
+pending_player_sprites = {}
+
+def set_player_sprite(direction, image):
+    global player_sprites
+    pending_player_sprites[direction] = image
+    # Only switch to custom player sprites once every direction has loaded
+    if len(pending_player_sprites) == 4:
+        player_sprites = dict(pending_player_sprites)
+
 def load_sprites():
-    global player_sprites, enemy_sprites, item_sprites, level_background_image, boss_sprites
+    # Queue every sprite on the background loader. Each one is stored as soon as
+    # it is ready; until then (or if it fails) the default shapes are drawn.
+    loader = get_asset_loader()
 
     # --- Item Sprites ---
-    try:
-        item_sprites["coin"] = pygame.image.load("coin.png")
-        item_sprites["coin"] = pygame.transform.scale(item_sprites["coin"], (40, 40))
-        item_sprites["door"] = pygame.image.load("door.png")
-        item_sprites["door"] = pygame.transform.scale(item_sprites["door"], (50, 100))
-        item_sprites["window"] = pygame.image.load("window.png")
-        item_sprites["window"] = pygame.transform.scale(item_sprites["window"], (80, 50))
-        print("Loaded item sprites")
-    except:
-        item_sprites = {}
-        print("Could not load item sprites, using default shapes")
+    loader.load_image(asset_path("coin.png"), (40, 40), lambda image: item_sprites.__setitem__("coin", image))
+    loader.load_image(asset_path("door.png"), (50, 100), lambda image: item_sprites.__setitem__("door", image))
+    loader.load_image(asset_path("window.png"), (80, 50), lambda image: item_sprites.__setitem__("window", image))
 
     # --- Player Sprites ---
-    try:
-        # Load sprites for each direction
-        player_sprites = {
-            "right": pygame.image.load("player_right.png"), # Assuming specific direction sprites
-            "left": pygame.image.load("player_left.png"),
-            "up": pygame.image.load("player_up.png"),
-            "down": pygame.image.load("player_down.png")
-        }
-        # Scale sprites to player size
-        for direction in list(player_sprites.keys()): # Iterate over a copy of keys
-             if player_sprites[direction] is not None: # Only scale if loaded
-                player_sprites[direction] = pygame.transform.scale(player_sprites[direction], (40, 40))
-        print("Loaded player sprites")
-    except:
-        player_sprites = {}
-        print("Could not load player sprites, using default shapes")
+    # Load sprites for each direction (scaled to player size)
+    for direction in ["right", "left", "up", "down"]:
+        loader.load_image(asset_path(f"player_{direction}.png"), (40, 40), lambda image, direction=direction: set_player_sprite(direction, image))
 
     # --- Enemy Sprites ---
-    try:
-        enemy_sprites["default"] = pygame.image.load("enemy.png") # Default enemy/ghost
-        enemy_sprites["default"] = pygame.transform.scale(enemy_sprites["default"], (30, 30)) # Scale for regular enemies
-        # If helper ghosts should look different, load another sprite here
-        # enemy_sprites["helper_ghost"] = pygame.image.load("helper_ghost.png")
-        # enemy_sprites["helper_ghost"] = pygame.transform.scale(enemy_sprites["helper_ghost"], (30, 30))
-        print("Loaded enemy sprites")
-    except:
-        enemy_sprites = {}
-        print("Could not load enemy sprites, using default shapes")
+    # Default enemy/ghost, scaled for regular enemies
+    loader.load_image(asset_path("enemy.png"), (30, 30), lambda image: enemy_sprites.__setitem__("default", image))
+    # If helper ghosts should look different, load another sprite here
+    # loader.load_image(asset_path("helper_ghost.png"), (30, 30), lambda image: enemy_sprites.__setitem__("helper_ghost", image))
 
     # --- Boss Sprites ---
-    try:
-        boss_sprites["default"] = pygame.image.load("boss.png") # Load boss sprite
-        # Scale boss sprite (adjust size as needed)
-        boss_sprites["default"] = pygame.transform.scale(boss_sprites["default"], (100, 150))
-        # Add other boss state sprites if available (e.g., "boss_attack1", "boss_damaged")
-        print("Loaded boss sprites")
-    except:
-        boss_sprites = {}
-        print("Could not load boss sprite, using default shape")
+    # Only needed in the boss level, so the game can start without them
+    loader.load_image(asset_path("boss.png"), (100, 150), lambda image: boss_sprites.__setitem__("default", image), "boss")
+    # Add other boss state sprites if available (e.g., "boss_attack1", "boss_damaged")
 
     # --- Background Image ---
-    try:
-        level_background_image = pygame.image.load("background.png") # Load background.png
-        level_background_image = pygame.transform.scale(level_background_image, (WIDTH, HEIGHT)) # Scale to screen size
-        print("Loaded background image: background.png")
-    except:
-        level_background_image = None # Set to None if loading fails
-        print("Could not load background image, using default level colors.")
+    loader.load_image(asset_path("background.png"), (WIDTH, HEIGHT), set_background_image) # Scale to screen size
 
 
-# Game States
-MENU = 0
-PLAYING = 1
-PAUSED = 2
-GAME_OVER = 3
-OPTIONS = 4
-BOSS_FIGHT = 5 # New state for the boss fight
-GAME_WON = 6   # New state for winning the game
-game_state = MENU
 
 # Menu Buttons (adjust positions if adding more)
 start_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 - 80, 200, 60) # Shifted up
@@ -269,6 +410,29 @@ back_options_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 + 120, 200, 60)
 dragging_volume = False
 dragging_brightness = False
 
+# Idle mode. Menus, the pause screen and the end screens only change when the
+# player does something, so instead of drawing them 60 times a second the loop
+# waits for the next event and only redraws when the state, the hovered button
+# or a setting (slider, toggle) changed. The wait times out a few times a
+# second so music and background loading still make progress.
+IDLE_STATES = (MENU, OPTIONS, PAUSED, GAME_OVER, GAME_WON)
+IDLE_WAIT_TIMEOUT_MS = 250
+HOVER_RECTS = (start_button, resume_button, options_button, reset_button, menu_button, quit_button, retry_button,
+               win_menu_button, win_quit_button, back_options_button)
+
+def idle_screen_key():
+    """Everything an idle screen's look depends on, to tell whether it needs redrawing."""
+    mouse_pos = logical_mouse_pos()
+    return (game_state, level, tuple(rect.collidepoint(mouse_pos) for rect in HOVER_RECTS), tuple(game_settings.values()))
+
+def wait_for_idle_event(timeout_ms=IDLE_WAIT_TIMEOUT_MS):
+    """Sleeps until an event arrives (or timeout_ms passes) and returns it (NOEVENT on timeout).
+    The wait is then ticked off the clock, so the next frame's delta is an ordinary one and a
+    boss fight resumed from the pause screen doesn't jump ahead by however long it sat there."""
+    event = pygame.event.wait(timeout_ms)
+    clock.tick()
+    return event
+
 # Player Setup
 player = pygame.Rect(50, HEIGHT // 2, 40, 40)
 player_direction = 0  # 0: right, 1: down, 2: left, 3: up
@@ -295,9 +459,12 @@ class Enemy:
         self.movement_timer = 0
         self.is_alive = True # Add status
 
-    def update(self, player_rect, walls):
+    def update(self, player_rect, walls, steps=1, field=None):
+        """Moves the enemy; steps > 1 covers that many frames at once (for enemies updated less often).
+        With the level's clearance field, wandering enemies turn away from walls they are close to."""
         if not self.is_alive or self.level != level:
             return False # Not alive or not on current level
+        speed = self.speed * steps
 
         # Movement Logic (existing random or patrol)
         if self.patrol_mode and self.patrol_points:
@@ -308,13 +475,13 @@ class Enemy:
 
             distance = math.sqrt(dx**2 + dy**2)
 
-            if distance < self.speed: # Close enough to target
+            if distance < speed: # Close enough to target
                 self.current_target = (self.current_target + 1) % len(self.patrol_points)
             else:
                 # Normalize direction
                 if distance > 0:
-                    dx = dx / distance * self.speed
-                    dy = dy / distance * self.speed
+                    dx = dx / distance * speed
+                    dy = dy / distance * speed
 
                 new_x = self.rect.x + dx
                 new_y = self.rect.y + dy
@@ -334,16 +501,24 @@ class Enemy:
                 # For simplicity, we'll just let them move if possible.
         else:
             # Random movement (same as before)
-            self.movement_timer += 1
+            self.movement_timer += steps
             if self.movement_timer >= 60:
                 self.direction = random.choice([0, 1, 2, 3])
+                # Close to a wall, head away from it instead of (likely) into it
+                if field is not None and field.clearance(*self.rect.center) < ENEMY_STEER_CLEARANCE:
+                    away_x, away_y = field.gradient(*self.rect.center)
+                    if away_x or away_y:
+                        if abs(away_x) >= abs(away_y):
+                            self.direction = 0 if away_x > 0 else 2
+                        else:
+                            self.direction = 1 if away_y > 0 else 3
                 self.movement_timer = 0
 
             move_x, move_y = 0, 0
-            if self.direction == 0: move_x = self.speed
-            elif self.direction == 1: move_y = self.speed
-            elif self.direction == 2: move_x = -self.speed
-            elif self.direction == 3: move_y = -self.speed
+            if self.direction == 0: move_x = speed
+            elif self.direction == 1: move_y = speed
+            elif self.direction == 2: move_x = -speed
+            elif self.direction == 3: move_y = -speed
 
             test_rect_x = pygame.Rect(self.rect.x + move_x, self.rect.y, self.rect.width, self.rect.height)
             can_move_x = not any(test_rect_x.colliderect(wall) for wall in walls)
@@ -361,24 +536,25 @@ class Enemy:
                 if self.direction == 1: self.direction = 3
                 elif self.direction == 3: self.direction = 1
 
-            self.rect.x = max(0, min(WIDTH - self.rect.width, self.rect.x))
-            self.rect.y = max(0, min(HEIGHT - self.rect.height, self.rect.y))
+            world_width, world_height = level_size(self.level)
+            self.rect.x = max(0, min(world_width - self.rect.width, self.rect.x))
+            self.rect.y = max(0, min(world_height - self.rect.height, self.rect.y))
 
         # Check for collision with player
         return self.rect.colliderect(player_rect)
 
-    def draw(self, surface):
+    def draw(self, view):
          if self.is_alive and self.level == level:
             if game_settings["use_custom_models"] and "default" in enemy_sprites:
-                surface.blit(enemy_sprites["default"], self.rect)
+                view.image(enemy_sprites["default"], self.rect)
             else:
-                pygame.draw.rect(surface, ENEMY_COLOR, self.rect)
+                view.rect(ENEMY_COLOR, self.rect)
                 # Draw eyes if needed (same as before)
                 eye_size = 6
-                if self.direction == 0: pygame.draw.circle(surface, WHITE, (self.rect.right - 10, self.rect.y + 10), eye_size); pygame.draw.circle(surface, WHITE, (self.rect.right - 10, self.rect.y + 20), eye_size)
-                elif self.direction == 1: pygame.draw.circle(surface, WHITE, (self.rect.x + 10, self.rect.bottom - 10), eye_size); pygame.draw.circle(surface, WHITE, (self.rect.x + 20, self.rect.bottom - 10), eye_size)
-                elif self.direction == 2: pygame.draw.circle(surface, WHITE, (self.rect.x + 10, self.rect.y + 10), eye_size); pygame.draw.circle(surface, WHITE, (self.rect.x + 10, self.rect.y + 20), eye_size)
-                elif self.direction == 3: pygame.draw.circle(surface, WHITE, (self.rect.x + 10, self.rect.y + 10), eye_size); pygame.draw.circle(surface, WHITE, (self.rect.x + 20, self.rect.y + 10), eye_size)
+                if self.direction == 0: view.circle(WHITE, (self.rect.right - 10, self.rect.y + 10), eye_size); view.circle(WHITE, (self.rect.right - 10, self.rect.y + 20), eye_size)
+                elif self.direction == 1: view.circle(WHITE, (self.rect.x + 10, self.rect.bottom - 10), eye_size); view.circle(WHITE, (self.rect.x + 20, self.rect.bottom - 10), eye_size)
+                elif self.direction == 2: view.circle(WHITE, (self.rect.x + 10, self.rect.y + 10), eye_size); view.circle(WHITE, (self.rect.x + 10, self.rect.y + 20), eye_size)
+                elif self.direction == 3: view.circle(WHITE, (self.rect.x + 10, self.rect.y + 10), eye_size); view.circle(WHITE, (self.rect.x + 20, self.rect.y + 10), eye_size)
 
 # --- New Boss Class ---
 class Boss:
@@ -431,13 +607,13 @@ class Boss:
                      self.state = "dodging"
                      self.state_timer = 0
                      self.hits_taken_since_dodge = 0 # Reset counter
-                     self.choose_dodge_target(walls) # Determine dodge location
-                     play_sound("boss_stomp") # Use stomp sound for dodge? Or add a new one?
+                     self.choose_dodge_target() # Determine dodge location
+                     play_sound_at("boss_stomp", self.rect.center) # Use stomp sound for dodge? Or add a new one?
                 else:
                     next_attack = random.choice(available_attacks)
                     if next_attack == "laser":
                         self.state = "charging_laser"
-                        play_sound("boss_laser_charge")
+                        play_sound_at("boss_laser_charge", self.rect.center)
                     elif next_attack == "stomp":
                         self.state = "stomp_prep"
                     elif next_attack == "punch":
@@ -449,7 +625,7 @@ class Boss:
                 self.state = "firing_laser"
                 self.state_timer = 0
                 self.laser_rect = self.create_laser_rect(player_rect)
-                play_sound("boss_laser_fire") # Play laser fire sound
+                play_sound_at("boss_laser_fire", self.rect.center) # Play laser fire sound
 
         elif self.state == "firing_laser":
             # Laser is active, check collision with player
@@ -464,7 +640,7 @@ class Boss:
                  self.state = "stomp_aoe"
                  self.state_timer = 0
                  self.stomp_rect = self.create_stomp_rect()
-                 play_sound("boss_stomp") # Play stomp sound
+                 play_sound_at("boss_stomp", self.rect.center) # Play stomp sound
 
         elif self.state == "stomp_aoe":
              if self.state_timer >= BOSS_STOMP_AOE_TIME:
@@ -478,7 +654,7 @@ class Boss:
                 self.state = "punch_active"
                 self.state_timer = 0
                 self.punch_rect = self.create_punch_rect() # Determine punch hitbox based on player position? Or fixed area? Let's make it a frontal area.
-                play_sound("boss_punch") # Play punch sound
+                play_sound_at("boss_punch", self.rect.center) # Play punch sound
 
         elif self.state == "punch_active":
             # Punch hitbox is active, check collision with player
@@ -514,14 +690,15 @@ class Boss:
                 self.state_timer = 0
 
         # Keep boss within bounds (optional, depends on arena design)
-        self.rect.x = max(0, min(WIDTH - self.rect.width, self.rect.x))
-        self.rect.y = max(0, min(HEIGHT - self.rect.height, self.rect.y))
+        world_width, world_height = level_size(self.level)
+        self.rect.x = max(0, min(world_width - self.rect.width, self.rect.x))
+        self.rect.y = max(0, min(world_height - self.rect.height, self.rect.y))
 
 
     def take_damage(self, amount):
         if self.is_alive:
             self.health -= amount
-            play_sound("boss_hit") # Play boss hit sound
+            play_sound_at("boss_hit", self.rect.center) # Play boss hit sound
             if amount == PLAYER_BASIC_DAMAGE: # Only count basic hits for dodge counter
                  self.hits_taken_since_dodge += amount * 2 # Increment by 1 for each 0.5 damage
                  print(f"Basic hit. Hits since dodge: {self.hits_taken_since_dodge}")
@@ -595,15 +772,15 @@ class Boss:
         return pygame.Rect(self.rect.right, self.rect.centery - punch_height // 2, punch_width, punch_height) # Example: punches to the right
 
 
-    def draw(self, surface):
+    def draw(self, view):
         if not self.is_alive:
             return # Don't draw if dead
 
         # Draw boss sprite or shape
         if game_settings["use_custom_models"] and "default" in boss_sprites:
-             surface.blit(boss_sprites["default"], self.rect)
+             view.image(boss_sprites["default"], self.rect)
         else:
-            pygame.draw.rect(surface, BOSS_COLOR, self.rect)
+            view.rect(BOSS_COLOR, self.rect)
 
         # Draw boss health bar
         health_bar_width = self.rect.width
@@ -612,16 +789,15 @@ class Boss:
         health_bar_y = self.rect.y - health_bar_height - 5 # Above the boss
 
         # Background bar (red)
-        pygame.draw.rect(surface, (200, 0, 0), (health_bar_x, health_bar_y, health_bar_width, health_bar_height))
+        view.rect((200, 0, 0), (health_bar_x, health_bar_y, health_bar_width, health_bar_height))
 
         # Foreground bar (green)
         current_health_width = (self.health / self.max_health) * health_bar_width
-        pygame.draw.rect(surface, (0, 200, 0), (health_bar_x, health_bar_y, current_health_width, health_bar_height))
+        view.rect((0, 200, 0), (health_bar_x, health_bar_y, current_health_width, health_bar_height))
 
         # Health text
-        health_text = boss_font.render(f"{int(self.health)}/{int(self.max_health)}", True, WHITE)
-        text_rect = health_text.get_rect(center=(health_bar_x + health_bar_width // 2, health_bar_y + health_bar_height // 2))
-        surface.blit(health_text, text_rect)
+        health_text = get_font(view.font_size(BOSS_FONT_SIZE)).render(f"{int(self.health)}/{int(self.max_health)}", text_antialias(), WHITE)
+        view.text(health_text, center=(health_bar_x + health_bar_width // 2, health_bar_y + health_bar_height // 2))
 
 
         # Draw attack visualizations (approximations)
@@ -629,33 +805,33 @@ class Boss:
             # Draw a line showing the target direction during charge
             start_pos = self.rect.center
             end_pos = player.center # Player's current position
-            pygame.draw.line(surface, (255, 0, 0, 100), start_pos, end_pos, 5) # Semi-transparent red line
+            view.line((255, 0, 0, 100), start_pos, end_pos, 5) # Semi-transparent red line
 
         elif self.state == "firing_laser" and hasattr(self, 'laser_start_pos') and hasattr(self, 'laser_end_pos'):
              # Draw the actual laser line
-             pygame.draw.line(surface, (255, 0, 0), self.laser_start_pos, self.laser_end_pos, 10) # Solid red line
+             view.line((255, 0, 0), self.laser_start_pos, self.laser_end_pos, 10) # Solid red line
 
         elif self.state == "stomp_aoe" and self.stomp_rect:
              # Draw the AOE circle/rectangle
-             pygame.draw.ellipse(surface, (255, 100, 0, 150), self.stomp_rect.inflate(20,20)) # Draw slightly bigger to show effect
+             view.ellipse((255, 100, 0, 150), self.stomp_rect.inflate(20,20)) # Draw slightly bigger to show effect
 
         elif self.state == "punch_active" and self.punch_rect:
              # Draw the punch hitbox area
-             pygame.draw.rect(surface, (255, 100, 0, 150), self.punch_rect) # Draw slightly bigger to show effect
+             view.rect((255, 100, 0, 150), self.punch_rect) # Draw slightly bigger to show effect
 
 
     # Helper method to find a valid dodge target
-    def choose_dodge_target(self, walls):
+    def choose_dodge_target(self):
         # Find a random point within the arena bounds that is not too close to walls or the player
         arena_rect = pygame.Rect(20, 20, WIDTH - 40, HEIGHT - 40) # Example arena bounds
 
-        for _ in range(50): # Try up to 50 times to find a valid spot
+        for attempt in range(50): # Try up to 50 times to find a valid spot
             target_x = random.randint(arena_rect.left + self.rect.width, arena_rect.right - self.rect.width)
             target_y = random.randint(arena_rect.top + self.rect.height, arena_rect.bottom - self.rect.height)
             test_rect = pygame.Rect(target_x - self.rect.width // 2, target_y - self.rect.height // 2, self.rect.width, self.rect.height) # Center the test rect on the target point
 
             # Check collision with walls
-            collides_with_wall = any(test_rect.colliderect(wall) for wall in walls)
+            collides_with_wall = not rect_clear_of_walls(self.level, test_rect)
 
             # Check distance to player (don't dodge too close)
             distance_to_player = math.dist((target_x, target_y), player.center)
@@ -664,11 +840,13 @@ class Boss:
             if not collides_with_wall and not too_close_to_player:
                 self.dodge_target = (target_x, target_y)
                 print(f"Boss dodging to {self.dodge_target}")
+                log_event(f"boss dodge target found after {attempt + 1} tries")
                 return
 
         # If no valid target found after tries, just move randomly or stay put
         self.dodge_target = self.rect.center # Stay put if nowhere good to go
         print("Boss failed to find valid dodge target, staying put.")
+        log_event("boss dodge target not found after 50 tries")
 
 
 # Walls by level
@@ -761,55 +939,121 @@ windows_by_level = {
     ]
 }
 
+# Torches: static lights baked into each level's light map (x, y, radius, intensity, color)
+torches_by_level = {
+    0: [(40, 40, 110, 0.4, TORCH_LIGHT_COLOR), (210, 270, 90, 0.35, TORCH_LIGHT_COLOR),
+        (WIDTH - 40, HEIGHT - 40, 110, 0.4, TORCH_LIGHT_COLOR)],
+    1: [(110, 320, 90, 0.35, TORCH_LIGHT_COLOR), (510, 290, 90, 0.35, TORCH_LIGHT_COLOR),
+        (610, 440, 100, 0.4, TORCH_LIGHT_COLOR)],
+    2: [(210, 270, 90, 0.35, TORCH_LIGHT_COLOR), (610, 270, 90, 0.35, TORCH_LIGHT_COLOR),
+        (400, 140, 110, 0.4, TORCH_LIGHT_COLOR)],
+    3: [(x, y, 130, 0.6, TORCH_LIGHT_COLOR) for x in (WIDTH // 4, WIDTH * 3 // 4) for y in (HEIGHT // 4, HEIGHT * 3 // 4)], # Braziers on the pillars
+}
+
 # Back to Level 0 Button (only appears in levels 1 and 2)
 back_rect = pygame.Rect(WIDTH - 150, 50, 100, 50)
 
-# Initialize enemies for each level (excluding the boss)
-enemies = [
-    # Level 0 enemies
-    Enemy(300, 200, 0),
-    Enemy(500, 400, 0, [(500, 400), (600, 400), (600, 500), (500, 500)]),  # Patrolling enemy
+# World size of levels larger than the screen; the camera scrolls over them
+level_sizes = {}
+
+def level_size(level_num):
+    return level_sizes.get(level_num, (WIDTH, HEIGHT))
+
+# Spatial index of each level (see camera.py), built on first use. Walls and
+# doors/windows never move; coins are added by add_coins() and dropped when
+# collected. In scrolling levels enemies are re-bucketed as they move, and the
+# whole enemy grid is rebuilt when the enemies list is replaced or grows.
+# The index also holds the level's clearance field (see clearance.py), except
+# for a streamed level, whose walls come and go with its chunks.
+level_indexes = {}
+
+def get_level_index(level_num):
+    index = level_indexes.get(level_num)
+    if index is None:
+        index = level_indexes[level_num] = {"walls": SpatialGrid(), "objects": SpatialGrid(), "coins": SpatialGrid(),
+                                            "enemies": SpatialGrid(), "enemy_list": None, "enemy_count": 0, "clearance": None}
+        for wall in walls_by_level.get(level_num, []):
+            index["walls"].insert(wall, wall)
+        for item in doors_by_level.get(level_num, []) + windows_by_level.get(level_num, []):
+            index["objects"].insert(item, item["rect"])
+        streamed = level_stream is not None and level_num == level_stream.level_file.level
+        if CLEARANCE_AVAILABLE and not streamed:
+            index["clearance"] = ClearanceField(walls_by_level.get(level_num, []), level_size(level_num))
+    return index
+
+def rect_clear_of_walls(level_num, rect):
+    # Settled in O(1) by the clearance field unless rect is close to a wall; then the walls near it are checked
+    index = get_level_index(level_num)
+    field = index["clearance"]
+    if field is not None and field.is_rect_clear(rect):
+        return True
+    return not any(rect.colliderect(wall) for wall in index["walls"].query(rect))
+
+def is_scrolling_level(level_num):
+    return level_size(level_num) != (WIDTH, HEIGHT)
+
+def enemies_in_view(level_index):
+    if not is_scrolling_level(level):
+        return enemies # The whole level is on screen
+    sync_enemy_index(level_index, level)
+    return level_index["enemies"].query(camera.rect)
+
+def sync_enemy_index(index, level_num):
+    """Rebuilds a level's enemy grid if the enemies list was replaced or grew since the last call."""
+    if index["enemy_list"] is enemies and index["enemy_count"] == len(enemies):
+        return
+    index["enemy_list"], index["enemy_count"] = enemies, len(enemies)
+    index["enemies"].clear()
+    for enemy in enemies:
+        if enemy.level == level_num:
+            index["enemies"].insert(enemy, enemy.rect)
+
+# Enemies for each level (excluding the boss), created by reset_game()
+def create_level_enemies():
+    return [
+        # Level 0 enemies
+        Enemy(300, 200, 0),
+        Enemy(500, 400, 0, [(500, 400), (600, 400), (600, 500), (500, 500)]),  # Patrolling enemy
 
-    # Level 1 enemies
-    Enemy(150, 300, 1),
-    Enemy(400, 150, 1),
-    Enemy(600, 300, 1, [(600, 300), (700, 300), (700, 500), (600, 500)]),
+        # Level 1 enemies
+        Enemy(150, 300, 1),
+        Enemy(400, 150, 1),
+        Enemy(600, 300, 1, [(600, 300), (700, 300), (700, 500), (600, 500)]),
+
+        # Level 2 enemies
+        Enemy(300, 200, 2),
+        Enemy(500, 400, 2),
+        Enemy(650, 300, 2),
+        Enemy(400, 150, 2, [(400, 150), (500, 150), (500, 300), (400, 300)]),
 
-    # Level 2 enemies
-    Enemy(300, 200, 2),
-    Enemy(500, 400, 2),
-    Enemy(650, 300, 2),
-    Enemy(400, 150, 2, [(400, 150), (500, 150), (500, 300), (400, 300)]),
+        # Level 3 (Boss level) enemies - These will be helper ghosts spawned *during* the fight
+        # We don't define them here, they are created dynamically
+    ]
 
-    # Level 3 (Boss level) enemies - These will be helper ghosts spawned *during* the fight
-    # We don't define them here, they are created dynamically
-]
+enemies = []
 
 # --- New Boss Instance ---
 boss = None # Boss variable, initialized to None
 
-# Function to generate coins for a level
-def generate_coins(level_num, num_coins=10):
+# Function to generate coins for a level (or for the part of it inside area)
+def generate_coins(level_num, num_coins=10, area=None):
     level_coins = []
-    # Get walls, doors, windows for this level to avoid placing coins on them
-    level_walls = walls_by_level.get(level_num, [])
-    level_doors = [d["rect"] for d in doors_by_level.get(level_num, [])]
-    level_windows = [w["rect"] for w in windows_by_level.get(level_num, [])]
+    world_width, world_height = level_size(level_num)
+    bounds = pygame.Rect(50, 50, world_width - 100, world_height - 100) # Keep clear of the border walls
+    if area is not None:
+        bounds = bounds.clip(area)
+    objects = get_level_index(level_num)["objects"] # Doors and windows
 
     for _ in range(num_coins):
         attempts = 0
         while attempts < 100: # Limit attempts to avoid infinite loop
-            coin_x = random.randint(50, WIDTH - 50)
-            coin_y = random.randint(50, HEIGHT - 50)
+            coin_x = random.randint(bounds.left, bounds.right)
+            coin_y = random.randint(bounds.top, bounds.bottom)
             coin_rect = pygame.Rect(coin_x, coin_y, 20, 20)
 
             # Ensure coins don't spawn on walls, doors or windows
-            valid_position = True
-            if any(coin_rect.colliderect(wall) for wall in level_walls):
-                valid_position = False
-            if valid_position and any(coin_rect.colliderect(door_rect) for door_rect in level_doors):
-                 valid_position = False
-            if valid_position and any(coin_rect.colliderect(window_rect) for window_rect in level_windows):
+            valid_position = rect_clear_of_walls(level_num, coin_rect)
+            if valid_position and any(coin_rect.colliderect(item["rect"]) for item in objects.query(coin_rect)):
                  valid_position = False
 
             if valid_position:
@@ -834,12 +1078,121 @@ interaction_target = None # The door/window the player is near
 # Background Colors per Level
 level_colors = [(50, 50, 50), (100, 100, 255), (255, 100, 100), (50, 0, 50)] # Added color for boss level
 
-# Generate initial coins for all levels
+# Coins are generated per level the first time the player enters it
+coins_per_level = {0: 15, 1: 20, 2: 25} # No coins needed in boss level
 coins = []
-coins.extend(generate_coins(0, 15))
-coins.extend(generate_coins(1, 20))
-coins.extend(generate_coins(2, 25))
-# No coins needed in boss level
+coin_levels_generated = set()
+
+def add_coins(new_coins):
+    coins.extend(new_coins)
+    for coin in new_coins:
+        get_level_index(coin["level"])["coins"].insert(coin, coin["rect"])
+
+def clear_coins():
+    coins.clear()
+    for index in level_indexes.values():
+        index["coins"].clear()
+
+def ensure_level_coins(level_num):
+    if level_num not in coin_levels_generated:
+        coin_levels_generated.add(level_num)
+        if level_num in coins_per_level:
+            add_coins(generate_coins(level_num, coins_per_level[level_num]))
+        gc_manager.freeze_new() # The new level's data lives until the next reset
+
+# Streamed level (--level-file, see level_file.py). As chunks load around the
+# player their walls, doors, windows, coins and enemies are added to the usual
+# per-level lists and grids, and taken out again when the chunk is evicted.
+# The coins and enemies of a chunk are kept after it is evicted (its walls are
+# not), so going back finds them as they were left.
+level_stream = None
+streamed_chunk_state = {} # chunk coords -> (coins, enemies) of every chunk loaded so far
+
+def load_level_file(path):
+    global level_stream
+    level_file = LevelFile(path)
+    level_num = level_file.level
+    level_sizes[level_num] = level_file.size
+    walls_by_level[level_num], doors_by_level[level_num], windows_by_level[level_num] = [], [], []
+    level_indexes.pop(level_num, None)
+    level_stream = ChunkStreamer(level_file, add_level_chunk, remove_level_chunk)
+
+def add_level_chunk(chunk):
+    level_num = level_stream.level_file.level
+    index = get_level_index(level_num)
+    walls_by_level[level_num].extend(chunk.walls)
+    doors_by_level[level_num].extend(chunk.doors)
+    windows_by_level[level_num].extend(chunk.windows)
+    for wall in chunk.walls:
+        index["walls"].insert(wall, wall)
+    for item in chunk.doors + chunk.windows:
+        index["objects"].insert(item, item["rect"])
+
+    state = streamed_chunk_state.get(chunk.coords)
+    if state is None: # First visit
+        state = streamed_chunk_state[chunk.coords] = (generate_coins(level_num, chunk.coins, chunk.rect) if chunk.coins else [],
+                                                      [Enemy(x, y, level_num, patrol) for x, y, patrol in chunk.enemies])
+    add_coins(state[0])
+    enemies.extend(state[1])
+    static_layer.discard(chunk.rect.inflate(80, 80)) # Cost labels stick out of the chunk
+
+def remove_level_chunk(chunk):
+    global enemies
+    level_num = level_stream.level_file.level
+    index = get_level_index(level_num)
+    for wall in chunk.walls:
+        index["walls"].remove(wall)
+    for item in chunk.doors + chunk.windows:
+        index["objects"].remove(item)
+    removed = {id(item) for item in chunk.walls + chunk.doors + chunk.windows}
+    for items_by_level in (walls_by_level, doors_by_level, windows_by_level):
+        items_by_level[level_num] = [item for item in items_by_level[level_num] if id(item) not in removed]
+
+    chunk_coins, chunk_enemies = streamed_chunk_state[chunk.coords]
+    removed = {id(item) for item in chunk_coins + chunk_enemies}
+    for coin in chunk_coins:
+        index["coins"].remove(coin)
+    coins[:] = [coin for coin in coins if id(coin) not in removed]
+    enemies = [enemy for enemy in enemies if id(enemy) not in removed]
+    streamed_chunk_state[chunk.coords] = ([coin for coin in chunk_coins if not coin["collected"]],
+                                          [enemy for enemy in chunk_enemies if enemy.is_alive])
+    static_layer.discard(chunk.rect.inflate(80, 80))
+
+def enter_streamed_level():
+    # Starts (or restarts) the game in the streamed level, with only the chunks around the start loaded
+    global level
+    level_stream.unload_all()
+    streamed_chunk_state.clear()
+    level = level_stream.level_file.level
+    player.center = level_stream.level_file.start
+    level_stream.update(player.center)
+    level_stream.wait()
+
+# Generated maze (--maze, see maze_generator.py), played as level
+# GENERATED_LEVEL. It is built once at startup; every new game starts in it
+# with its enemies and coins put back.
+GENERATED_LEVEL = 4 # After the built-in levels
+MAZE_SIZE = (20, 15) # Cells; one screen is 10 x 7.5 cells
+generated_level = None
+
+def load_generated_level(seed, size=MAZE_SIZE):
+    global generated_level
+    start = time.perf_counter()
+    maze = generate_maze(seed, *size, GENERATED_LEVEL, window_targets=(1, 2))
+    print(f"Generated maze {seed} ({size[0]}x{size[1]} cells, {len(maze.walls)} walls) in {(time.perf_counter() - start) * 1000:.0f} ms")
+    level_sizes[GENERATED_LEVEL] = maze.size
+    walls_by_level[GENERATED_LEVEL] = maze.walls
+    doors_by_level[GENERATED_LEVEL] = maze.doors
+    windows_by_level[GENERATED_LEVEL] = maze.windows
+    level_indexes.pop(GENERATED_LEVEL, None)
+    generated_level = maze
+
+def enter_generated_level():
+    global level
+    level = GENERATED_LEVEL
+    player.topleft = generated_level.start
+    enemies.extend(Enemy(x, y, GENERATED_LEVEL, patrol) for x, y, patrol in generated_level.enemies)
+    add_coins([{"rect": rect.copy(), "level": GENERATED_LEVEL, "collected": False} for rect in generated_level.coins])
 
 # Function to reset the game
 def reset_game():
@@ -862,19 +1215,7 @@ def reset_game():
     last_skill_time = 0
 
     # Reset enemies
-    enemies = [] # Clear existing enemies
-    # Re-populate initial enemies for levels 0, 1, 2
-    enemies.extend([
-        Enemy(300, 200, 0),
-        Enemy(500, 400, 0, [(500, 400), (600, 400), (600, 500), (500, 500)]),
-        Enemy(150, 300, 1),
-        Enemy(400, 150, 1),
-        Enemy(600, 300, 1, [(600, 300), (700, 300), (700, 500), (600, 500)]),
-        Enemy(300, 200, 2),
-        Enemy(500, 400, 2),
-        Enemy(650, 300, 2),
-        Enemy(400, 150, 2, [(400, 150), (500, 150), (500, 300), (400, 300)]),
-    ])
+    enemies = create_level_enemies() # Re-populate initial enemies for levels 0, 1, 2
     print(f"Initial enemies reset. Total enemies: {len(enemies)}")
 
 
@@ -882,11 +1223,15 @@ def reset_game():
     boss = None # Clear boss instance
     last_ghost_spawn_time = 0 # Reset timer for helper ghosts
 
-    # Regenerate coins
-    coins = [] # Clear existing coins
-    coins.extend(generate_coins(0, 15))
-    coins.extend(generate_coins(1, 20))
-    coins.extend(generate_coins(2, 25)) # No coins in boss level
+    # Regenerate coins (other levels get theirs when first entered)
+    clear_coins()
+    coin_levels_generated.clear()
+    ensure_level_coins(0)
+    if level_stream is not None:
+        enter_streamed_level()
+    elif generated_level is not None:
+        enter_generated_level()
+    gc_manager.freeze() # Still on a menu, so the full collection goes unnoticed
 
     # Set initial game state
     game_state = MENU # Usually returns to menu after reset, but can be PLAYING if reset from pause
@@ -894,7 +1239,7 @@ def reset_game():
 
 # --- Drawing Functions (Modified) ---
 
-def draw_flashlight():
+def draw_flashlight(view):
     center_x, center_y = player.x + player.width // 2, player.y + player.height // 2
 
     # Determine angle based on player direction
@@ -908,37 +1253,111 @@ def draw_flashlight():
     elif player_direction == 3:  # Up
         angle = 3 * math.pi / 2
 
+    if get_light_map(view) is not None:
+        draw_lights(view, center_x, center_y, angle)
+        return
+
+    # Without NumPy: a hard-edged cone cut out of a flat dark overlay
     left_x = center_x + FLASHLIGHT_LENGTH * math.cos(angle - FLASHLIGHT_ANGLE)
     left_y = center_y + FLASHLIGHT_LENGTH * math.sin(angle - FLASHLIGHT_ANGLE)
     right_x = center_x + FLASHLIGHT_LENGTH * math.cos(angle + FLASHLIGHT_ANGLE)
     right_y = center_y + FLASHLIGHT_LENGTH * math.sin(angle + FLASHLIGHT_ANGLE)
 
     # Adjust darkness based on brightness setting (0.0 = pitch black, 1.0 = fully visible)
-    # In boss fight, maybe less darkness or a different effect? For now, keep consistent.
     darkness_alpha = int(255 * (1 - game_settings["brightness"]))
 
-    darkness = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+    darkness = pygame.Surface(view.surface.get_size(), pygame.SRCALPHA)
     darkness.fill((0, 0, 0, darkness_alpha))
-    pygame.draw.polygon(darkness, (0, 0, 0, 0), [(center_x, center_y), (left_x, left_y), (right_x, right_y)])
-    screen.blit(darkness, (0, 0))
+    View(darkness, view.scale, view.origin).polygon((0, 0, 0, 0), [(center_x, center_y), (left_x, left_y), (right_x, right_y)])
+    view.surface.blit(darkness, (0, 0))
+
+# Lighting (light_map.py). Created on first use, and again when the surface it
+# lights changes size (render scale) or the quality preset changes; None when
+# NumPy is missing
+light_map = None
+light_map_reported = False # Whether the missing NumPy has been mentioned
+
+def get_light_map(view):
+    global light_map, light_map_reported
+    if not LIGHT_MAP_AVAILABLE:
+        if not light_map_reported:
+            print("NumPy not installed, using the basic flashlight instead of the light map")
+            light_map_reported = True
+        return None
+    quality = quality_level()
+    if (light_map is None or (light_map.width, light_map.height) != view.surface.get_size()
+            or light_map.scale != quality["light_cell"] or light_map.smooth != quality["smooth_lighting"]):
+        light_map = LightMap(*view.surface.get_size(), quality["light_cell"], view.scale, quality["smooth_lighting"])
+    return light_map
+
+def draw_lights(view, center_x, center_y, angle):
+    if game_settings["brightness"] >= 1.0:
+        return # Every cell would saturate at full light, multiplying by it changes nothing
+    # Ambient light is the brightness setting (1.0 = fully visible), torches are baked per level
+    light_map.set_origin(*view.origin)
+    light_map.begin(game_settings["brightness"], level, torches_by_level.get(level, ()))
+    light_map.add_cone(center_x, center_y, angle, FLASHLIGHT_ANGLE, FLASHLIGHT_LENGTH)
+
+    if level == 3 and boss and boss.is_alive and quality_level()["effect_lights"]:
+        if boss.state == "firing_laser" and hasattr(boss, 'laser_start_pos') and hasattr(boss, 'laser_end_pos'):
+            light_map.add_segment(boss.laser_start_pos, boss.laser_end_pos, LASER_GLOW_RADIUS, 0.9, LASER_LIGHT_COLOR)
+        elif boss.state == "stomp_aoe" and boss.stomp_rect:
+            flash = max(0.0, 1 - boss.state_timer / BOSS_STOMP_AOE_TIME) # Fades out over the shockwave
+            light_map.add_point(*boss.stomp_rect.center, boss.stomp_rect.width * 0.75, 1.2 * flash, STOMP_LIGHT_COLOR)
+
+    light_map.apply(view.surface)
+
+# The world's View: straight onto the screen, or at render_scale below 1.0 into
+# an offscreen surface that is scaled up to it. Recreated (with an empty sprite
+# cache) when the render scale or the window layout changes. Its origin follows
+# the camera
+world_view = None
+camera = Camera(WIDTH, HEIGHT)
+render_scaler = AutoRenderScale(1000 / 60)
+quality_governor = QualityGovernor(game_settings, 1000 / 60)
+enemy_frame = 0 # Counts enemy updates, to stagger the ones that only move every few frames
+
+def get_world_view():
+    global world_view
+    render_scale = game_settings["render_scale"]
+    scale = ui_view.scale * render_scale
+    if world_view is None or world_view.scale != scale:
+        if render_scale == 1.0:
+            world_view = ui_view.subview(screen, (0, 0)) # Draw straight to the screen, nothing to scale up
+        else:
+            width, height = screen.get_size()
+            world_view = View(pygame.Surface((round(width * render_scale), round(height * render_scale)), 0, screen), scale)
+    return world_view
+
+def update_render_scale(frame_ms):
+    # Automatic mode: called once per gameplay frame with the time the last frame took
+    scale = render_scaler.update(game_settings["render_scale"], frame_ms)
+    if scale != game_settings["render_scale"]:
+        print(f"Render scale {game_settings['render_scale']} -> {scale}")
+        game_settings["render_scale"] = scale
+
+def update_quality(frame_ms):
+    # Automatic quality: called once per gameplay frame with the time the last frame took
+    previous = game_settings["quality"]
+    if quality_governor.update(frame_ms):
+        print(f"Quality {previous} -> {game_settings['quality']}")
+        log_event(f"quality {previous} -> {game_settings['quality']}")
 
 def draw_button(rect, text, hover_check=True):
-    mouse_pos = pygame.mouse.get_pos()
+    mouse_pos = logical_mouse_pos()
     button_color = BUTTON_HOVER_COLOR if (hover_check and rect.collidepoint(mouse_pos)) else BUTTON_COLOR
-    pygame.draw.rect(screen, button_color, rect, border_radius=10)
-    pygame.draw.rect(screen, WHITE, rect, 2, border_radius=10)  # Border
+    ui_view.rect(button_color, rect, border_radius=10)
+    ui_view.rect(WHITE, rect, 2, border_radius=10)  # Border
 
-    button_text = font.render(text, True, WHITE)
-    button_text_rect = button_text.get_rect(center=rect.center)
-    screen.blit(button_text, button_text_rect)
+    button_text = get_font(ui_view.font_size(FONT_SIZE)).render(text, text_antialias(), WHITE)
+    ui_view.text(button_text, center=rect.center)
 
 def draw_menu():
-    screen.fill(MENU_BG_COLOR)
+    ui_view.fill(MENU_BG_COLOR)
 
     # Draw title
-    title_text = title_font.render("Door Explorer", True, WHITE)
-    title_rect = title_text.get_rect(center=(WIDTH // 2, HEIGHT // 4)) # Shifted up
-    screen.blit(title_text, title_rect)
+    title_text = get_font(ui_view.font_size(TITLE_FONT_SIZE)).render("Door Explorer", text_antialias(), WHITE)
+    ui_view.text(title_text, center=(WIDTH // 2, HEIGHT // 4)) # Shifted up
 
     # Draw buttons
     draw_button(start_button, "Start Game")
@@ -955,88 +1374,200 @@ def draw_menu():
     ]
 
     for i, instruction in enumerate(instructions):
-        inst_text = small_font.render(instruction, True, WHITE)
-        screen.blit(inst_text, (WIDTH // 2 - 150, HEIGHT // 2 + 100 + i * 30))
+        inst_text = get_font(ui_view.font_size(SMALL_FONT_SIZE)).render(instruction, text_antialias(), WHITE)
+        ui_view.text(inst_text, (WIDTH // 2 - 150, HEIGHT // 2 + 100 + i * 30))
 
 def draw_options_menu():
-    screen.fill(MENU_BG_COLOR)
+    ui_view.fill(MENU_BG_COLOR)
 
     # Draw title
-    title_text = title_font.render("Options", True, WHITE)
-    title_rect = title_text.get_rect(center=(WIDTH // 2, HEIGHT // 6))
-    screen.blit(title_text, title_rect)
+    title_text = get_font(ui_view.font_size(TITLE_FONT_SIZE)).render("Options", text_antialias(), WHITE)
+    ui_view.text(title_text, center=(WIDTH // 2, HEIGHT // 6))
 
     # Sound toggle
-    sound_text = font.render("Sound Enabled:", True, WHITE)
-    screen.blit(sound_text, (WIDTH // 2 - 250, HEIGHT // 2 - 120))
+    sound_text = get_font(ui_view.font_size(FONT_SIZE)).render("Sound Enabled:", text_antialias(), WHITE)
+    ui_view.text(sound_text, (WIDTH // 2 - 250, HEIGHT // 2 - 120))
 
-    pygame.draw.rect(screen, WHITE, sound_toggle_rect, 2)
+    ui_view.rect(WHITE, sound_toggle_rect, 2)
     if game_settings["sound_enabled"]:
-        pygame.draw.rect(screen, (0, 255, 0), pygame.Rect(sound_toggle_rect.x + 5, sound_toggle_rect.y + 5, 20, 20))
+        ui_view.rect((0, 255, 0), pygame.Rect(sound_toggle_rect.x + 5, sound_toggle_rect.y + 5, 20, 20))
 
     # Volume slider
-    volume_text = font.render("Sound Volume:", True, WHITE)
-    screen.blit(volume_text, (WIDTH // 2 - 250, HEIGHT // 2 - 60))
+    volume_text = get_font(ui_view.font_size(FONT_SIZE)).render("Sound Volume:", text_antialias(), WHITE)
+    ui_view.text(volume_text, (WIDTH // 2 - 250, HEIGHT // 2 - 60))
 
-    pygame.draw.rect(screen, (100, 100, 100), volume_slider_rect, border_radius=5)
-    pygame.draw.rect(screen, (150, 150, 255), pygame.Rect(volume_slider_rect.x, volume_slider_rect.y,
+    ui_view.rect((100, 100, 100), volume_slider_rect, border_radius=5)
+    ui_view.rect((150, 150, 255), pygame.Rect(volume_slider_rect.x, volume_slider_rect.y,
                                                       int(game_settings["sound_volume"] * volume_slider_rect.width),
                                                       volume_slider_rect.height), border_radius=5)
-    pygame.draw.rect(screen, WHITE, volume_handle_rect, border_radius=5)
+    ui_view.rect(WHITE, volume_handle_rect, border_radius=5)
 
     # Brightness slider
-    brightness_text = font.render("Brightness:", True, WHITE)
-    screen.blit(brightness_text, (WIDTH // 2 - 250, HEIGHT // 2))
+    brightness_text = get_font(ui_view.font_size(FONT_SIZE)).render("Brightness:", text_antialias(), WHITE)
+    ui_view.text(brightness_text, (WIDTH // 2 - 250, HEIGHT // 2))
 
-    pygame.draw.rect(screen, (100, 100, 100), brightness_slider_rect, border_radius=5)
-    pygame.draw.rect(screen, (255, 255, 150), pygame.Rect(brightness_slider_rect.x, brightness_slider_rect.y,
+    ui_view.rect((100, 100, 100), brightness_slider_rect, border_radius=5)
+    ui_view.rect((255, 255, 150), pygame.Rect(brightness_slider_rect.x, brightness_slider_rect.y,
                                                       int(game_settings["brightness"] * brightness_slider_rect.width),
                                                       brightness_slider_rect.height), border_radius=5)
-    pygame.draw.rect(screen, WHITE, brightness_handle_rect, border_radius=5)
+    ui_view.rect(WHITE, brightness_handle_rect, border_radius=5)
 
     # Custom models toggle
-    models_text = font.render("Custom Models:", True, WHITE)
-    screen.blit(models_text, (WIDTH // 2 - 250, HEIGHT // 2 + 60))
+    models_text = get_font(ui_view.font_size(FONT_SIZE)).render("Custom Models:", text_antialias(), WHITE)
+    ui_view.text(models_text, (WIDTH // 2 - 250, HEIGHT // 2 + 60))
 
-    pygame.draw.rect(screen, WHITE, models_toggle_rect, 2)
+    ui_view.rect(WHITE, models_toggle_rect, 2)
     if game_settings["use_custom_models"]:
-        pygame.draw.rect(screen, (0, 255, 0), pygame.Rect(models_toggle_rect.x + 5, models_toggle_rect.y + 5, 20, 20))
+        ui_view.rect((0, 255, 0), pygame.Rect(models_toggle_rect.x + 5, models_toggle_rect.y + 5, 20, 20))
 
     # Back button
     draw_button(back_options_button, "Back")
 
-def draw_pause_menu():
-    # Semi-transparent overlay
-    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 180))
-    screen.blit(overlay, (0, 0))
+# Static layer: everything in a level that never changes, prerendered in chunks
+# by static_layer (camera.py). The chunks are redrawn when the level, a setting
+# they depend on or the loaded sprites change
+def draw_level_chunk(view, chunk_rect):
+    index = get_level_index(level)
+    if game_settings["use_custom_backgrounds"] and level_background_image is not None:
+        # The background covers one screen; larger levels repeat it
+        tile_width, tile_height = level_background_image.get_size()
+        for tile_x in range(chunk_rect.left // tile_width * tile_width, chunk_rect.right, tile_width):
+            for tile_y in range(chunk_rect.top // tile_height * tile_height, chunk_rect.bottom, tile_height):
+                view.image(level_background_image, (tile_x, tile_y))
+    else:
+        view.fill(level_colors[level % len(level_colors)])
+
+    for wall in index["walls"].query(chunk_rect):
+        view.rect(WALL_COLOR, wall)
+
+    # Doors and windows with their cost labels, which stick out above them
+    for item in index["objects"].query(chunk_rect.inflate(80, 80)):
+        sprite = item["type"] # "door" or "window"
+        if game_settings["use_custom_models"] and sprite in item_sprites:
+            view.image(item_sprites[sprite], item["rect"])
+        else:
+            view.rect(DOOR_COLOR if sprite == "door" else WINDOW_COLOR, item["rect"])
+
+        cost_x = item["rect"].x + item["rect"].width // 2 - 35
+        cost_y = item["rect"].y - 25
+        view.rect((50, 50, 50), pygame.Rect(cost_x, cost_y, 70, 20), border_radius=3)
+        cost_text = get_font(view.font_size(SMALL_FONT_SIZE)).render(f"Cost: {item['cost']}", text_antialias(), TEXT_COLOR)
+        view.text(cost_text, (cost_x + 5, cost_y + 2)) # Adjust text position inside bg
+
+    # The return button in levels 1 and 2
+    if level in (1, 2) and chunk_rect.colliderect(back_rect.inflate(20, 60)):
+        view.rect(BACK_RECT_COLOR, back_rect)
+        back_bg = pygame.Rect(back_rect.x - 5, back_rect.y - 25, 110, 20)
+        view.rect((50, 50, 50), back_bg, border_radius=3)
+        back_text = get_font(view.font_size(SMALL_FONT_SIZE)).render("Return (Enter)", text_antialias(), TEXT_COLOR)
+        view.text(back_text, (back_rect.x, back_rect.y - 20))
+
+static_layer = ChunkCache(draw_level_chunk)
+
+def draw_static_layer(view):
+    key = (level, game_settings["use_custom_backgrounds"], game_settings["use_custom_models"], text_antialias(),
+           level_background_image is not None, tuple(item_sprites))
+    static_layer.draw(view, camera.rect, key)
+
+# The world as it was when the game was paused (nothing is updated)
+def draw_paused_world(current_time):
+    view = ui_view.subview(screen, camera.rect.topleft) # Drawn once per pause, always at full resolution
+    level_index = get_level_index(level)
+    draw_static_layer(view)
+
+    # Draw coins (if in PLAYING state originally)
+    if level != 3: # Only draw coins if not the boss level
+        for coin in level_index["coins"].query(camera.rect):
+            if not coin["collected"]:
+                if game_settings["use_custom_models"] and "coin" in item_sprites:
+                    view.image(item_sprites["coin"], coin["rect"])
+                else:
+                    view.ellipse(COIN_COLOR, coin["rect"])
 
-    # Draw title
-    title_text = title_font.render("Game Paused", True, WHITE)
-    title_rect = title_text.get_rect(center=(WIDTH // 2, HEIGHT // 6))
-    screen.blit(title_text, title_rect)
+    # Draw enemies and boss (if they exist and were in the current level)
+    for enemy in enemies_in_view(level_index):
+        enemy.draw(view)
 
-    # Draw buttons
-    draw_button(resume_button, "Resume Game")
-    draw_button(options_button, "Options")
-    draw_button(reset_button, "Reset Game")
-    draw_button(menu_button, "Main Menu")
-    draw_button(quit_button, "Quit Game")
+    if level == 3 and boss and boss.is_alive: # Draw boss if in boss level
+         boss.draw(view)
+
+    # Draw player
+    # Apply flash effect if recently hit, even if paused
+    if current_time - last_hit_time < immunity_time:
+         if (current_time // 100) % 2 == 0:
+             if game_settings["use_custom_models"] and player_sprites:
+                 sprite_key = {0:"right", 1:"down", 2:"left", 3:"up"}.get(player_direction, "right")
+                 view.image(player_sprites.get(sprite_key, player_sprites["right"]), player)
+             else:
+                 view.rect(PLAYER_COLOR, player)
+    else:
+         if game_settings["use_custom_models"] and player_sprites:
+             sprite_key = {0:"right", 1:"down", 2:"left", 3:"up"}.get(player_direction, "right")
+             view.image(player_sprites.get(sprite_key, player_sprites["right"]), player)
+         else:
+             view.rect(PLAYER_COLOR, player)
+
+
+    frame_profiler.mark("world draw")
+    draw_flashlight(view) # Draw flashlight effect
+    frame_profiler.mark("flashlight")
+    draw_ui_elements() # Draw UI (coins, health, level)
+    # Draw boss health bar if boss exists and level is 3
+    if level == 3 and boss and boss.is_alive:
+         # Boss health bar is drawn within the boss.draw method, but it's drawn on the *screen* surface,
+         # so it appears correctly above the boss in the paused state.
+         pass # Nothing extra needed here if boss draws itself and its bar
+
+# Pause screen. Nothing moves while paused, so the world, the dark overlay, the
+# title and the buttons are drawn once into pause_backdrop when the game is
+# paused. Later frames only blit it and redraw the button under the mouse.
+pause_backdrop = None
+pause_backdrop_settings = None # game_settings the backdrop was drawn with
+PAUSE_BUTTONS = ((resume_button, "Resume Game"), (options_button, "Options"), (reset_button, "Reset Game"),
+                 (menu_button, "Main Menu"), (quit_button, "Quit Game"))
+
+def draw_pause_menu(current_time):
+    global pause_backdrop, pause_backdrop_settings
+    # Redrawn if a setting changed in the options menu (brightness, custom models...)
+    if pause_backdrop is None or pause_backdrop_settings != game_settings:
+        draw_paused_world(current_time)
+
+        # Semi-transparent overlay, blended into the backdrop once
+        overlay = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 180))
+        screen.blit(overlay, (0, 0))
+
+        # Draw title
+        title_text = get_font(ui_view.font_size(TITLE_FONT_SIZE)).render("Game Paused", text_antialias(), WHITE)
+        ui_view.text(title_text, center=(WIDTH // 2, HEIGHT // 6))
+
+        # Draw buttons
+        for rect, text in PAUSE_BUTTONS:
+            draw_button(rect, text, hover_check=False)
+
+        pause_backdrop = screen.copy()
+        pause_backdrop_settings = dict(game_settings)
+    else:
+        screen.blit(pause_backdrop, (0, 0))
+
+    # Only the hovered button differs from the backdrop
+    mouse_pos = logical_mouse_pos()
+    for rect, text in PAUSE_BUTTONS:
+        if rect.collidepoint(mouse_pos):
+            draw_button(rect, text)
 
 def draw_game_over():
-    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+    overlay = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
     overlay.fill((0, 0, 0, 200))
     screen.blit(overlay, (0, 0))
 
     # Draw title
-    title_text = title_font.render("Game Over", True, (255, 50, 50))
-    title_rect = title_text.get_rect(center=(WIDTH // 2, HEIGHT // 4))
-    screen.blit(title_text, title_rect)
+    title_text = get_font(ui_view.font_size(TITLE_FONT_SIZE)).render("Game Over", text_antialias(), (255, 50, 50))
+    ui_view.text(title_text, center=(WIDTH // 2, HEIGHT // 4))
 
     # Draw score
-    score_text = font.render(f"Coins Collected: {player_coins}", True, COIN_COLOR)
-    score_rect = score_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 50))
-    screen.blit(score_text, score_rect)
+    score_text = get_font(ui_view.font_size(FONT_SIZE)).render(f"Coins Collected: {player_coins}", text_antialias(), COIN_COLOR)
+    ui_view.text(score_text, center=(WIDTH // 2, HEIGHT // 2 - 50))
 
     # Draw buttons
     draw_button(retry_button, "Try Again")
@@ -1045,67 +1576,86 @@ def draw_game_over():
 
 # --- New Game Won Drawing Function ---
 def draw_game_won():
-    overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+    overlay = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
     overlay.fill((50, 50, 150, 200)) # Blue-ish overlay
     screen.blit(overlay, (0, 0))
 
     # Draw title
-    title_text = title_font.render("You Won!", True, (100, 255, 100)) # Green text
-    title_rect = title_text.get_rect(center=(WIDTH // 2, HEIGHT // 4))
-    screen.blit(title_text, title_rect)
+    title_text = get_font(ui_view.font_size(TITLE_FONT_SIZE)).render("You Won!", text_antialias(), (100, 255, 100)) # Green text
+    ui_view.text(title_text, center=(WIDTH // 2, HEIGHT // 4))
 
     # Draw score/stats
-    score_text = font.render(f"Coins Collected: {player_coins}", True, COIN_COLOR)
-    score_rect = score_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 50))
-    screen.blit(score_text, score_rect)
+    score_text = get_font(ui_view.font_size(FONT_SIZE)).render(f"Coins Collected: {player_coins}", text_antialias(), COIN_COLOR)
+    ui_view.text(score_text, center=(WIDTH // 2, HEIGHT // 2 - 50))
 
     # Draw buttons
     draw_button(win_menu_button, "Main Menu")
     draw_button(win_quit_button, "Quit Game")
 
+def draw_loading_screen(progress):
+    ui_view.fill(MENU_BG_COLOR)
+
+    # Draw title
+    title_text = get_font(ui_view.font_size(TITLE_FONT_SIZE)).render("Loading...", text_antialias(), WHITE)
+    ui_view.text(title_text, center=(WIDTH // 2, HEIGHT // 3))
+
+    # Progress bar
+    bar_rect = pygame.Rect(WIDTH // 2 - 150, HEIGHT // 2, 300, 30)
+    ui_view.rect((100, 100, 100), bar_rect, border_radius=5)
+    ui_view.rect(BUTTON_HOVER_COLOR, pygame.Rect(bar_rect.x, bar_rect.y, int(progress * bar_rect.width), bar_rect.height), border_radius=5)
+    ui_view.rect(WHITE, bar_rect, 2, border_radius=5)
+
+    percent_text = get_font(ui_view.font_size(SMALL_FONT_SIZE)).render(f"{int(progress * 100)}%", text_antialias(), WHITE)
+    ui_view.text(percent_text, center=(WIDTH // 2, bar_rect.bottom + 25))
+
 
 def draw_ui_elements():
     # Coin counter with border
     coin_bg = pygame.Rect(15, 15, 130, 40)
-    pygame.draw.rect(screen, (50, 50, 50), coin_bg, border_radius=5)
-    pygame.draw.rect(screen, COIN_COLOR, coin_bg, 2, border_radius=5)  # Gold border
+    ui_view.rect((50, 50, 50), coin_bg, border_radius=5)
+    ui_view.rect(COIN_COLOR, coin_bg, 2, border_radius=5)  # Gold border
 
-    coin_text = font.render(f"Coins: {player_coins}", True, COIN_COLOR)
-    screen.blit(coin_text, (25, 20))
+    coin_text = get_font(ui_view.font_size(FONT_SIZE)).render(f"Coins: {player_coins}", text_antialias(), COIN_COLOR)
+    ui_view.text(coin_text, (25, 20))
 
     # Level indicator
     level_bg = pygame.Rect(15, 65, 130, 40)
-    pygame.draw.rect(screen, (50, 50, 50), level_bg, border_radius=5)
-    pygame.draw.rect(screen, WHITE, level_bg, 2, border_radius=5)  # White border
+    ui_view.rect((50, 50, 50), level_bg, border_radius=5)
+    ui_view.rect(WHITE, level_bg, 2, border_radius=5)  # White border
 
-    level_text = font.render(f"Level: {level}", True, WHITE)
-    screen.blit(level_text, (25, 70))
+    level_text = get_font(ui_view.font_size(FONT_SIZE)).render(f"Level: {level}", text_antialias(), WHITE)
+    ui_view.text(level_text, (25, 70))
 
     # Health indicator
     health_bg = pygame.Rect(15, 115, 130, 40)
-    pygame.draw.rect(screen, (50, 50, 50), health_bg, border_radius=5)
-    pygame.draw.rect(screen, (255, 50, 50), health_bg, 2, border_radius=5)  # Red border
+    ui_view.rect((50, 50, 50), health_bg, border_radius=5)
+    ui_view.rect((255, 50, 50), health_bg, 2, border_radius=5)  # Red border
 
-    health_text = font.render(f"Health: {int(player_health)}/{int(player_max_health)}", True, (255, 50, 50)) # Cast to int for display
-    screen.blit(health_text, (25, 120))
+    health_text = get_font(ui_view.font_size(FONT_SIZE)).render(f"Health: {int(player_health)}/{int(player_max_health)}", text_antialias(), (255, 50, 50)) # Cast to int for display
+    ui_view.text(health_text, (25, 120))
 
     # Skill Cooldown Indicator (only show in boss fight or maybe always?)
     if game_state == BOSS_FIGHT or True: # Show always for testing
          skill_bg = pygame.Rect(WIDTH - 150, 15, 130, 40)
-         pygame.draw.rect(screen, (50, 50, 50), skill_bg, border_radius=5)
+         ui_view.rect((50, 50, 50), skill_bg, border_radius=5)
          skill_color = (0, 255, 0) if skill_ready else (255, 255, 0) # Green if ready, Yellow if on cooldown
-         pygame.draw.rect(screen, skill_color, skill_bg, 2, border_radius=5)
+         ui_view.rect(skill_color, skill_bg, 2, border_radius=5)
 
-         skill_text = font.render("Skill", True, WHITE)
-         screen.blit(skill_text, (WIDTH - 140, 20))
+         skill_text = get_font(ui_view.font_size(FONT_SIZE)).render("Skill", text_antialias(), WHITE)
+         ui_view.text(skill_text, (WIDTH - 140, 20))
 
          if not skill_ready:
              # Display cooldown timer
              time_since_skill = pygame.time.get_ticks() - last_skill_time
              remaining_cooldown = max(0, PLAYER_SKILL_COOLDOWN - time_since_skill)
              cooldown_seconds = math.ceil(remaining_cooldown / 1000) # Round up to nearest second
-             cooldown_text = small_font.render(f"CD: {cooldown_seconds}s", True, WHITE)
-             screen.blit(cooldown_text, (WIDTH - 140, 45)) # Position below "Skill"
+             cooldown_text = get_font(ui_view.font_size(SMALL_FONT_SIZE)).render(f"CD: {cooldown_seconds}s", text_antialias(), WHITE)
+             ui_view.text(cooldown_text, (WIDTH - 140, 45)) # Position below "Skill"
+
+    # Quality preset, so a drop in detail has a visible reason
+    quality = game_settings["quality"].capitalize() + (" (auto)" if game_settings["auto_quality"] else "")
+    quality_text = get_font(ui_view.font_size(SMALL_FONT_SIZE)).render(f"Quality: {quality}", text_antialias(), (160, 160, 160))
+    ui_view.text(quality_text, (WIDTH - 25, HEIGHT - 25), anchor="bottomright")
 
 
 # Function to check line-rectangle collision (for laser)
@@ -1175,667 +1725,876 @@ last_hit_time = 0 # Time when player was last hit by *anything*
 # Boss specific timers
 last_ghost_spawn_time = 0
 
-# Load resources
-load_sounds()
-load_music() # Load music files
-load_sprites()
-
-# Game Loop
-clock = pygame.time.Clock()
-running = True
-
-# Start menu music
-play_music("menu_music", -1) # Loop infinitely
-
-while running:
-    dt = clock.tick(60) # Delta time in milliseconds
-    current_time = pygame.time.get_ticks()
-
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                if game_state == PLAYING or game_state == BOSS_FIGHT: # Pause from playing or boss fight
-                    game_state = PAUSED
-                    stop_music() # Stop music on pause
-                elif game_state == PAUSED:
-                    game_state = PLAYING if level != 3 else BOSS_FIGHT # Resume to correct state
-                    if level != 3: play_music("game_music", -1) # Resume game music
-                    else: play_music("boss_music", -1) # Resume boss music
-                elif game_state == OPTIONS:
-                    # If coming from pause menu, go back to pause, otherwise main menu
-                    if 'prev_state' in locals() and prev_state == PAUSED: # Check if prev_state exists and was PAUSED
-                         game_state = PAUSED
-                    elif level > 0 and game_state != MENU: # If in game (not menu) and paused before options
-                         game_state = PAUSED # Assuming options from pause
-                    else: # Options from main menu
-                         game_state = MENU
-
-                    play_sound("menu") # Play sound when exiting options
-                    if game_state == MENU: play_music("menu_music", -1) # Resume menu music if going to menu
-                    # Music resumes when exiting pause menu handled above
-
-            # Player Skill Input (only in PLAYING or BOSS_FIGHT)
-            if (game_state == PLAYING or game_state == BOSS_FIGHT) and event.key == pygame.K_SPACE:
-                 if skill_ready:
-                    is_skilling = True # Flag that skill is active for next hit
-                    skill_ready = False
-                    last_skill_time = current_time
-                    print("Skill activated!")
-                    # You might want a visual/sound effect here
-
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            mouse_pos = event.pos
-
-            # Menu buttons
-            if game_state == MENU:
-                if start_button.collidepoint(mouse_pos):
-                    reset_game() # Reset game state before starting
-                    game_state = PLAYING
-                    play_music("game_music", -1) # Start game music
-                elif options_button.collidepoint(mouse_pos):
-                    prev_state = game_state # Store previous state
-                    game_state = OPTIONS
-                elif quit_button.collidepoint(mouse_pos):
-                    running = False
-
-            # Pause Menu buttons
-            elif game_state == PAUSED:
-                if resume_button.collidepoint(mouse_pos):
-                    game_state = PLAYING if level != 3 else BOSS_FIGHT
-                    if level != 3: play_music("game_music", -1)
-                    else: play_music("boss_music", -1)
-                elif options_button.collidepoint(mouse_pos):
-                    prev_state = game_state # Store previous state
-                    game_state = OPTIONS
-                elif reset_button.collidepoint(mouse_pos):
-                    reset_game()
-                    game_state = PLAYING # Go back to playing state after reset
-                    play_music("game_music", -1)
-                elif menu_button.collidepoint(mouse_pos):
-                    reset_game()
-                    game_state = MENU
-                    play_music("menu_music", -1)
-                elif quit_button.collidepoint(mouse_pos):
-                    running = False
-
-            # Game Over buttons
-            elif game_state == GAME_OVER:
-                if retry_button.collidepoint(mouse_pos):
-                    reset_game()
-                    game_state = PLAYING
-                    play_music("game_music", -1)
-                elif menu_button.collidepoint(mouse_pos):
-                    reset_game()
-                    game_state = MENU
-                    play_music("menu_music", -1)
-                elif quit_button.collidepoint(mouse_pos):
-                    running = False
-
-            # Game Won buttons
-            elif game_state == GAME_WON:
-                 if win_menu_button.collidepoint(mouse_pos):
-                     reset_game()
-                     game_state = MENU
-                     play_music("menu_music", -1)
-                 elif win_quit_button.collidepoint(mouse_pos):
-                     running = False
-
-
-            # Options Menu
-            elif game_state == OPTIONS:
-                if back_options_button.collidepoint(mouse_pos):
-                    # Restore previous state or default to MENU
-                    if 'prev_state' in locals():
-                         game_state = prev_state
-                    elif level > 0: # If in game (not menu)
-                         game_state = PAUSED # Assume options were from pause
-                    else:
-                         game_state = MENU
-
-                    play_sound("menu")
-                    if game_state == MENU: play_music("menu_music", -1)
-                    # Music resumes when exiting pause menu handled above
-
-                # Sound toggle
-                elif sound_toggle_rect.collidepoint(mouse_pos):
-                    game_settings["sound_enabled"] = not game_settings["sound_enabled"]
-                    # Instantly apply music/sound volume change if music is playing
-                    pygame.mixer.music.set_volume(game_settings["sound_volume"] if game_settings["sound_enabled"] else 0)
-                    if game_settings["sound_enabled"]: play_sound("menu")
-
-                # Models toggle
-                elif models_toggle_rect.collidepoint(mouse_pos):
-                    game_settings["use_custom_models"] = not game_settings["use_custom_models"]
-                    if game_settings["sound_enabled"]: play_sound("menu")
-
-
-                # Volume slider
-                elif volume_slider_rect.collidepoint(mouse_pos):
-                    rel_x = mouse_pos[0] - volume_slider_rect.x
-                    game_settings["sound_volume"] = max(0, min(1, rel_x / volume_slider_rect.width))
-                    volume_handle_rect.x = volume_slider_rect.x + int(game_settings["sound_volume"] * volume_slider_rect.width) - 10
-                    pygame.mixer.music.set_volume(game_settings["sound_volume"] if game_settings["sound_enabled"] else 0)
-                    if game_settings["sound_enabled"]: play_sound("menu")
-                    dragging_volume = True
+# Frame profiler, toggled with F3. Phases are listed in the order the loop runs them
+PROFILER_KEY = pygame.K_F3
+frame_profiler = FrameProfiler(("assets", "events", "player", "streaming", "coins", "enemies", "boss", "interaction",
+                                "audio", "world draw", "flashlight", "ui", "overlay", "flip", "gc"))
+
+# Sampling profiler (enabled with --sample-profile). F4 writes the folded stacks
+# collected so far; they are also written when the game exits
+SAMPLE_DUMP_KEY = pygame.K_F4
+PROFILE_DIR = asset_path("profiles")
+sampling_profiler = None
+
+def start_sampling_profiler(sample_rate=DEFAULT_SAMPLE_RATE):
+    global sampling_profiler
+    sampling_profiler = SamplingProfiler(sample_rate)
+    frame_profiler.listeners.append(sampling_profiler)
+    frame_profiler.set_recording(True) # Samples are assigned to phases at the profiler's marks
+    sampling_profiler.start()
+    print(f"Sampling profiler running at {sample_rate} Hz (F4 writes a flamegraph file)")
+
+def write_sampled_profile():
+    path = os.path.join(PROFILE_DIR, time.strftime("profile-%Y%m%d-%H%M%S.folded"))
+    sampling_profiler.write(path)
+
+# Long-frame watchdog (enabled with --watchdog). Every frame over budget is
+# written to profiles/ with the phase, stack and recent events (see log_event())
+frame_watchdog = None
+logged_state = None # (game_state, level, boss state) last written to the event log
+
+def start_watchdog(budget_ms=WATCHDOG_BUDGET_MS):
+    global frame_watchdog
+    frame_watchdog = FrameWatchdog(os.path.join(PROFILE_DIR, time.strftime("long-frames-%Y%m%d-%H%M%S.jsonl")), budget_ms)
+    frame_profiler.listeners.append(frame_watchdog)
+    frame_profiler.set_recording(True) # The watchdog needs each frame's duration and phases
+    frame_watchdog.start()
+    print(f"Watchdog flagging frames over {budget_ms:.1f} ms")
+
+def log_event(message):
+    # Recent events are only kept while the watchdog is running
+    if frame_watchdog is not None:
+        frame_watchdog.log(message)
+
+def log_state_changes():
+    global logged_state
+    current = (game_state, level, boss.state if boss else None)
+    if current != logged_state:
+        logged_state = current
+        log_event(f"state {game_state}, level {level}, boss {current[2]}")
+
+# Garbage collection runs in frames with budget to spare instead of whenever
+# the interpreter decides (see gc_manager.py); menus and the pause screen can
+# afford any collection
+gc_manager = GCManager()
+GC_IDLE_STATES = (MENU, PAUSED, OPTIONS, GAME_OVER, GAME_WON, LOADING)
+
+# Per-frame metrics export (enabled with --metrics, see start_metrics())
+metrics_recorder = None
+
+def start_metrics(path, file_format="jsonl", sample_every=1):
+    global metrics_recorder
+    metrics_recorder = MetricsRecorder(path, file_format, sample_every)
+    frame_profiler.set_recording(True) # Phase timings are needed even with the overlay hidden
+    print(f"Recording metrics to {path} (every {metrics_recorder.sample_every} frames)")
+
+def collect_frame_metrics():
+    coins_left = {level_num: 0 for level_num in coins_per_level}
+    for coin in coins:
+        if not coin["collected"]:
+            coins_left[coin["level"]] = coins_left.get(coin["level"], 0) + 1
+    return {
+        "state": game_state,
+        "level": level,
+        "frame_ms": round(frame_profiler.last_frame_ms, 3),
+        "phase_ms": {phase: round(frame_profiler.last_frame.get(phase, 0.0), 3) for phase in frame_profiler.phases},
+        "enemies_alive": sum(1 for e in enemies if e.is_alive and e.level != 3),
+        "helper_ghosts": sum(1 for e in enemies if e.is_alive and e.level == 3),
+        "coins_left": coins_left,
+        "boss_state": boss.state if boss else "none",
+        "boss_health": boss.health if boss else 0,
+        "gc": gc_manager.take_frame_stats(), # Collections since the previous record
+        "quality": game_settings["quality"],
+    }
 
-                # Brightness slider
-                elif brightness_slider_rect.collidepoint(mouse_pos):
-                    rel_x = mouse_pos[0] - brightness_slider_rect.x
-                    game_settings["brightness"] = max(0, min(1, rel_x / brightness_slider_rect.width))
-                    brightness_handle_rect.x = brightness_slider_rect.x + int(game_settings["brightness"] * brightness_slider_rect.width) - 10
-                    dragging_brightness = True
-
-
-        elif event.type == pygame.MOUSEBUTTONUP:
-            # Stop dragging sliders
-            dragging_volume = False
-            dragging_brightness = False
-
-        elif event.type == pygame.MOUSEMOTION:
-            # Update sliders if dragging
-            if dragging_volume:
-                rel_x = event.pos[0] - volume_slider_rect.x
-                game_settings["sound_volume"] = max(0, min(1, rel_x / volume_slider_rect.width))
-                volume_handle_rect.x = volume_slider_rect.x + int(game_settings["sound_volume"] * volume_slider_rect.width) - 10
-                pygame.mixer.music.set_volume(game_settings["sound_volume"] if game_settings["sound_enabled"] else 0)
-
-            if dragging_brightness:
-                rel_x = event.pos[0] - brightness_slider_rect.x
-                game_settings["brightness"] = max(0, min(1, rel_x / brightness_slider_rect.width))
-                brightness_handle_rect.x = brightness_slider_rect.x + int(game_settings["brightness"] * brightness_slider_rect.width) - 10
-
-    # --- Game Logic Update (Only in PLAYING and BOSS_FIGHT states) ---
-    if game_state == PLAYING or game_state == BOSS_FIGHT:
-
-        # Get current level walls
-        current_walls = walls_by_level.get(level, [])
-
-        # Player Movement
-        keys = pygame.key.get_pressed()
-        # moved = False # Keep track if player moved (not used in final code, but useful for animations etc.)
-
-        new_x, new_y = player.x, player.y
-
-        if keys[pygame.K_a] or keys[pygame.K_LEFT]:
-            new_x -= PLAYER_SPEED
-            player_direction = 2  # Left
-            # moved = True
-        if keys[pygame.K_d] or keys[pygame.K_RIGHT]:
-            new_x += PLAYER_SPEED
-            player_direction = 0  # Right
-            # moved = True
-        if keys[pygame.K_w] or keys[pygame.K_UP]:
-            new_y -= PLAYER_SPEED
-            player_direction = 3  # Up
-            # moved = True
-        if keys[pygame.K_s] or keys[pygame.K_DOWN]:
-            new_y += PLAYER_SPEED
-            player_direction = 1  # Down
-            # moved = True
-
-        # Check wall collisions for X movement
-        test_rect = pygame.Rect(new_x, player.y, player.width, player.height)
-        if not any(test_rect.colliderect(wall) for wall in current_walls):
-            player.x = new_x
-
-        # Check wall collisions for Y movement
-        test_rect = pygame.Rect(player.x, new_y, player.width, player.height)
-        if not any(test_rect.colliderect(wall) for wall in current_walls):
-            player.y = new_y
-
-        # Keep player on screen
-        player.x = max(0, min(WIDTH - player.width, player.x))
-        player.y = max(0, min(HEIGHT - player.height, player.y))
-
-        # --- Skill State Update ---
-        if is_skilling:
-            # Skill effect is active for a short duration? Or only for the *next* hit?
-            # Let's make it active until the player collides with an enemy/boss.
-            # If you wanted a duration, you'd add a timer here:
-            # if current_time - skill_active_start_time > SKILL_DURATION: is_skilling = False
-            pass # Skill flag stays True until a hit is registered
-
-
-        # --- Skill Cooldown Update ---
-        if not skill_ready:
-            if current_time - last_skill_time >= PLAYER_SKILL_COOLDOWN:
-                skill_ready = True
-                is_skilling = False # Ensure skill flag is off when cooldown finishes
-                print("Skill ready!")
-
-
-        # Coin Collection (Only in PLAYING state)
-        if game_state == PLAYING:
-            for coin in coins:
-                if coin["level"] == level and not coin["collected"]:
-                    if player.colliderect(coin["rect"]):
-                        coin["collected"] = True
-                        player_coins += 1
-                        play_sound("coin")
-
-        # Enemy Collision and Updates (Enemies on current level)
-        # Use a list comprehension to keep only alive enemies
-        active_enemies = [e for e in enemies if e.is_alive and e.level == level]
-
-        for enemy in active_enemies:
-            if enemy.update(player, current_walls):
-                # Player hit by a regular enemy
-                if current_time - last_hit_time > immunity_time:
-                    player_health -= 1
-                    play_sound("hit")
-                    last_hit_time = current_time # Reset immunity timer
-                    print(f"Player hit by enemy. Health: {player_health}")
-                    # Check for game over after taking damage
-                    if player_health <= 0:
-                        stop_music() # Stop game music
-                        game_state = GAME_OVER
-                        play_sound("gameover")
-
-
-        # --- Boss Logic (Only in BOSS_FIGHT state) ---
-        if game_state == BOSS_FIGHT:
-            if boss is None:
-                 # Initialize boss when entering the boss level for the first time
-                 boss = Boss(WIDTH // 2 - 50, HEIGHT // 4, level)
-                 print("Boss spawned.")
-                 last_ghost_spawn_time = current_time # Start ghost timer when boss spawns
-                 stop_music() # Stop regular game music
-                 play_music("boss_music", -1) # Start boss music
-
-            if boss and boss.is_alive:
-                boss.update(player, current_walls, current_time) # Pass current_time
-
-                # Check player collision with boss body (basic hit)
-                if player.colliderect(boss.rect):
-                     if current_time - last_hit_time > immunity_time: # Use same immunity timer
-                         # Check if boss is currently vulnerable to basic hits
-                         # Based on the "dodges between every other basic attack" interpretation,
-                         # let's say the boss is *not* vulnerable while dodging or in an attack state.
-                         # It's only vulnerable during "idle" or "cooldown".
-                         is_vulnerable_to_basic = boss.state in ["idle", "cooldown"] # or maybe just "idle"
-
-                         if is_vulnerable_to_basic or is_skilling: # Skill hits can bypass basic vulnerability?
-                             damage_dealt = 0
-                             if is_skilling:
-                                 damage_dealt = PLAYER_SKILL_DAMAGE
-                                 is_skilling = False # Skill consumed on hit
-                             elif is_vulnerable_to_basic:
-                                 damage_dealt = PLAYER_BASIC_DAMAGE
-
-                             if damage_dealt > 0:
-                                 boss.take_damage(damage_dealt)
-                                 print(f"Boss hit for {damage_dealt}. Boss Health: {boss.health}")
-
-
-                # Check player collision with boss attacks (Laser, Stomp, Punch)
-                if current_time - last_hit_time > immunity_time:
-                     # Laser collision check
-                     if boss.state == "firing_laser" and hasattr(boss, 'laser_start_pos') and hasattr(boss, 'laser_end_pos'):
-                         # Check line segment collision with player rect
-                         if check_line_rect_collision(boss.laser_start_pos, boss.laser_end_pos, player):
-                            player_health -= BOSS_LASER_DAMAGE
-                            play_sound("hit") # Use player hit sound
-                            last_hit_time = current_time
-                            print(f"Player hit by laser. Health: {player_health}")
-
-
-                     # Stomp AOE collision check
-                     if boss.state == "stomp_aoe" and boss.stomp_rect:
-                         if player.colliderect(boss.stomp_rect):
-                             player_health -= BOSS_STOMP_DAMAGE
-                             play_sound("hit")
-                             last_hit_time = current_time
-                             print(f"Player hit by stomp. Health: {player_health}")
-
-                     # Punch collision check
-                     if boss.state == "punch_active" and boss.punch_rect:
-                         if player.colliderect(boss.punch_rect):
-                             player_health -= BOSS_PUNCH_DAMAGE
-                             play_sound("hit")
-                             last_hit_time = current_time
-                             print(f"Player hit by punch. Health: {player_health}")
-
-
-                     # Check for game over after taking damage from boss attack
-                     if player_health <= 0:
-                         stop_music()
-                         game_state = GAME_OVER
-                         play_sound("gameover")
-
-
-                # Handle Helper Ghost Spawning
-                if current_time - last_ghost_spawn_time >= GHOST_SPAWN_INTERVAL:
-                    living_helper_ghosts = [e for e in enemies if e.level == level and e.is_alive]
-                    if len(living_helper_ghosts) < MAX_HELPER_GHOSTS:
-                        # Spawn a new ghost near the boss, but not on the boss
-                        spawn_x = boss.rect.centerx + random.randint(-100, 100)
-                        spawn_y = boss.rect.centery + random.randint(-100, 100)
-                        new_ghost_rect = pygame.Rect(spawn_x, spawn_y, 30, 30)
-                        # Ensure spawn location is valid (not on walls or boss)
-                        if not any(new_ghost_rect.colliderect(wall) for wall in current_walls) and \
-                           not new_ghost_rect.colliderect(boss.rect):
-                             enemies.append(Enemy(spawn_x, spawn_y, level)) # Add to the main enemies list
-                             last_ghost_spawn_time = current_time
-                             print("Spawned helper ghost.")
-
-            # Check for boss defeat (happens inside Boss.take_damage, but re-check state)
-            if boss and not boss.is_alive:
-                 game_state = GAME_WON # Transition to win state
-                 stop_music() # Stop boss music
-                 play_sound("win") # Play win sound
-                 play_music("win_music", 0) # Play win music once
-
-        # Interaction Logic (Doors, Windows, Back button)
-        display_text = False
-        interaction_target = None
-
-        if game_state == PLAYING: # Only check interaction in non-boss playing state
-             # Check door interactions for current level
-            current_doors = doors_by_level.get(level, [])
-            for door in current_doors:
-                if player.colliderect(door["rect"]):
-                    display_text = True
-                    interaction_target = door
-                    if keys[pygame.K_RETURN]:  # Press Enter to interact
-                        # Check special condition for boss door
-                        if door.get("is_boss_door") and player_coins < door["cost"]:
-                            # Interaction text already shows cost, no change needed here
-                            pass # Cannot enter yet
-                        elif player_coins >= door["cost"]:
-                            player_coins -= door["cost"]
-                            prev_level = level # Store old level before changing
-                            level = door["target"]
-                            print(f"Entering level {level}")
-                            # Reset player position for new level
-                            player.x, player.y = 50, HEIGHT // 2
-                            play_sound("door")
-
-                            # Check if entering the boss level
-                            if level == 3:
-                                game_state = BOSS_FIGHT
-                                boss = Boss(WIDTH // 2 - 50, HEIGHT // 4, level) # Create the boss instance
-                                last_ghost_spawn_time = current_time
-                                stop_music()
-                                play_music("boss_music", -1)
-                            # If transitioning between regular levels, ensure game music is playing
-                            elif prev_level == 3 and level != 3: # Exiting boss level (unlikely with current door config, but good check)
-                                stop_music()
-                                play_music("game_music", -1)
-                            elif level != 3 and pygame.mixer.music.get_busy() == 0: # Not boss level and no music
-                                play_music("game_music", -1) # Ensure game music is playing
-
-
-            # Check window interactions for current level
-            current_windows = windows_by_level.get(level, [])
-            for window in current_windows:
-                if player.colliderect(window["rect"]):
-                    display_text = True
-                    interaction_target = window
-                    if keys[pygame.K_RETURN]:  # Press Enter to interact
-                        if player_coins >= window["cost"]:
-                            player_coins -= window["cost"]
-                            level = window["target"]
-                            print(f"Entering level {level}")
-                            # Reset player position for new level
-                            player.x, player.y = 50, HEIGHT // 2
-                            play_sound("door")
-                            # Ensure game music is playing if not in boss level
-                            if level != 3 and pygame.mixer.music.get_busy() == 0:
-                                play_music("game_music", -1)
-
-
-            # Back to main level button (only in levels 1 and 2)
-            if level > 0 and level != 3 and player.colliderect(back_rect): # Don't show in boss level
-                display_text = True
-                # Simulate back button as an interaction target for text display
-                interaction_target = {"type": "Back to Level 0", "cost": 0} # No cost, just for text
-                if keys[pygame.K_RETURN]:
-                    level = 0
-                    print("Returning to level 0")
-                    player.x, player.y = 50, HEIGHT // 2
-                    play_sound("door")
-                    if pygame.mixer.music.get_busy() == 0: # If no music is playing (e.g. stopped in options)
-                         play_music("game_music", -1) # Ensure game music is playing
-
-
-    # --- Drawing (based on game state) ---
-    if game_state == MENU:
-        draw_menu()
-
-    elif game_state == OPTIONS:
-        draw_options_menu()
-
-    elif game_state == GAME_OVER:
-        draw_game_over()
-
-    elif game_state == GAME_WON:
-        draw_game_won()
-
-    elif game_state == PAUSED:
-        # Draw the underlying game state first, then the pause menu overlay
-        # Get current level walls
-        current_walls = walls_by_level.get(level, [])
-        if game_settings["use_custom_backgrounds"] and level_background_image is not None:
-            screen.blit(level_background_image, (0, 0))
+# One frame of gameplay (PLAYING and BOSS_FIGHT). Split out of the main loop so
+# the benchmarks can run the simulation and the drawing on their own.
+def update_gameplay(current_time, keys):
+    global game_state, level, boss, player_direction, player_coins, player_health, last_hit_time
+    global last_ghost_spawn_time, is_skilling, skill_ready, display_text, interaction_target, enemy_frame
+
+    # Get current level walls
+    current_walls = walls_by_level.get(level, [])
+
+    # Player Movement
+    # moved = False # Keep track if player moved (not used in final code, but useful for animations etc.)
+
+    new_x, new_y = player.x, player.y
+
+    if keys[pygame.K_a] or keys[pygame.K_LEFT]:
+        new_x -= PLAYER_SPEED
+        player_direction = 2  # Left
+        # moved = True
+    if keys[pygame.K_d] or keys[pygame.K_RIGHT]:
+        new_x += PLAYER_SPEED
+        player_direction = 0  # Right
+        # moved = True
+    if keys[pygame.K_w] or keys[pygame.K_UP]:
+        new_y -= PLAYER_SPEED
+        player_direction = 3  # Up
+        # moved = True
+    if keys[pygame.K_s] or keys[pygame.K_DOWN]:
+        new_y += PLAYER_SPEED
+        player_direction = 1  # Down
+        # moved = True
+
+    # Check wall collisions (only the walls near the player in levels larger than the screen)
+    player_walls = current_walls
+    if is_scrolling_level(level):
+        player_walls = get_level_index(level)["walls"].query(player.inflate(PLAYER_SPEED * 2, PLAYER_SPEED * 2))
+
+    # Check wall collisions for X movement
+    test_rect = pygame.Rect(new_x, player.y, player.width, player.height)
+    if not any(test_rect.colliderect(wall) for wall in player_walls):
+        player.x = new_x
+
+    # Check wall collisions for Y movement
+    test_rect = pygame.Rect(player.x, new_y, player.width, player.height)
+    if not any(test_rect.colliderect(wall) for wall in player_walls):
+        player.y = new_y
+
+    # Keep player on screen
+    world_width, world_height = level_size(level)
+    player.x = max(0, min(world_width - player.width, player.x))
+    player.y = max(0, min(world_height - player.height, player.y))
+
+    # --- Skill State Update ---
+    if is_skilling:
+        # Skill effect is active for a short duration? Or only for the *next* hit?
+        # Let's make it active until the player collides with an enemy/boss.
+        # If you wanted a duration, you'd add a timer here:
+        # if current_time - skill_active_start_time > SKILL_DURATION: is_skilling = False
+        pass # Skill flag stays True until a hit is registered
+
+
+    # --- Skill Cooldown Update ---
+    if not skill_ready:
+        if current_time - last_skill_time >= PLAYER_SKILL_COOLDOWN:
+            skill_ready = True
+            is_skilling = False # Ensure skill flag is off when cooldown finishes
+            print("Skill ready!")
+    frame_profiler.mark("player")
+
+    # Load the chunks of a streamed level coming into range, evict distant ones
+    if level_stream is not None and level == level_stream.level_file.level:
+        level_stream.update(player.center)
+        level_stream.poll()
+    frame_profiler.mark("streaming")
+
+    # Coin Collection (Only in PLAYING state). Only the coins in the grid cells
+    # around the player are checked; collected coins leave the grid
+    level_index = get_level_index(level)
+    if game_state == PLAYING:
+        for coin in level_index["coins"].query(player):
+            if not coin["collected"] and player.colliderect(coin["rect"]):
+                coin["collected"] = True
+                level_index["coins"].remove(coin)
+                player_coins += 1
+                play_sound("coin")
+    frame_profiler.mark("coins")
+
+    # Enemy Collision and Updates (Enemies on current level)
+    # Use a list comprehension to keep only alive enemies
+    active_enemies = [e for e in enemies if e.is_alive and e.level == level]
+
+    # In levels larger than the screen enemies are kept in the level's grid (for
+    # culling) and only test the walls near them. A one-screen level is all on
+    # screen and has few walls, so neither would pay off there
+    scrolling = is_scrolling_level(level)
+    if scrolling:
+        sync_enemy_index(level_index, level)
+
+    # Enemies out of the flashlight's reach can't be seen, so at lower quality they
+    # move every Nth frame (by N frames' worth), staggered so the work is spread
+    # evenly. Collisions with the player are still checked every frame.
+    interval = quality_level()["unlit_enemy_interval"]
+    enemy_frame += 1
+    wall_grid, enemy_grid, field = level_index["walls"], level_index["enemies"], level_index["clearance"]
+    for index, enemy in enumerate(active_enemies):
+        steps = 1
+        if interval > 1 and math.dist(enemy.rect.center, player.center) > UNLIT_ENEMY_DISTANCE:
+            steps = 0 if (enemy_frame + index) % interval else interval
+        if steps == 0:
+            hit = enemy.rect.colliderect(player)
+        elif scrolling:
+            reach = ENEMY_SPEED * steps * 2
+            hit = enemy.update(player, wall_grid.query(enemy.rect.inflate(reach, reach)), steps, field)
+            enemy_grid.move(enemy, enemy.rect)
         else:
-            screen.fill(level_colors[level % len(level_colors)])
-
-        # Draw walls, objects, enemies, player (static - not updated)
-        for wall in current_walls:
-            pygame.draw.rect(screen, WALL_COLOR, wall)
-
+            hit = enemy.update(player, current_walls, steps, field)
+        if hit:
+            # Player hit by a regular enemy
+            if current_time - last_hit_time > immunity_time:
+                player_health -= 1
+                play_sound("hit")
+                last_hit_time = current_time # Reset immunity timer
+                print(f"Player hit by enemy. Health: {player_health}")
+                # Check for game over after taking damage
+                if player_health <= 0:
+                    stop_music() # Stop game music
+                    game_state = GAME_OVER
+                    play_sound("gameover")
+    frame_profiler.mark("enemies")
+
+
+    # --- Boss Logic (Only in BOSS_FIGHT state) ---
+    if game_state == BOSS_FIGHT:
+        if boss is None:
+             # Initialize boss when entering the boss level for the first time
+             boss = Boss(WIDTH // 2 - 50, HEIGHT // 4, level)
+             print("Boss spawned.")
+             last_ghost_spawn_time = current_time # Start ghost timer when boss spawns
+             play_music("boss_music", -1) # Crossfade from game music to boss music
+
+        if boss and boss.is_alive:
+            boss.update(player, current_walls, current_time) # Pass current_time
+
+            # Check player collision with boss body (basic hit)
+            if player.colliderect(boss.rect):
+                 if current_time - last_hit_time > immunity_time: # Use same immunity timer
+                     # Check if boss is currently vulnerable to basic hits
+                     # Based on the "dodges between every other basic attack" interpretation,
+                     # let's say the boss is *not* vulnerable while dodging or in an attack state.
+                     # It's only vulnerable during "idle" or "cooldown".
+                     is_vulnerable_to_basic = boss.state in ["idle", "cooldown"] # or maybe just "idle"
+
+                     if is_vulnerable_to_basic or is_skilling: # Skill hits can bypass basic vulnerability?
+                         damage_dealt = 0
+                         if is_skilling:
+                             damage_dealt = PLAYER_SKILL_DAMAGE
+                             is_skilling = False # Skill consumed on hit
+                         elif is_vulnerable_to_basic:
+                             damage_dealt = PLAYER_BASIC_DAMAGE
+
+                         if damage_dealt > 0:
+                             boss.take_damage(damage_dealt)
+                             print(f"Boss hit for {damage_dealt}. Boss Health: {boss.health}")
+
+
+            # Check player collision with boss attacks (Laser, Stomp, Punch)
+            if current_time - last_hit_time > immunity_time:
+                 # Laser collision check
+                 if boss.state == "firing_laser" and hasattr(boss, 'laser_start_pos') and hasattr(boss, 'laser_end_pos'):
+                     # Check line segment collision with player rect
+                     if check_line_rect_collision(boss.laser_start_pos, boss.laser_end_pos, player):
+                        player_health -= BOSS_LASER_DAMAGE
+                        play_sound("hit") # Use player hit sound
+                        last_hit_time = current_time
+                        print(f"Player hit by laser. Health: {player_health}")
+
+
+                 # Stomp AOE collision check
+                 if boss.state == "stomp_aoe" and boss.stomp_rect:
+                     if player.colliderect(boss.stomp_rect):
+                         player_health -= BOSS_STOMP_DAMAGE
+                         play_sound("hit")
+                         last_hit_time = current_time
+                         print(f"Player hit by stomp. Health: {player_health}")
+
+                 # Punch collision check
+                 if boss.state == "punch_active" and boss.punch_rect:
+                     if player.colliderect(boss.punch_rect):
+                         player_health -= BOSS_PUNCH_DAMAGE
+                         play_sound("hit")
+                         last_hit_time = current_time
+                         print(f"Player hit by punch. Health: {player_health}")
+
+
+                 # Check for game over after taking damage from boss attack
+                 if player_health <= 0:
+                     stop_music()
+                     game_state = GAME_OVER
+                     play_sound("gameover")
+
+
+            # Handle Helper Ghost Spawning
+            if current_time - last_ghost_spawn_time >= GHOST_SPAWN_INTERVAL:
+                living_helper_ghosts = [e for e in enemies if e.level == level and e.is_alive]
+                if len(living_helper_ghosts) < MAX_HELPER_GHOSTS:
+                    # Spawn a new ghost near the boss, but not on the boss
+                    spawn_x = boss.rect.centerx + random.randint(-100, 100)
+                    spawn_y = boss.rect.centery + random.randint(-100, 100)
+                    new_ghost_rect = pygame.Rect(spawn_x, spawn_y, 30, 30)
+                    # Ensure spawn location is valid (not on walls or boss)
+                    if rect_clear_of_walls(level, new_ghost_rect) and not new_ghost_rect.colliderect(boss.rect):
+                         enemies.append(Enemy(spawn_x, spawn_y, level)) # Add to the main enemies list
+                         last_ghost_spawn_time = current_time
+                         print("Spawned helper ghost.")
+
+        # Check for boss defeat (happens inside Boss.take_damage, but re-check state)
+        if boss and not boss.is_alive:
+             game_state = GAME_WON # Transition to win state
+             play_sound("win") # Play win sound
+             play_music("win_music", 0) # Crossfade from boss music, play win music once
+    frame_profiler.mark("boss")
+
+    # Interaction Logic (Doors, Windows, Back button)
+    display_text = False
+    interaction_target = None
+
+    if game_state == PLAYING: # Only check interaction in non-boss playing state
+         # Check door interactions for current level
         current_doors = doors_by_level.get(level, [])
         for door in current_doors:
-            if game_settings["use_custom_models"] and "door" in item_sprites:
-                screen.blit(item_sprites["door"], door["rect"])
-            else:
-                pygame.draw.rect(screen, DOOR_COLOR, door["rect"])
-            cost_text = small_font.render(f"Cost: {door['cost']}", True, TEXT_COLOR)
-            screen.blit(cost_text, (door["rect"].x - 5, door["rect"].y - 20))
-
+            if player.colliderect(door["rect"]):
+                display_text = True
+                interaction_target = door
+                if keys[pygame.K_RETURN]:  # Press Enter to interact
+                    # Check special condition for boss door
+                    if door.get("is_boss_door") and player_coins < door["cost"]:
+                        # Interaction text already shows cost, no change needed here
+                        pass # Cannot enter yet
+                    elif player_coins >= door["cost"]:
+                        player_coins -= door["cost"]
+                        prev_level = level # Store old level before changing
+                        level = door["target"]
+                        ensure_level_coins(level) # Generate coins for the level on first visit
+                        print(f"Entering level {level}")
+                        # Reset player position for new level
+                        player.x, player.y = 50, HEIGHT // 2
+                        play_sound("door")
+
+                        # Check if entering the boss level
+                        if level == 3:
+                            game_state = BOSS_FIGHT
+                            boss = Boss(WIDTH // 2 - 50, HEIGHT // 4, level) # Create the boss instance
+                            last_ghost_spawn_time = current_time
+                            play_music("boss_music", -1)
+                        # If transitioning between regular levels, ensure game music is playing
+                        elif prev_level == 3 and level != 3: # Exiting boss level (unlikely with current door config, but good check)
+                            play_music("game_music", -1)
+                        elif level != 3 and not music_is_playing(): # Not boss level and no music
+                            play_music("game_music", -1) # Ensure game music is playing
+
+
+        # Check window interactions for current level
         current_windows = windows_by_level.get(level, [])
         for window in current_windows:
-             if game_settings["use_custom_models"] and "window" in item_sprites:
-                 screen.blit(item_sprites["window"], window["rect"])
-             else:
-                 pygame.draw.rect(screen, WINDOW_COLOR, window["rect"])
-             cost_text = small_font.render(f"Cost: {window['cost']}", True, TEXT_COLOR)
-             screen.blit(cost_text, (window["rect"].x - 5, window["rect"].y - 20))
-
-        if level > 0 and level != 3:
-             pygame.draw.rect(screen, BACK_RECT_COLOR, back_rect)
-             back_text = small_font.render("Return (Enter)", True, TEXT_COLOR)
-             screen.blit(back_text, (back_rect.x, back_rect.y - 20))
-
-        # Draw coins (if in PLAYING state originally)
-        if level != 3: # Only draw coins if not the boss level
-            for coin in coins:
-                if coin["level"] == level and not coin["collected"]:
-                    if game_settings["use_custom_models"] and "coin" in item_sprites:
-                        screen.blit(item_sprites["coin"], coin["rect"])
-                    else:
-                        pygame.draw.ellipse(screen, COIN_COLOR, coin["rect"])
-
-        # Draw enemies and boss (if they exist and were in the current level)
-        for enemy in enemies:
-             if enemy.level == level and enemy.is_alive:
-                 enemy.draw(screen)
-
-        if level == 3 and boss and boss.is_alive: # Draw boss if in boss level
-             boss.draw(screen)
-
-        # Draw player
-        # Apply flash effect if recently hit, even if paused
-        if current_time - last_hit_time < immunity_time:
-             if (current_time // 100) % 2 == 0:
-                 if game_settings["use_custom_models"] and player_sprites:
-                     sprite_key = {0:"right", 1:"down", 2:"left", 3:"up"}.get(player_direction, "right")
-                     screen.blit(player_sprites.get(sprite_key, player_sprites["right"]), player)
-                 else:
-                     pygame.draw.rect(screen, PLAYER_COLOR, player)
-        else:
-             if game_settings["use_custom_models"] and player_sprites:
-                 sprite_key = {0:"right", 1:"down", 2:"left", 3:"up"}.get(player_direction, "right")
-                 screen.blit(player_sprites.get(sprite_key, player_sprites["right"]), player)
-             else:
-                 pygame.draw.rect(screen, PLAYER_COLOR, player)
-
-
-        draw_flashlight() # Draw flashlight effect
-        draw_ui_elements() # Draw UI (coins, health, level)
-        # Draw boss health bar if boss exists and level is 3
-        if level == 3 and boss and boss.is_alive:
-             # Boss health bar is drawn within the boss.draw method, but it's drawn on the *screen* surface,
-             # so it appears correctly above the boss in the paused state.
-             pass # Nothing extra needed here if boss draws itself and its bar
+            if player.colliderect(window["rect"]):
+                display_text = True
+                interaction_target = window
+                if keys[pygame.K_RETURN]:  # Press Enter to interact
+                    if player_coins >= window["cost"]:
+                        player_coins -= window["cost"]
+                        level = window["target"]
+                        ensure_level_coins(level) # Generate coins for the level on first visit
+                        print(f"Entering level {level}")
+                        # Reset player position for new level
+                        player.x, player.y = 50, HEIGHT // 2
+                        play_sound("door")
+                        # Ensure game music is playing if not in boss level
+                        if level != 3 and not music_is_playing():
+                            play_music("game_music", -1)
+
+
+        # Back to main level button (only in levels 1 and 2)
+        if level in (1, 2) and player.colliderect(back_rect): # Not in the boss level or generated ones
+            display_text = True
+            # Simulate back button as an interaction target for text display
+            interaction_target = {"type": "Back to Level 0", "cost": 0} # No cost, just for text
+            if keys[pygame.K_RETURN]:
+                level = 0
+                print("Returning to level 0")
+                player.x, player.y = 50, HEIGHT // 2
+                play_sound("door")
+                if not music_is_playing(): # If no music is playing (e.g. stopped in options)
+                     play_music("game_music", -1) # Ensure game music is playing
+    frame_profiler.mark("interaction")
+
+def draw_gameplay(current_time):
+    # The world is drawn through a View, possibly at a reduced render scale, and
+    # scaled up to the screen after lighting; interaction text and HUD are drawn
+    # on the screen afterwards at full resolution
+    view = get_world_view()
+    view.set_origin(*camera.follow(player, level_size(level)).topleft)
+    level_index = get_level_index(level)
+
+    # Background, walls, doors and windows (prerendered chunks, see camera.py)
+    draw_static_layer(view)
+
+    # Draw coins for current level (only in PLAYING state, not BOSS_FIGHT)
+    if game_state == PLAYING:
+        for coin in level_index["coins"].query(camera.rect):
+            if not coin["collected"]:
+                if game_settings["use_custom_models"] and "coin" in item_sprites:
+                    view.image(item_sprites["coin"], coin["rect"])
+                else:
+                    view.ellipse(COIN_COLOR, coin["rect"])
 
-        # Finally, draw the pause menu overlay on top
-        draw_pause_menu()
+    # Draw enemies in view (helper ghosts in boss level, regular enemies elsewhere)
+    for enemy in enemies_in_view(level_index):
+        enemy.draw(view) # Enemy draw method checks if it's on the current level and alive
 
+    # Draw boss (only in BOSS_FIGHT state)
+    if game_state == BOSS_FIGHT and boss and boss.is_alive:
+        boss.draw(view) # Boss draw method includes its health bar and attack visuals
 
-    elif game_state == PLAYING or game_state == BOSS_FIGHT: # Draw game state if not paused/menu/gameover/won
-        # Get current level walls
-        current_walls = walls_by_level.get(level, [])
+    # Draw player (with flash effect if recently hit)
+    # The immunity time prevents player from taking damage *during* the flash, not just the flash itself.
+    is_flashing = (current_time - last_hit_time < immunity_time) and ((current_time // 100) % 2 == 0)
 
-        # Draw background
-        if game_settings["use_custom_backgrounds"] and level_background_image is not None:
-            screen.blit(level_background_image, (0, 0))
+    if not is_flashing:
+        if game_settings["use_custom_models"] and player_sprites:
+            # Choose sprite based on direction
+            sprite_key = {0:"right", 1:"down", 2:"left", 3:"up"}.get(player_direction, "right") # Default to right
+            view.image(player_sprites.get(sprite_key, player_sprites["right"]), player) # Use default if sprite key missing
         else:
-            screen.fill(level_colors[level % len(level_colors)])
+             view.rect(PLAYER_COLOR, player)
+    else:
+         # Draw player when flashing
+         if game_settings["use_custom_models"] and player_sprites:
+            sprite_key = {0:"right", 1:"down", 2:"left", 3:"up"}.get(player_direction, "right") # Default to right
+            # Maybe draw semi-transparent or a different color?
+            # For simplicity, just draw the sprite normally if flashing
+            view.image(player_sprites.get(sprite_key, player_sprites["right"]), player)
+         else:
+             view.rect((255, 100, 100), player) # Draw a lighter red rect when flashing
+
+
+    frame_profiler.mark("world draw")
+
+    # Flashlight Effect
+    draw_flashlight(view) # Draw flashlight effect on top of everything except UI
+    view.present(screen)
+    frame_profiler.mark("flashlight")
+
+
+    # Display interaction text on top of flashlight
+    if display_text and interaction_target:
+        # Need to adjust position/size based on text content
+        text_content = ""
+        is_cost_warning = False
+
+        if interaction_target.get("type") in ["door", "window"]:
+             # Check if it's the boss door and the coin requirement is not met
+             if interaction_target.get("is_boss_door") and player_coins < interaction_target["cost"]:
+                  text_content = f"Need {interaction_target['cost']} coins (you have {player_coins}) to unlock the Boss Arena"
+                  is_cost_warning = True
+             elif player_coins >= interaction_target["cost"]:
+                 text_content = f"Enter {interaction_target['type']} to Level {interaction_target['target']} (Cost: {interaction_target['cost']} coins - Press Enter)"
+             else:
+                 text_content = f"Need {interaction_target['cost']} coins (you have {player_coins})"
+                 is_cost_warning = True
+        elif interaction_target.get("type") == "Back to Level 0":
+             text_content = "Return to Level 0 (Press Enter)"
 
-        # Draw walls for current level
-        for wall in current_walls:
-            pygame.draw.rect(screen, WALL_COLOR, wall)
+        if text_content:
+            # Calculate text size and background size
+            # (sized in screen pixels, from the text as rendered at the current scale)
+            text_surface = get_font(ui_view.font_size(FONT_SIZE)).render(text_content, text_antialias(), TEXT_COLOR if not is_cost_warning else (255, 100, 100))
+            text_rect = text_surface.get_rect(center=ui_view.to_point((WIDTH // 2, 35))) # Center text near top
 
-        # Draw doors and windows for the current level
-        current_doors = doors_by_level.get(level, [])
-        for door in current_doors:
-            if game_settings["use_custom_models"] and "door" in item_sprites:
-                screen.blit(item_sprites["door"], door["rect"])
-            else:
-                pygame.draw.rect(screen, DOOR_COLOR, door["rect"])
+            text_bg_padding = ui_view.to_length(20)
+            text_bg = pygame.Rect(text_rect.left - text_bg_padding // 2, text_rect.top - text_bg_padding // 2,
+                                  text_rect.width + text_bg_padding, text_rect.height + text_bg_padding)
 
-            # Cost text with background
-            # Position cost text relative to the door
-            cost_x = door["rect"].x + door["rect"].width // 2 - 35
-            cost_y = door["rect"].y - 25
-            cost_bg = pygame.Rect(cost_x, cost_y, 70, 20)
-            pygame.draw.rect(screen, (50, 50, 50), cost_bg, border_radius=3)
-            cost_text = small_font.render(f"Cost: {door['cost']}", True, TEXT_COLOR)
-            screen.blit(cost_text, (cost_x + 5, cost_y + 2)) # Adjust text position inside bg
+            pygame.draw.rect(screen, (50, 50, 50, 200), text_bg, border_radius=ui_view.to_length(5))
+            screen.blit(text_surface, text_rect)
 
 
-        current_windows = windows_by_level.get(level, [])
-        for window in current_windows:
-            if game_settings["use_custom_models"] and "window" in item_sprites:
-                screen.blit(item_sprites["window"], window["rect"])
-            else:
-                pygame.draw.rect(screen, WINDOW_COLOR, window["rect"])
-
-            # Cost text with background
-            cost_x = window["rect"].x + window["rect"].width // 2 - 35
-            cost_y = window["rect"].y - 25
-            cost_bg = pygame.Rect(cost_x, cost_y, 70, 20)
-            pygame.draw.rect(screen, (50, 50, 50), cost_bg, border_radius=3)
-            cost_text = small_font.render(f"Cost: {window['cost']}", True, TEXT_COLOR)
-            screen.blit(cost_text, (cost_x + 5, cost_y + 2)) # Adjust text position inside bg
-
-        # Draw the return button if not in level 0 or boss level
-        if level > 0 and level != 3:
-            pygame.draw.rect(screen, BACK_RECT_COLOR, back_rect)
-            # Return text with background
-            back_bg = pygame.Rect(back_rect.x - 5, back_rect.y - 25, 110, 20)
-            pygame.draw.rect(screen, (50, 50, 50), back_bg, border_radius=3)
-            back_text = small_font.render("Return (Enter)", True, TEXT_COLOR)
-            screen.blit(back_text, (back_rect.x, back_rect.y - 20))
-
-
-        # Draw coins for current level (only in PLAYING state, not BOSS_FIGHT)
-        if game_state == PLAYING:
-            for coin in coins:
-                if coin["level"] == level and not coin["collected"]:
-                    if game_settings["use_custom_models"] and "coin" in item_sprites:
-                        screen.blit(item_sprites["coin"], coin["rect"])
-                    else:
-                        pygame.draw.ellipse(screen, COIN_COLOR, coin["rect"])
-
-        # Draw enemies (helper ghosts in boss level, regular enemies elsewhere)
-        for enemy in enemies:
-            enemy.draw(screen) # Enemy draw method checks if it's on the current level and alive
-
-        # Draw boss (only in BOSS_FIGHT state)
-        if game_state == BOSS_FIGHT and boss and boss.is_alive:
-            boss.draw(screen) # Boss draw method includes its health bar and attack visuals
-
-        # Draw player (with flash effect if recently hit)
-        # The immunity time prevents player from taking damage *during* the flash, not just the flash itself.
-        is_flashing = (current_time - last_hit_time < immunity_time) and ((current_time // 100) % 2 == 0)
-
-        if not is_flashing:
-            if game_settings["use_custom_models"] and player_sprites:
-                # Choose sprite based on direction
-                sprite_key = {0:"right", 1:"down", 2:"left", 3:"up"}.get(player_direction, "right") # Default to right
-                screen.blit(player_sprites.get(sprite_key, player_sprites["right"]), player) # Use default if sprite key missing
-            else:
-                 pygame.draw.rect(screen, PLAYER_COLOR, player)
-        else:
-             # Draw player when flashing
-             if game_settings["use_custom_models"] and player_sprites:
-                sprite_key = {0:"right", 1:"down", 2:"left", 3:"up"}.get(player_direction, "right") # Default to right
-                # Maybe draw semi-transparent or a different color?
-                # For simplicity, just draw the sprite normally if flashing
-                screen.blit(player_sprites.get(sprite_key, player_sprites["right"]), player)
-             else:
-                 pygame.draw.rect(screen, (255, 100, 100), player) # Draw a lighter red rect when flashing
+    # Draw UI elements on top of flashlight and interaction text
+    draw_ui_elements()
 
+# Game Loop
+clock = pygame.time.Clock()
+running = True
 
-        # Flashlight Effect
-        draw_flashlight() # Draw flashlight effect on top of everything except UI
-
+def main():
+    global running, game_state, enemies, is_skilling, skill_ready, last_skill_time
+    global dragging_volume, dragging_brightness, pause_backdrop
+    loading_target_state = None # State to enter once LOADING finishes
 
-        # Display interaction text on top of flashlight
-        if display_text and interaction_target:
-            # Need to adjust position/size based on text content
-            text_content = ""
-            is_cost_warning = False
+    init_display()
+    startup_timer.mark("display")
 
-            if interaction_target.get("type") in ["door", "window"]:
-                 # Check if it's the boss door and the coin requirement is not met
-                 if interaction_target.get("is_boss_door") and player_coins < interaction_target["cost"]:
-                      text_content = f"Need {interaction_target['cost']} coins (you have {player_coins}) to unlock the Boss Arena"
-                      is_cost_warning = True
-                 elif player_coins >= interaction_target["cost"]:
-                     text_content = f"Enter {interaction_target['type']} to Level {interaction_target['target']} (Cost: {interaction_target['cost']} coins - Press Enter)"
-                 else:
-                     text_content = f"Need {interaction_target['cost']} coins (you have {player_coins})"
-                     is_cost_warning = True
-            elif interaction_target.get("type") == "Back to Level 0":
-                 text_content = "Return to Level 0 (Press Enter)"
+    # Show the first menu frame before anything else is loaded
+    draw_menu()
+    pygame.display.flip()
+    startup_timer.mark("first menu frame")
+
+    # Sprites decode in the background while the menu is up
+    load_sprites()
+    startup_timer.mark("queue sprites")
+
+    # Start menu music (opens the mixer and loads the sound effects)
+    play_music("menu_music", -1) # Loop infinitely
+    startup_timer.mark("audio")
+    startup_timer.report()
+    gc_manager.start()
+    drawn_idle_screen = None # idle_screen_key() of the last idle frame, None after any other frame
+
+    while running:
+        # Nothing has changed on an idle screen: sleep until the player does something
+        waited_event = None
+        if drawn_idle_screen is not None and drawn_idle_screen == idle_screen_key():
+            waited_event = wait_for_idle_event()
+
+        dt = clock.tick(60) # Delta time in milliseconds
+        current_time = pygame.time.get_ticks()
+        if game_settings["auto_render_scale"] and game_state in (PLAYING, BOSS_FIGHT):
+            update_render_scale(clock.get_rawtime()) # Time the last frame took, not counting the wait in tick()
+        if game_settings["auto_quality"] and game_state in (PLAYING, BOSS_FIGHT):
+            update_quality(clock.get_rawtime())
+        frame_profiler.begin_frame()
+        gc_manager.begin_frame()
+
+        # Hand finished background assets to the game
+        if get_asset_loader().poll() and get_asset_loader().is_done():
+            gc_manager.freeze_when_idle() # Everything is loaded, sprites and sounds stay alive from here on
+        if audio_ready:
+            music_controller.update() # Start any track that was waiting to finish loading
+            sfx_mixer.begin_frame()
+
+        # Don't enter gameplay until the assets it needs are ready
+        if game_state in ASSET_GROUPS_FOR_STATE and not get_asset_loader().is_done(*ASSET_GROUPS_FOR_STATE[game_state]):
+            loading_target_state = game_state
+            game_state = LOADING
+        elif game_state == LOADING and get_asset_loader().is_done(*ASSET_GROUPS_FOR_STATE[loading_target_state]):
+            game_state = loading_target_state
+        frame_profiler.mark("assets")
+
+        events = pygame.event.get()
+        if waited_event is not None and waited_event.type != pygame.NOEVENT:
+            events.insert(0, waited_event)
+        for event in events:
+            if frame_watchdog is not None and event.type != pygame.MOUSEMOTION: # Motion would flood the event log
+                log_event(f"{pygame.event.event_name(event.type)} {getattr(event, 'key', getattr(event, 'pos', ''))}")
+
+            if event.type == pygame.QUIT:
+                running = False
+
+            elif event.type == pygame.VIDEORESIZE:
+                update_display_layout()
+
+            elif event.type == pygame.KEYDOWN:
+                if event.key == FULLSCREEN_KEY:
+                    toggle_fullscreen()
+                elif event.key == PROFILER_KEY:
+                    frame_profiler.toggle()
+                elif event.key == SAMPLE_DUMP_KEY and sampling_profiler is not None:
+                    write_sampled_profile()
+
+                if event.key == pygame.K_ESCAPE:
+                    if game_state == PLAYING or game_state == BOSS_FIGHT: # Pause from playing or boss fight
+                        game_state = PAUSED
+                        pause_music() # Pause music (resumes where it left off)
+                    elif game_state == PAUSED:
+                        game_state = PLAYING if level != 3 else BOSS_FIGHT # Resume to correct state
+                        resume_music() # Resume game or boss music without reloading it
+                    elif game_state == OPTIONS:
+                        # If coming from pause menu, go back to pause, otherwise main menu
+                        if 'prev_state' in locals() and prev_state == PAUSED: # Check if prev_state exists and was PAUSED
+                             game_state = PAUSED
+                        elif level > 0 and game_state != MENU: # If in game (not menu) and paused before options
+                             game_state = PAUSED # Assuming options from pause
+                        else: # Options from main menu
+                             game_state = MENU
+
+                        play_sound("menu") # Play sound when exiting options
+                        if game_state == MENU: play_music("menu_music", -1) # Resume menu music if going to menu
+                        # Music resumes when exiting pause menu handled above
+
+                # Player Skill Input (only in PLAYING or BOSS_FIGHT)
+                if (game_state == PLAYING or game_state == BOSS_FIGHT) and event.key == pygame.K_SPACE:
+                     if skill_ready:
+                        is_skilling = True # Flag that skill is active for next hit
+                        skill_ready = False
+                        last_skill_time = current_time
+                        print("Skill activated!")
+                        # You might want a visual/sound effect here
+
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                mouse_pos = ui_view.to_logical(event.pos)
+
+                # Menu buttons
+                if game_state == MENU:
+                    if start_button.collidepoint(mouse_pos):
+                        reset_game() # Reset game state before starting
+                        game_state = PLAYING
+                        play_music("game_music", -1) # Start game music
+                    elif options_button.collidepoint(mouse_pos):
+                        prev_state = game_state # Store previous state
+                        game_state = OPTIONS
+                    elif quit_button.collidepoint(mouse_pos):
+                        running = False
+
+                # Pause Menu buttons
+                elif game_state == PAUSED:
+                    if resume_button.collidepoint(mouse_pos):
+                        game_state = PLAYING if level != 3 else BOSS_FIGHT
+                        resume_music()
+                    elif options_button.collidepoint(mouse_pos):
+                        prev_state = game_state # Store previous state
+                        game_state = OPTIONS
+                    elif reset_button.collidepoint(mouse_pos):
+                        reset_game()
+                        game_state = PLAYING # Go back to playing state after reset
+                        play_music("game_music", -1)
+                    elif menu_button.collidepoint(mouse_pos):
+                        reset_game()
+                        game_state = MENU
+                        play_music("menu_music", -1)
+                    elif quit_button.collidepoint(mouse_pos):
+                        running = False
+
+                # Game Over buttons
+                elif game_state == GAME_OVER:
+                    if retry_button.collidepoint(mouse_pos):
+                        reset_game()
+                        game_state = PLAYING
+                        play_music("game_music", -1)
+                    elif menu_button.collidepoint(mouse_pos):
+                        reset_game()
+                        game_state = MENU
+                        play_music("menu_music", -1)
+                    elif quit_button.collidepoint(mouse_pos):
+                        running = False
+
+                # Game Won buttons
+                elif game_state == GAME_WON:
+                     if win_menu_button.collidepoint(mouse_pos):
+                         reset_game()
+                         game_state = MENU
+                         play_music("menu_music", -1)
+                     elif win_quit_button.collidepoint(mouse_pos):
+                         running = False
 
-            if text_content:
-                # Calculate text size and background size
-                text_surface = font.render(text_content, True, TEXT_COLOR if not is_cost_warning else (255, 100, 100))
-                text_rect = text_surface.get_rect(center=(WIDTH // 2, 35)) # Center text near top
 
-                text_bg_padding = 20
-                text_bg = pygame.Rect(text_rect.left - text_bg_padding // 2, text_rect.top - text_bg_padding // 2,
-                                      text_rect.width + text_bg_padding, text_rect.height + text_bg_padding)
+                # Options Menu
+                elif game_state == OPTIONS:
+                    if back_options_button.collidepoint(mouse_pos):
+                        # Restore previous state or default to MENU
+                        if 'prev_state' in locals():
+                             game_state = prev_state
+                        elif level > 0: # If in game (not menu)
+                             game_state = PAUSED # Assume options were from pause
+                        else:
+                             game_state = MENU
+
+                        play_sound("menu")
+                        if game_state == MENU: play_music("menu_music", -1)
+                        # Music resumes when exiting pause menu handled above
+
+                    # Sound toggle
+                    elif sound_toggle_rect.collidepoint(mouse_pos):
+                        game_settings["sound_enabled"] = not game_settings["sound_enabled"]
+                        # Instantly apply music/sound volume change if music is playing
+                        set_music_volume()
+                        if game_settings["sound_enabled"]: play_sound("menu")
+
+                    # Models toggle
+                    elif models_toggle_rect.collidepoint(mouse_pos):
+                        game_settings["use_custom_models"] = not game_settings["use_custom_models"]
+                        if game_settings["sound_enabled"]: play_sound("menu")
+
+
+                    # Volume slider
+                    elif volume_slider_rect.collidepoint(mouse_pos):
+                        rel_x = mouse_pos[0] - volume_slider_rect.x
+                        game_settings["sound_volume"] = max(0, min(1, rel_x / volume_slider_rect.width))
+                        volume_handle_rect.x = volume_slider_rect.x + int(game_settings["sound_volume"] * volume_slider_rect.width) - 10
+                        set_music_volume()
+                        if game_settings["sound_enabled"]: play_sound("menu")
+                        dragging_volume = True
+
+                    # Brightness slider
+                    elif brightness_slider_rect.collidepoint(mouse_pos):
+                        rel_x = mouse_pos[0] - brightness_slider_rect.x
+                        game_settings["brightness"] = max(0, min(1, rel_x / brightness_slider_rect.width))
+                        brightness_handle_rect.x = brightness_slider_rect.x + int(game_settings["brightness"] * brightness_slider_rect.width) - 10
+                        dragging_brightness = True
+
+
+            elif event.type == pygame.MOUSEBUTTONUP:
+                # Stop dragging sliders
+                dragging_volume = False
+                dragging_brightness = False
+
+            elif event.type == pygame.MOUSEMOTION:
+                # Update sliders if dragging
+                if dragging_volume:
+                    rel_x = ui_view.to_logical(event.pos)[0] - volume_slider_rect.x
+                    game_settings["sound_volume"] = max(0, min(1, rel_x / volume_slider_rect.width))
+                    volume_handle_rect.x = volume_slider_rect.x + int(game_settings["sound_volume"] * volume_slider_rect.width) - 10
+                    set_music_volume()
 
-                pygame.draw.rect(screen, (50, 50, 50, 200), text_bg, border_radius=5)
-                screen.blit(text_surface, text_rect)
+                if dragging_brightness:
+                    rel_x = ui_view.to_logical(event.pos)[0] - brightness_slider_rect.x
+                    game_settings["brightness"] = max(0, min(1, rel_x / brightness_slider_rect.width))
+                    brightness_handle_rect.x = brightness_slider_rect.x + int(game_settings["brightness"] * brightness_slider_rect.width) - 10
+        frame_profiler.mark("events")
 
+        # --- Game Logic Update (Only in PLAYING and BOSS_FIGHT states) ---
+        if game_state == PLAYING or game_state == BOSS_FIGHT:
+            update_gameplay(current_time, pygame.key.get_pressed())
 
-        # Draw UI elements on top of flashlight and interaction text
-        draw_ui_elements()
 
+        # Play this frame's positional sounds as heard from the player
+        if audio_ready:
+            positional_audio.update(player.center)
+        if frame_watchdog is not None:
+            log_state_changes()
+        frame_profiler.mark("audio")
 
-    # Update the display
-    pygame.display.flip()
+        # --- Drawing (based on game state) ---
+        if game_state not in (PAUSED, OPTIONS):
+            pause_backdrop = None # The world has moved on, capture it again on the next pause
 
-# Game loop finishes when running is False
-stop_music() # Stop any music before quitting
-pygame.quit()
-sys.exit()
\ No newline at end of file
+        redraw = True
+        if game_state in IDLE_STATES and not frame_profiler.enabled: # The profiler overlay changes every frame
+            screen_key = idle_screen_key()
+            redraw = screen_key != drawn_idle_screen or any(event.type != pygame.MOUSEMOTION for event in events)
+            drawn_idle_screen = screen_key
+        else:
+            drawn_idle_screen = None
+
+        if not redraw:
+            pass # Idle screen, the display already shows exactly this
+
+        elif game_state == MENU:
+            draw_menu()
+
+        elif game_state == OPTIONS:
+            draw_options_menu()
+
+        elif game_state == GAME_OVER:
+            draw_game_over()
+
+        elif game_state == GAME_WON:
+            draw_game_won()
+
+        elif game_state == LOADING:
+            draw_loading_screen(get_asset_loader().progress(*ASSET_GROUPS_FOR_STATE[loading_target_state]))
+
+        elif game_state == PAUSED:
+            draw_pause_menu(current_time) # World, overlay and buttons
+
+        elif game_state == PLAYING or game_state == BOSS_FIGHT: # Draw game state if not paused/menu/gameover/won
+            draw_gameplay(current_time)
+
+        frame_profiler.mark("ui") # Menus, HUD and interaction text
+
+        # Profiler overlay goes on top of everything (F3)
+        frame_profiler.draw(screen)
+        frame_profiler.mark("overlay")
+
+        # Update the display
+        if redraw:
+            pygame.display.flip()
+        frame_profiler.mark("flip")
+        gc_manager.end_frame(game_state in GC_IDLE_STATES)
+        frame_profiler.mark("gc")
+        frame_profiler.end_frame()
+        if metrics_recorder is not None and metrics_recorder.tick():
+            metrics_recorder.record(collect_frame_metrics())
+
+    # Game loop finishes when running is False
+    stop_music() # Stop any music before quitting
+    if audio_ready:
+        music_controller.report()
+    frame_profiler.report()
+    gc_manager.report()
+    if metrics_recorder is not None:
+        metrics_recorder.close()
+    if frame_watchdog is not None:
+        frame_watchdog.close()
+    if sampling_profiler is not None:
+        sampling_profiler.stop()
+        write_sampled_profile()
+        sampling_profiler.report()
+    get_asset_loader().shutdown()
+    if level_stream is not None:
+        level_stream.shutdown()
+    pygame.quit()
+    sys.exit()
+
+def build_asset_pack():
+    # Record every asset the game asks for and write them all to the pack
+    global asset_loader
+    builder = AssetPackBuilder()
+    asset_loader = builder
+    load_sprites()
+    load_sounds()
+    for file in music_files.values():
+        builder.add_file(asset_path(file))
+    builder.write(asset_path(PACK_FILE))
+
+def render_scale_arg(value):
+    if value == "auto":
+        return value
+    scale = float(value)
+    if not 0.1 <= scale <= 1.0:
+        raise argparse.ArgumentTypeError("render scale must be between 0.1 and 1.0, or 'auto'")
+    return scale
+
+def maze_size_arg(value):
+    try:
+        cols, rows = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("maze size must look like 20x15")
+    if cols < 1 or rows < 1:
+        raise argparse.ArgumentTypeError("maze size must be at least 1x1")
+    return cols, rows
+
+def window_size_arg(value):
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("window size must look like 1280x960")
+    if width < 200 or height < 150:
+        raise argparse.ArgumentTypeError("window size must be at least 200x150")
+    return width, height
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lost in the Dark")
+    parser.add_argument("--build-asset-pack", action="store_true", help=f"write all assets to {PACK_FILE} and exit")
+    parser.add_argument("--metrics", metavar="PATH", help="record per-frame metrics to PATH")
+    parser.add_argument("--metrics-format", choices=METRICS_FORMATS, default="jsonl")
+    parser.add_argument("--metrics-sample", type=int, default=1, metavar="N", help="record every Nth frame (default 1)")
+    parser.add_argument("--sample-profile", type=int, nargs="?", const=DEFAULT_SAMPLE_RATE, metavar="HZ",
+                        help=f"run the sampling profiler (default {DEFAULT_SAMPLE_RATE} samples per second)")
+    parser.add_argument("--watchdog", type=float, nargs="?", const=WATCHDOG_BUDGET_MS, metavar="MS",
+                        help=f"log every frame that takes longer than MS (default {WATCHDOG_BUDGET_MS:.1f})")
+    parser.add_argument("--render-scale", type=render_scale_arg, metavar="SCALE",
+                        help=f"draw the world at SCALE of the window size ({', '.join(map(str, RENDER_SCALES))} or any "
+                             "value up to 1), or 'auto' to lower it when frames run over budget")
+    parser.add_argument("--quality", choices=QUALITY_ORDER + ("auto",),
+                        help="detail preset (default high), or 'auto' to adjust it to the frame times")
+    parser.add_argument("--window-size", type=window_size_arg, metavar="WxH",
+                        help=f"initial window size (default {WIDTH}x{HEIGHT}); the window can also be resized")
+    parser.add_argument("--fullscreen", action="store_true", help="start in fullscreen (F11 toggles)")
+    parser.add_argument("--level-file", metavar="PATH", help="play the level in PATH, loading it in chunks as the player moves")
+    parser.add_argument("--maze", type=int, metavar="SEED", help="play a generated maze (the same SEED gives the same maze)")
+    parser.add_argument("--maze-size", type=maze_size_arg, default=MAZE_SIZE, metavar="COLSxROWS",
+                        help=f"size of the --maze in cells (default {MAZE_SIZE[0]}x{MAZE_SIZE[1]})")
+    args = parser.parse_args()
+    if args.level_file and args.maze is not None:
+        parser.error("--level-file and --maze can't be used together")
+    if args.maze is not None:
+        load_generated_level(args.maze, args.maze_size)
+    if args.level_file:
+        try:
+            load_level_file(args.level_file)
+        except (OSError, ValueError) as e:
+            parser.error(f"could not open level file {args.level_file}: {e}")
+    if args.window_size:
+        window_size = args.window_size
+    game_settings["fullscreen"] = args.fullscreen
+    if args.quality == "auto":
+        game_settings["auto_quality"] = True
+    elif args.quality is not None:
+        game_settings["quality"] = args.quality
+    if args.render_scale == "auto":
+        game_settings["auto_render_scale"] = True
+    elif args.render_scale is not None:
+        game_settings["render_scale"] = args.render_scale
+    if args.build_asset_pack:
+        build_asset_pack()
+    else:
+        if args.metrics:
+            start_metrics(args.metrics, args.metrics_format, args.metrics_sample)
+        if args.sample_profile:
+            start_sampling_profiler(args.sample_profile)
+        if args.watchdog:
+            start_watchdog(args.watchdog)
+        main()
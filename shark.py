@@ -1,12 +1,18 @@
+from startup import StartupTimer
+startup_timer = StartupTimer() # Created before importing pygame so the report includes it
+
 import pygame
 import math
 import random
 import os
 import sys
 
-# Initialize pygame with sound
-pygame.init()
-pygame.mixer.init()
+startup_timer.mark("import pygame")
+
+# Nothing is initialized at import time. The display, fonts, mixer and level
+# data are created the first time they are needed (see init_display(),
+# get_font(), init_audio() and ensure_level_coins()), so tools can import this
+# module without opening a window or touching the audio device.
 
 # Game Constants
 WIDTH, HEIGHT = 800, 600
@@ -28,14 +34,29 @@ TEXT_COLOR = (255, 255, 255)
 FLASHLIGHT_ANGLE = math.radians(30)
 FLASHLIGHT_LENGTH = 250
 
-# Create screen
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Door Explorer")
+# Screen (created by init_display())
+screen = None
+
+def init_display():
+    global screen
+    if screen is None:
+        pygame.display.init()
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Door Explorer")
+    return screen
 
-# Fonts
-font = pygame.font.Font(None, 36)
-title_font = pygame.font.Font(None, 72)
-small_font = pygame.font.Font(None, 24)
+# Fonts (created by get_font() on first use)
+FONT_SIZE = 36
+TITLE_FONT_SIZE = 72
+SMALL_FONT_SIZE = 24
+fonts = {}
+
+def get_font(size):
+    if size not in fonts:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        fonts[size] = pygame.font.Font(None, size)
+    return fonts[size]
 
 # Game Settings
 game_settings = {
@@ -46,6 +67,12 @@ game_settings = {
     "use_custom_backgrounds": True
 }
 
+# Assets are looked up next to this file, not in the working directory
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def asset_path(file):
+    return os.path.join(ASSET_DIR, file)
+
 # Sound handling
 sounds = {}
 
@@ -62,14 +89,29 @@ def load_sounds():
     # Try to load each sound
     for name, file in sound_files.items():
         try:
-            sounds[name] = pygame.mixer.Sound(file)
+            sounds[name] = pygame.mixer.Sound(asset_path(file))
             print(f"Loaded sound: {file}")
         except:
             sounds[name] = None
             print(f"Could not load sound: {file}")
 
+# The mixer is only opened the first time a sound actually plays
+audio_ready = None # None: not tried yet, True: mixer open, False: no audio device
+
+def init_audio():
+    global audio_ready
+    if audio_ready is None:
+        try:
+            pygame.mixer.init()
+            audio_ready = True
+            load_sounds()
+        except pygame.error as e:
+            audio_ready = False
+            print(f"Could not initialize audio: {e}")
+    return audio_ready
+
 def play_sound(name):
-    if game_settings["sound_enabled"] and name in sounds and sounds[name] is not None:
+    if game_settings["sound_enabled"] and init_audio() and name in sounds and sounds[name] is not None:
         try:
             sounds[name].set_volume(game_settings["sound_volume"])
             sounds[name].play()
@@ -99,6 +141,15 @@ enemy_sprites = {}
 item_sprites = {}
 level_background_image = {}
 
+sprites_loaded = False # Sprites are decoded the first time gameplay needs them
+
+def ensure_sprites_loaded():
+    global sprites_loaded
+    if not sprites_loaded:
+        load_sprites()
+        load_new_enemy_sprite() # Load your new enemy sprite after loading default sprites
+        sprites_loaded = True
+
 def load_sprites():
     global player_sprites, enemy_sprites, item_sprites, level_background_image
     print("--- Attempting to load item sprites ---") # Debugging start
@@ -106,14 +157,14 @@ def load_sprites():
     # Try to load item sprites
     try:
         print("Trying to load coin.png...") # Debugging: Before load
-        item_sprites["coin"] = pygame.image.load("coin.png")
+        item_sprites["coin"] = pygame.image.load(asset_path("coin.png"))
         print("coin.png loaded successfully!") # Debugging: Success
         item_sprites["coin"] = pygame.transform.scale(item_sprites["coin"], (20, 20))
         print("coin.png scaled successfully.") # Debugging: Success
 
-        item_sprites["door"] = pygame.image.load("door.png") # ... (rest of item loading)
+        item_sprites["door"] = pygame.image.load(asset_path("door.png")) # ... (rest of item loading)
         item_sprites["door"] = pygame.transform.scale(item_sprites["door"], (50, 100))
-        item_sprites["window"] = pygame.image.load("window.png")
+        item_sprites["window"] = pygame.image.load(asset_path("window.png"))
         item_sprites["window"] = pygame.transform.scale(item_sprites["window"], (80, 50))
         print("Loaded item sprites (all items)") # Success message (if all items load)
 
@@ -126,10 +177,10 @@ def load_sprites():
     # Try to load player sprites
     try:
         player_sprites = {
-            "right": pygame.image.load("player.png"),
-            "left": pygame.image.load("player.png"),
-            "up": pygame.image.load("player.png"),
-            "down": pygame.image.load("player.png")
+            "right": pygame.image.load(asset_path("player.png")),
+            "left": pygame.image.load(asset_path("player.png")),
+            "up": pygame.image.load(asset_path("player.png")),
+            "down": pygame.image.load(asset_path("player.png"))
         }
         # Scale sprites to player size
         for direction in player_sprites:
@@ -141,21 +192,20 @@ def load_sprites():
     
     # Try to load enemy sprites
     try:
-        enemy_sprites["default"] = pygame.image.load("enemy.png")
+        enemy_sprites["default"] = pygame.image.load(asset_path("enemy.png"))
         enemy_sprites["default"] = pygame.transform.scale(enemy_sprites["default"], (100, 100))
         print("Loaded enemy sprites")
     except:
         enemy_sprites = {}
         print("Could not load enemy sprites, using default shapes")
     
-    print(f"Current working directory: {os.getcwd()}") 
     # Try to load item sprites
     try:
-        item_sprites["coin"] = pygame.image.load("coin.png")
+        item_sprites["coin"] = pygame.image.load(asset_path("coin.png"))
         item_sprites["coin"] = pygame.transform.scale(item_sprites["coin"], (40, 40))
-        item_sprites["door"] = pygame.image.load("door.png")
+        item_sprites["door"] = pygame.image.load(asset_path("door.png"))
         item_sprites["door"] = pygame.transform.scale(item_sprites["door"], (50, 100))
-        item_sprites["window"] = pygame.image.load("window.png")
+        item_sprites["window"] = pygame.image.load(asset_path("window.png"))
         item_sprites["window"] = pygame.transform.scale(item_sprites["window"], (80, 50))
         print("Loaded item sprites")
     except:
@@ -163,7 +213,7 @@ def load_sprites():
         print("Could not load item sprites, using default shapes")
         # Try to load background image
     try:
-        level_background_image = pygame.image.load("background.png") # Load background.png
+        level_background_image = pygame.image.load(asset_path("background.png")) # Load background.png
         level_background_image = pygame.transform.scale(level_background_image, (WIDTH, HEIGHT)) # Scale to screen size
         print("Loaded background image: background.png")
     except:
@@ -458,11 +508,16 @@ interaction_target = None
 # Background Colors per Level
 level_colors = [(50, 50, 50), (100, 100, 255), (255, 100, 100)]
 
-# Generate initial coins for level 0
-coins = generate_coins(0, 15)
-# Add some coins to other levels too
-coins.extend(generate_coins(1, 20))
-coins.extend(generate_coins(2, 25))
+# Coins are generated per level the first time the player enters it
+coins_per_level = {0: 15, 1: 20, 2: 25}
+coins = []
+coin_levels_generated = set()
+
+def ensure_level_coins(level_num):
+    if level_num not in coin_levels_generated:
+        coin_levels_generated.add(level_num)
+        if level_num in coins_per_level:
+            coins.extend(generate_coins(level_num, coins_per_level[level_num]))
 
 def draw_flashlight():
     center_x, center_y = player.x + player.width // 2, player.y + player.height // 2
@@ -497,7 +552,7 @@ def draw_button(rect, text, hover_check=True):
     pygame.draw.rect(screen, button_color, rect, border_radius=10)
     pygame.draw.rect(screen, WHITE, rect, 2, border_radius=10)  # Border
     
-    button_text = font.render(text, True, WHITE)
+    button_text = get_font(FONT_SIZE).render(text, True, WHITE)
     button_text_rect = button_text.get_rect(center=rect.center)
     screen.blit(button_text, button_text_rect)
 
@@ -505,7 +560,7 @@ def draw_menu():
     screen.fill(MENU_BG_COLOR)
     
     # Draw title
-    title_text = title_font.render("Door Explorer", True, WHITE)
+    title_text = get_font(TITLE_FONT_SIZE).render("Door Explorer", True, WHITE)
     title_rect = title_text.get_rect(center=(WIDTH // 2, HEIGHT // 3))
     screen.blit(title_text, title_rect)
     
@@ -523,19 +578,19 @@ def draw_menu():
     ]
     
     for i, instruction in enumerate(instructions):
-        inst_text = small_font.render(instruction, True, WHITE)
+        inst_text = get_font(SMALL_FONT_SIZE).render(instruction, True, WHITE)
         screen.blit(inst_text, (WIDTH // 2 - 150, HEIGHT // 2 + 100 + i * 30))
 
 def draw_options_menu():
     screen.fill(MENU_BG_COLOR)
     
     # Draw title
-    title_text = title_font.render("Options", True, WHITE)
+    title_text = get_font(TITLE_FONT_SIZE).render("Options", True, WHITE)
     title_rect = title_text.get_rect(center=(WIDTH // 2, HEIGHT // 6))
     screen.blit(title_text, title_rect)
     
     # Sound toggle
-    sound_text = font.render("Sound Enabled:", True, WHITE)
+    sound_text = get_font(FONT_SIZE).render("Sound Enabled:", True, WHITE)
     screen.blit(sound_text, (WIDTH // 2 - 250, HEIGHT // 2 - 120))
     
     pygame.draw.rect(screen, WHITE, sound_toggle_rect, 2)
@@ -543,7 +598,7 @@ def draw_options_menu():
         pygame.draw.rect(screen, (0, 255, 0), pygame.Rect(sound_toggle_rect.x + 5, sound_toggle_rect.y + 5, 20, 20))
     
     # Volume slider
-    volume_text = font.render("Sound Volume:", True, WHITE)
+    volume_text = get_font(FONT_SIZE).render("Sound Volume:", True, WHITE)
     screen.blit(volume_text, (WIDTH // 2 - 250, HEIGHT // 2 - 60))
     
     pygame.draw.rect(screen, (100, 100, 100), volume_slider_rect, border_radius=5)
@@ -553,7 +608,7 @@ def draw_options_menu():
     pygame.draw.rect(screen, WHITE, volume_handle_rect, border_radius=5)
     
     # Brightness slider
-    brightness_text = font.render("Brightness:", True, WHITE)
+    brightness_text = get_font(FONT_SIZE).render("Brightness:", True, WHITE)
     screen.blit(brightness_text, (WIDTH // 2 - 250, HEIGHT // 2))
     
     pygame.draw.rect(screen, (100, 100, 100), brightness_slider_rect, border_radius=5)
@@ -563,7 +618,7 @@ def draw_options_menu():
     pygame.draw.rect(screen, WHITE, brightness_handle_rect, border_radius=5)
     
     # Custom models toggle
-    models_text = font.render("Custom Models:", True, WHITE)
+    models_text = get_font(FONT_SIZE).render("Custom Models:", True, WHITE)
     screen.blit(models_text, (WIDTH // 2 - 250, HEIGHT // 2 + 60))
     
     pygame.draw.rect(screen, WHITE, models_toggle_rect, 2)
@@ -580,7 +635,7 @@ def draw_pause_menu():
     screen.blit(overlay, (0, 0))
     
     # Draw title
-    title_text = title_font.render("Game Paused", True, WHITE)
+    title_text = get_font(TITLE_FONT_SIZE).render("Game Paused", True, WHITE)
     title_rect = title_text.get_rect(center=(WIDTH // 2, HEIGHT // 6))
     screen.blit(title_text, title_rect)
     
@@ -597,12 +652,12 @@ def draw_game_over():
     screen.blit(overlay, (0, 0))
     
     # Draw title
-    title_text = title_font.render("Game Over", True, (255, 50, 50))
+    title_text = get_font(TITLE_FONT_SIZE).render("Game Over", True, (255, 50, 50))
     title_rect = title_text.get_rect(center=(WIDTH // 2, HEIGHT // 4))
     screen.blit(title_text, title_rect)
     
     # Draw score
-    score_text = font.render(f"Coins Collected: {player_coins}", True, COIN_COLOR)
+    score_text = get_font(FONT_SIZE).render(f"Coins Collected: {player_coins}", True, COIN_COLOR)
     score_rect = score_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 50))
     screen.blit(score_text, score_rect)
     
@@ -617,7 +672,7 @@ def draw_ui_elements():
     pygame.draw.rect(screen, (50, 50, 50), coin_bg, border_radius=5)
     pygame.draw.rect(screen, COIN_COLOR, coin_bg, 2, border_radius=5)  # Gold border
     
-    coin_text = font.render(f"Coins: {player_coins}", True, COIN_COLOR)
+    coin_text = get_font(FONT_SIZE).render(f"Coins: {player_coins}", True, COIN_COLOR)
     screen.blit(coin_text, (25, 20))
     
     # Level indicator
@@ -625,7 +680,7 @@ def draw_ui_elements():
     pygame.draw.rect(screen, (50, 50, 50), level_bg, border_radius=5)
     pygame.draw.rect(screen, WHITE, level_bg, 2, border_radius=5)  # White border
     
-    level_text = font.render(f"Level: {level}", True, WHITE)
+    level_text = get_font(FONT_SIZE).render(f"Level: {level}", True, WHITE)
     screen.blit(level_text, (25, 70))
     
     # Health indicator
@@ -633,7 +688,7 @@ def draw_ui_elements():
     pygame.draw.rect(screen, (50, 50, 50), health_bg, border_radius=5)
     pygame.draw.rect(screen, (255, 50, 50), health_bg, 2, border_radius=5)  # Red border
     
-    health_text = font.render(f"Health: {player_health}", True, (255, 50, 50))
+    health_text = get_font(FONT_SIZE).render(f"Health: {player_health}", True, (255, 50, 50))
     screen.blit(health_text, (25, 120))
 
             # --- NEW FUNCTION TO LOAD YOUR PISKEL ENEMY SPRITE ---
@@ -646,7 +701,7 @@ def load_new_enemy_sprite():
         # 1.  **Export from Piskel as PNG:**  Make sure you export your enemy sprite from Piskel as a PNG file.
         # 2.  **Filename:**  Replace "your_new_enemy_sprite.png" with the actual filename of your exported PNG file.
         # 3.  **File Location:**  Place the PNG file in the same directory as your Python script
-        enemy_sprites["new_enemy"] = pygame.image.load("enemy.png")
+        enemy_sprites["new_enemy"] = pygame.image.load(asset_path("enemy.png"))
 
         # Scale the sprite to a suitable size (adjust as needed)
         enemy_sprites["new_enemy"] = pygame.transform.scale(enemy_sprites["new_enemy"], (30, 30))
@@ -662,12 +717,12 @@ def load_new_enemy_sprite():
             pygame.draw.rect(screen, (50, 50, 50, 200), text_bg, border_radius=5)
             
             if player_coins >= interaction_target["cost"]:
-                interact_text = font.render(
+                interact_text = get_font(FONT_SIZE).render(
                     f"Enter {interaction_target['type']} to Level {interaction_target['target']} (Cost: {interaction_target['cost']} coins - Press Enter)", 
                     True, TEXT_COLOR
                 )
             else:
-                interact_text = font.render(
+                interact_text = get_font(FONT_SIZE).render(
                     f"Need {interaction_target['cost']} coins (you have {player_coins})", 
                     True, (255, 100, 100)  # Red text for warning
                 )
@@ -693,334 +748,365 @@ def reset_game():
             enemy.rect.x = random.randint(100, WIDTH - 100)  # Corrected line - set enemy.rect.x
             enemy.rect.y = random.randint(100, HEIGHT - 100)  # Corrected line - set enemy.rect.y
     
-    # Regenerate coins
-    coins = []
-    coins = generate_coins(0, 15)
-    coins.extend(generate_coins(1, 20))
-    coins.extend(generate_coins(2, 25))
+    # Regenerate coins (other levels get theirs when first entered)
+    coins.clear()
+    coin_levels_generated.clear()
+    ensure_level_coins(0)
 
 # Initialize other variables
 immunity_time = 1000  # ms of immunity after being hit
 last_hit_time = 0
 
-# Load resources
-load_sounds()
-load_sprites()
-load_new_enemy_sprite() # Load your new enemy sprite after loading default sprites
-
 # Game Loop
 clock = pygame.time.Clock()
-while running:
-    current_time = pygame.time.get_ticks()
+
+def main():
+    global running, game_state, level, player_direction, player_coins, player_health
+    global last_hit_time, dragging_volume, dragging_brightness, display_text, interaction_target
+
+    init_display()
+    startup_timer.mark("display")
+
+    # Show the first menu frame before anything else is loaded
+    draw_menu()
+    pygame.display.flip()
+    startup_timer.mark("first menu frame")
+    startup_timer.report()
+
+    while running:
+        current_time = pygame.time.get_ticks()
     
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
             
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                if game_state == PLAYING:
-                    game_state = PAUSED
-                   
-                elif game_state == PAUSED:
-                    game_state = PLAYING
-                elif game_state == OPTIONS:
-                    # If coming from pause menu, go back to pause
-                    if level > 0:
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    if game_state == PLAYING:
                         game_state = PAUSED
-                    else:
-                        game_state = MENU
-                    play_sound("menu")
+                   
+                    elif game_state == PAUSED:
+                        game_state = PLAYING
+                    elif game_state == OPTIONS:
+                        # If coming from pause menu, go back to pause
+                        if level > 0:
+                            game_state = PAUSED
+                        else:
+                            game_state = MENU
+                        play_sound("menu")
                     
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            mouse_pos = event.pos
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                mouse_pos = event.pos
             
-            # Main Menu buttons
-            if game_state == MENU:
-                if start_button.collidepoint(mouse_pos):
-                    game_state = PLAYING
-                    play_sound("menu")
-                    # Reset player position when starting game
-                    player.x, player.y = 50, HEIGHT // 2
+                # Main Menu buttons
+                if game_state == MENU:
+                    if start_button.collidepoint(mouse_pos):
+                        ensure_level_coins(0)
+                        game_state = PLAYING
+                        play_sound("menu")
+                        # Reset player position when starting game
+                        player.x, player.y = 50, HEIGHT // 2
                   
-                elif options_button.collidepoint(mouse_pos):
-                    game_state = OPTIONS
+                    elif options_button.collidepoint(mouse_pos):
+                        game_state = OPTIONS
                   
-                elif quit_button.collidepoint(mouse_pos):
-                    running = False
+                    elif quit_button.collidepoint(mouse_pos):
+                        running = False
             
-            # Pause Menu buttons
-            elif game_state == PAUSED:
-                if resume_button.collidepoint(mouse_pos):
-                    game_state = PLAYING
-                    play_sound("menu")
-                elif options_button.collidepoint(mouse_pos):
-                    game_state = OPTIONS
+                # Pause Menu buttons
+                elif game_state == PAUSED:
+                    if resume_button.collidepoint(mouse_pos):
+                        game_state = PLAYING
+                        play_sound("menu")
+                    elif options_button.collidepoint(mouse_pos):
+                        game_state = OPTIONS
                   
-                elif reset_button.collidepoint(mouse_pos):
-                    reset_game()
-                    game_state = PLAYING
-                    play_sound("menu")
-                elif menu_button.collidepoint(mouse_pos):
-                    reset_game()
-                    game_state = MENU
+                    elif reset_button.collidepoint(mouse_pos):
+                        reset_game()
+                        game_state = PLAYING
+                        play_sound("menu")
+                    elif menu_button.collidepoint(mouse_pos):
+                        reset_game()
+                        game_state = MENU
                     
-                elif quit_button.collidepoint(mouse_pos):
-                    running = False
-            
-            # Game Over buttons
-            elif game_state == GAME_OVER:
-                if retry_button.collidepoint(mouse_pos):
-                    reset_game()
-                    game_state = PLAYING
-                    play_sound("menu")
-                elif menu_button.collidepoint(mouse_pos):
-                    reset_game()
-                    game_state = MENU
-                    play_sound("menu")
-                elif quit_button.collidepoint(mouse_pos):
-                    running = False
+                    elif quit_button.collidepoint(mouse_pos):
+                        running = False
             
-            # Options Menu
-            elif game_state == OPTIONS:
-                if back_options_button.collidepoint(mouse_pos):
-                    # If coming from pause menu, go back to pause
-                    if level > 0:
-                        game_state = PAUSED
-                    else:
+                # Game Over buttons
+                elif game_state == GAME_OVER:
+                    if retry_button.collidepoint(mouse_pos):
+                        reset_game()
+                        game_state = PLAYING
+                        play_sound("menu")
+                    elif menu_button.collidepoint(mouse_pos):
+                        reset_game()
                         game_state = MENU
-                    play_sound("menu")
+                        play_sound("menu")
+                    elif quit_button.collidepoint(mouse_pos):
+                        running = False
+            
+                # Options Menu
+                elif game_state == OPTIONS:
+                    if back_options_button.collidepoint(mouse_pos):
+                        # If coming from pause menu, go back to pause
+                        if level > 0:
+                            game_state = PAUSED
+                        else:
+                            game_state = MENU
+                        play_sound("menu")
                 
-                # Sound toggle
-                elif sound_toggle_rect.collidepoint(mouse_pos):
-                    game_settings["sound_enabled"] = not game_settings["sound_enabled"]
-                    play_sound("menu")
+                    # Sound toggle
+                    elif sound_toggle_rect.collidepoint(mouse_pos):
+                        game_settings["sound_enabled"] = not game_settings["sound_enabled"]
+                        play_sound("menu")
                 
-                # Models toggle
-                elif models_toggle_rect.collidepoint(mouse_pos):
-                    game_settings["use_custom_models"] = not game_settings["use_custom_models"]
-                    play_sound("menu")
+                    # Models toggle
+                    elif models_toggle_rect.collidepoint(mouse_pos):
+                        game_settings["use_custom_models"] = not game_settings["use_custom_models"]
+                        play_sound("menu")
                 
-                # Volume slider
-                elif volume_slider_rect.collidepoint(mouse_pos):
-                    # Set volume based on click position
-                    rel_x = mouse_pos[0] - volume_slider_rect.x
-                    game_settings["sound_volume"] = max(0, min(1, rel_x / volume_slider_rect.width))
-                    volume_handle_rect.x = volume_slider_rect.x + int(game_settings["sound_volume"] * volume_slider_rect.width) - 10
-                    play_sound("menu")
-                    dragging_volume = True
+                    # Volume slider
+                    elif volume_slider_rect.collidepoint(mouse_pos):
+                        # Set volume based on click position
+                        rel_x = mouse_pos[0] - volume_slider_rect.x
+                        game_settings["sound_volume"] = max(0, min(1, rel_x / volume_slider_rect.width))
+                        volume_handle_rect.x = volume_slider_rect.x + int(game_settings["sound_volume"] * volume_slider_rect.width) - 10
+                        play_sound("menu")
+                        dragging_volume = True
                 
-                # Brightness slider
-                elif brightness_slider_rect.collidepoint(mouse_pos):
-                    # Set brightness based on click position
-                    rel_x = mouse_pos[0] - brightness_slider_rect.x
-                    game_settings["brightness"] = max(0, min(1, rel_x / brightness_slider_rect.width))
-                    brightness_handle_rect.x = brightness_slider_rect.x + int(game_settings["brightness"] * brightness_slider_rect.width) - 10
-                    dragging_brightness = True
+                    # Brightness slider
+                    elif brightness_slider_rect.collidepoint(mouse_pos):
+                        # Set brightness based on click position
+                        rel_x = mouse_pos[0] - brightness_slider_rect.x
+                        game_settings["brightness"] = max(0, min(1, rel_x / brightness_slider_rect.width))
+                        brightness_handle_rect.x = brightness_slider_rect.x + int(game_settings["brightness"] * brightness_slider_rect.width) - 10
+                        dragging_brightness = True
         
-        elif event.type == pygame.MOUSEBUTTONUP:
-            # Stop dragging sliders
-            dragging_volume = False
-            dragging_brightness = False
+            elif event.type == pygame.MOUSEBUTTONUP:
+                # Stop dragging sliders
+                dragging_volume = False
+                dragging_brightness = False
         
-        elif event.type == pygame.MOUSEMOTION:
-            # Update sliders if dragging
-            if dragging_volume:
-                rel_x = event.pos[0] - volume_slider_rect.x
-                game_settings["sound_volume"] = max(0, min(1, rel_x / volume_slider_rect.width))
-                volume_handle_rect.x = volume_slider_rect.x + int(game_settings["sound_volume"] * volume_slider_rect.width) - 10
+            elif event.type == pygame.MOUSEMOTION:
+                # Update sliders if dragging
+                if dragging_volume:
+                    rel_x = event.pos[0] - volume_slider_rect.x
+                    game_settings["sound_volume"] = max(0, min(1, rel_x / volume_slider_rect.width))
+                    volume_handle_rect.x = volume_slider_rect.x + int(game_settings["sound_volume"] * volume_slider_rect.width) - 10
             
-            if dragging_brightness:
-                rel_x = event.pos[0] - brightness_slider_rect.x
-                game_settings["brightness"] = max(0, min(1, rel_x / brightness_slider_rect.width))
-                brightness_handle_rect.x = brightness_slider_rect.x + int(game_settings["brightness"] * brightness_slider_rect.width) - 10
+                if dragging_brightness:
+                    rel_x = event.pos[0] - brightness_slider_rect.x
+                    game_settings["brightness"] = max(0, min(1, rel_x / brightness_slider_rect.width))
+                    brightness_handle_rect.x = brightness_slider_rect.x + int(game_settings["brightness"] * brightness_slider_rect.width) - 10
     
-    # Draw the appropriate screen based on game state
-    if game_state == MENU:
-        draw_menu()
+        # Draw the appropriate screen based on game state
+        if game_state == MENU:
+            draw_menu()
     
-    elif game_state == OPTIONS:
-        draw_options_menu()
+        elif game_state == OPTIONS:
+            draw_options_menu()
     
-    elif game_state == GAME_OVER:
-        draw_game_over()
+        elif game_state == GAME_OVER:
+            draw_game_over()
     
-    elif game_state == PAUSED:
-        # Still draw the game in the background (but don't update it)
-        draw_pause_menu()
+        elif game_state == PAUSED:
+            # Still draw the game in the background (but don't update it)
+            draw_pause_menu()
     
-    elif game_state == PLAYING:
-        if game_settings["use_custom_backgrounds"] and level_background_image is not None:
-            screen.blit(level_background_image, (0, 0)) # Blit background image
-        else:
-            screen.fill(level_colors[level % len(level_colors)]) # Fallback to level color
+        elif game_state == PLAYING:
+            ensure_sprites_loaded() # Sprites are only needed once gameplay starts
+            if game_settings["use_custom_backgrounds"] and level_background_image is not None:
+                screen.blit(level_background_image, (0, 0)) # Blit background image
+            else:
+                screen.fill(level_colors[level % len(level_colors)]) # Fallback to level color
         
         
-        # Get current level walls
-        current_walls = walls_by_level.get(level, [])
+            # Get current level walls
+            current_walls = walls_by_level.get(level, [])
         
-        # Player Movement
-        keys = pygame.key.get_pressed()
-        moved = False
+            # Player Movement
+            keys = pygame.key.get_pressed()
+            moved = False
         
-        new_x, new_y = player.x, player.y
+            new_x, new_y = player.x, player.y
         
-        if keys[pygame.K_a] or keys[pygame.K_LEFT]:
-            new_x -= PLAYER_SPEED
-            player_direction = 2  # Left
-            moved = True
-        if keys[pygame.K_d] or keys[pygame.K_RIGHT]:
-            new_x += PLAYER_SPEED
-            player_direction = 0  # Right
-            moved = True
-        if keys[pygame.K_w] or keys[pygame.K_UP]:
-            new_y -= PLAYER_SPEED
-            player_direction = 3  # Up
-            moved = True
-        if keys[pygame.K_s] or keys[pygame.K_DOWN]:
-            new_y += PLAYER_SPEED
-            player_direction = 1  # Down
-            moved = True
+            if keys[pygame.K_a] or keys[pygame.K_LEFT]:
+                new_x -= PLAYER_SPEED
+                player_direction = 2  # Left
+                moved = True
+            if keys[pygame.K_d] or keys[pygame.K_RIGHT]:
+                new_x += PLAYER_SPEED
+                player_direction = 0  # Right
+                moved = True
+            if keys[pygame.K_w] or keys[pygame.K_UP]:
+                new_y -= PLAYER_SPEED
+                player_direction = 3  # Up
+                moved = True
+            if keys[pygame.K_s] or keys[pygame.K_DOWN]:
+                new_y += PLAYER_SPEED
+                player_direction = 1  # Down
+                moved = True
         
-        # Check wall collisions for X movement
-        test_rect = pygame.Rect(new_x, player.y, player.width, player.height)
-        if not any(test_rect.colliderect(wall) for wall in current_walls):
-            player.x = new_x
+            # Check wall collisions for X movement
+            test_rect = pygame.Rect(new_x, player.y, player.width, player.height)
+            if not any(test_rect.colliderect(wall) for wall in current_walls):
+                player.x = new_x
         
-        # Check wall collisions for Y movement
-        test_rect = pygame.Rect(player.x, new_y, player.width, player.height)
-        if not any(test_rect.colliderect(wall) for wall in current_walls):
-            player.y = new_y
+            # Check wall collisions for Y movement
+            test_rect = pygame.Rect(player.x, new_y, player.width, player.height)
+            if not any(test_rect.colliderect(wall) for wall in current_walls):
+                player.y = new_y
         
-        # Keep player on screen
-        player.x = max(0, min(WIDTH - player.width, player.x))
-        player.y = max(0, min(HEIGHT - player.height, player.y))
+            # Keep player on screen
+            player.x = max(0, min(WIDTH - player.width, player.x))
+            player.y = max(0, min(HEIGHT - player.height, player.y))
         
-        # Coin Collection
-        for coin in coins:
-            if coin["level"] == level and not coin["collected"]:
-                if player.colliderect(coin["rect"]):
-                    coin["collected"] = True
-                    player_coins += 1
-                    play_sound("coin")
+            # Coin Collection
+            for coin in coins:
+                if coin["level"] == level and not coin["collected"]:
+                    if player.colliderect(coin["rect"]):
+                        coin["collected"] = True
+                        player_coins += 1
+                        play_sound("coin")
         
-        # Enemy collision and updates
-        hit_by_enemy = False
-        for enemy in enemies:
-            if enemy.update(player, current_walls):
-                # Check if we have immunity
-                if current_time - last_hit_time > immunity_time:
-                    hit_by_enemy = True
-                    last_hit_time = current_time
+            # Enemy collision and updates
+            hit_by_enemy = False
+            for enemy in enemies:
+                if enemy.update(player, current_walls):
+                    # Check if we have immunity
+                    if current_time - last_hit_time > immunity_time:
+                        hit_by_enemy = True
+                        last_hit_time = current_time
         
-        # Handle enemy collision
-        if hit_by_enemy:
-            player_health -= 1
-            play_sound("hit")
+            # Handle enemy collision
+            if hit_by_enemy:
+                player_health -= 1
+                play_sound("hit")
             
-            # Check for game over
-            if player_health <= 0:
-                stop_sound("menu")
-                game_state = GAME_OVER
-                play_sound("gameover")
+                # Check for game over
+                if player_health <= 0:
+                    stop_sound("menu")
+                    game_state = GAME_OVER
+                    play_sound("gameover")
                 
         
-        # Interaction Logic
-        display_text = False
-        interaction_target = None
+            # Interaction Logic
+            display_text = False
+            interaction_target = None
         
-        # Check door interactions for current level
-        current_doors = doors_by_level.get(level, [])
-        for door in current_doors:
-            if player.colliderect(door["rect"]):
-                display_text = True
-                interaction_target = door
-                if keys[pygame.K_RETURN]:  # Press Enter to interact
-                    if player_coins >= door["cost"]:
-                        player_coins -= door["cost"]
-                        level = door["target"]
-                        # Reset player position for new level
-                        player.x, player.y = 50, HEIGHT // 2
-                        play_sound("door")
+            # Check door interactions for current level
+            current_doors = doors_by_level.get(level, [])
+            for door in current_doors:
+                if player.colliderect(door["rect"]):
+                    display_text = True
+                    interaction_target = door
+                    if keys[pygame.K_RETURN]:  # Press Enter to interact
+                        if player_coins >= door["cost"]:
+                            player_coins -= door["cost"]
+                            level = door["target"]
+                            ensure_level_coins(level) # Generate coins for the level on first visit
+                            # Reset player position for new level
+                            player.x, player.y = 50, HEIGHT // 2
+                            play_sound("door")
         
-        # Check window interactions for current level
-        current_windows = windows_by_level.get(level, [])
-        for window in current_windows:
-            if player.colliderect(window["rect"]):
-                display_text = True
-                interaction_target = window
-                if keys[pygame.K_RETURN]:  # Press Enter to interact
-                    if player_coins >= window["cost"]:
-                        player_coins -= window["cost"]
-                        level = window["target"]
-                        # Reset player position for new level
-                        player.x, player.y = 50, HEIGHT // 2
-                        play_sound("door")
+            # Check window interactions for current level
+            current_windows = windows_by_level.get(level, [])
+            for window in current_windows:
+                if player.colliderect(window["rect"]):
+                    display_text = True
+                    interaction_target = window
+                    if keys[pygame.K_RETURN]:  # Press Enter to interact
+                        if player_coins >= window["cost"]:
+                            player_coins -= window["cost"]
+                            level = window["target"]
+                            ensure_level_coins(level) # Generate coins for the level on first visit
+                            # Reset player position for new level
+                            player.x, player.y = 50, HEIGHT // 2
+                            play_sound("door")
         
-        # Back to main level button
-        if level > 0 and player.colliderect(back_rect):
-            display_text = True
-            if keys[pygame.K_RETURN]:
-                level = 0
-                player.x, player.y = 50, HEIGHT // 2
-                play_sound("door")
+            # Back to main level button
+            if level > 0 and player.colliderect(back_rect):
+                display_text = True
+                if keys[pygame.K_RETURN]:
+                    level = 0
+                    player.x, player.y = 50, HEIGHT // 2
+                    play_sound("door")
         
-        # Draw walls for current level
-        for wall in walls_by_level.get(level, []):
-            pygame.draw.rect(screen, WALL_COLOR, wall)
+            # Draw walls for current level
+            for wall in walls_by_level.get(level, []):
+                pygame.draw.rect(screen, WALL_COLOR, wall)
         
-        # Draw doors and windows for the current level
-        current_doors = doors_by_level.get(level, [])
-        for door in current_doors:
-            if game_settings["use_custom_models"] and "door" in item_sprites:
-                screen.blit(item_sprites["door"], door["rect"])
-            else:
-                pygame.draw.rect(screen, DOOR_COLOR, door["rect"])
+            # Draw doors and windows for the current level
+            current_doors = doors_by_level.get(level, [])
+            for door in current_doors:
+                if game_settings["use_custom_models"] and "door" in item_sprites:
+                    screen.blit(item_sprites["door"], door["rect"])
+                else:
+                    pygame.draw.rect(screen, DOOR_COLOR, door["rect"])
             
-            # Cost text with background
-            cost_bg = pygame.Rect(door["rect"].x - 10, door["rect"].y - 25, 70, 20)
-            pygame.draw.rect(screen, (50, 50, 50), cost_bg, border_radius=3)
-            cost_text = small_font.render(f"Cost: {door['cost']}", True, TEXT_COLOR)
-            screen.blit(cost_text, (door["rect"].x - 5, door["rect"].y - 20))
+                # Cost text with background
+                cost_bg = pygame.Rect(door["rect"].x - 10, door["rect"].y - 25, 70, 20)
+                pygame.draw.rect(screen, (50, 50, 50), cost_bg, border_radius=3)
+                cost_text = get_font(SMALL_FONT_SIZE).render(f"Cost: {door['cost']}", True, TEXT_COLOR)
+                screen.blit(cost_text, (door["rect"].x - 5, door["rect"].y - 20))
             
-        current_windows = windows_by_level.get(level, [])
-        for window in current_windows:
-            if game_settings["use_custom_models"] and "window" in item_sprites:
-                screen.blit(item_sprites["window"], window["rect"])
-            else:
-                pygame.draw.rect(screen, WINDOW_COLOR, window["rect"])
+            current_windows = windows_by_level.get(level, [])
+            for window in current_windows:
+                if game_settings["use_custom_models"] and "window" in item_sprites:
+                    screen.blit(item_sprites["window"], window["rect"])
+                else:
+                    pygame.draw.rect(screen, WINDOW_COLOR, window["rect"])
             
-            # Cost text with background
-            cost_bg = pygame.Rect(window["rect"].x - 10, window["rect"].y - 25, 70, 20)
-            pygame.draw.rect(screen, (50, 50, 50), cost_bg, border_radius=3)
-            cost_text = small_font.render(f"Cost: {window['cost']}", True, TEXT_COLOR)
-            screen.blit(cost_text, (window["rect"].x - 5, window["rect"].y - 20))
+                # Cost text with background
+                cost_bg = pygame.Rect(window["rect"].x - 10, window["rect"].y - 25, 70, 20)
+                pygame.draw.rect(screen, (50, 50, 50), cost_bg, border_radius=3)
+                cost_text = get_font(SMALL_FONT_SIZE).render(f"Cost: {window['cost']}", True, TEXT_COLOR)
+                screen.blit(cost_text, (window["rect"].x - 5, window["rect"].y - 20))
         
-        if level > 0:
-            # Draw the return button in other levels
-            pygame.draw.rect(screen, BACK_RECT_COLOR, back_rect)
+            if level > 0:
+                # Draw the return button in other levels
+                pygame.draw.rect(screen, BACK_RECT_COLOR, back_rect)
             
-            # Return text with background
-            back_bg = pygame.Rect(back_rect.x - 5, back_rect.y - 25, 110, 20)
-            pygame.draw.rect(screen, (50, 50, 50), back_bg, border_radius=3)
-            back_text = small_font.render("Return (Enter)", True, TEXT_COLOR)
-            screen.blit(back_text, (back_rect.x, back_rect.y - 20))
+                # Return text with background
+                back_bg = pygame.Rect(back_rect.x - 5, back_rect.y - 25, 110, 20)
+                pygame.draw.rect(screen, (50, 50, 50), back_bg, border_radius=3)
+                back_text = get_font(SMALL_FONT_SIZE).render("Return (Enter)", True, TEXT_COLOR)
+                screen.blit(back_text, (back_rect.x, back_rect.y - 20))
         
-        # Draw coins for current level
-        for coin in coins:
-            if coin["level"] == level and not coin["collected"]:
-                if game_settings["use_custom_models"] and "coin" in item_sprites:
-                    screen.blit(item_sprites["coin"], coin["rect"])
-                else:
-                    pygame.draw.ellipse(screen, COIN_COLOR, coin["rect"])
+            # Draw coins for current level
+            for coin in coins:
+                if coin["level"] == level and not coin["collected"]:
+                    if game_settings["use_custom_models"] and "coin" in item_sprites:
+                        screen.blit(item_sprites["coin"], coin["rect"])
+                    else:
+                        pygame.draw.ellipse(screen, COIN_COLOR, coin["rect"])
         
-        # Draw enemies
-        for enemy in enemies:
-            enemy.draw(screen)
+            # Draw enemies
+            for enemy in enemies:
+                enemy.draw(screen)
         
-        # Draw player (with flash effect if recently hit)
-        if current_time - last_hit_time < immunity_time:
-            if (current_time // 100) % 2 == 0:  # Flash effect
+            # Draw player (with flash effect if recently hit)
+            if current_time - last_hit_time < immunity_time:
+                if (current_time // 100) % 2 == 0:  # Flash effect
+                    if game_settings["use_custom_models"] and player_sprites:
+                        # Choose sprite based on direction
+                        sprite_key = "right"
+                        if player_direction == 0:
+                            sprite_key = "right"
+                        elif player_direction == 1:
+                            sprite_key = "down"
+                        elif player_direction == 2:
+                            sprite_key = "left"
+                        elif player_direction == 3:
+                            sprite_key = "up"
+                    
+                        if sprite_key in player_sprites:
+                            screen.blit(player_sprites[sprite_key], player)
+                        else:
+                            screen.blit(player_sprites.get("right", player_sprites[list(player_sprites.keys())[0]]), player)
+                    else:
+                        pygame.draw.rect(screen, PLAYER_COLOR, player)
+            else:
                 if game_settings["use_custom_models"] and player_sprites:
                     # Choose sprite based on direction
                     sprite_key = "right"
@@ -1032,42 +1118,27 @@ while running:
                         sprite_key = "left"
                     elif player_direction == 3:
                         sprite_key = "up"
-                    
+                
                     if sprite_key in player_sprites:
                         screen.blit(player_sprites[sprite_key], player)
                     else:
                         screen.blit(player_sprites.get("right", player_sprites[list(player_sprites.keys())[0]]), player)
                 else:
                     pygame.draw.rect(screen, PLAYER_COLOR, player)
-        else:
-            if game_settings["use_custom_models"] and player_sprites:
-                # Choose sprite based on direction
-                sprite_key = "right"
-                if player_direction == 0:
-                    sprite_key = "right"
-                elif player_direction == 1:
-                    sprite_key = "down"
-                elif player_direction == 2:
-                    sprite_key = "left"
-                elif player_direction == 3:
-                    sprite_key = "up"
-                
-                if sprite_key in player_sprites:
-                    screen.blit(player_sprites[sprite_key], player)
-                else:
-                    screen.blit(player_sprites.get("right", player_sprites[list(player_sprites.keys())[0]]), player)
-            else:
-                pygame.draw.rect(screen, PLAYER_COLOR, player)
         
-        # Flashlight Effect
-        draw_flashlight()
+            # Flashlight Effect
+            draw_flashlight()
         
-        # Draw UI elements on top of flashlight overlay
-        draw_ui_elements()
+            # Draw UI elements on top of flashlight overlay
+            draw_ui_elements()
     
-    # Update the display and cap the frame rate
-    pygame.display.flip()
-    clock.tick(60)  # Cap the frame rate at 60 FPS
+        # Update the display and cap the frame rate
+        pygame.display.flip()
+        clock.tick(60)  # Cap the frame rate at 60 FPS
+
+
+    pygame.quit()
+    sys.exit()
 
-pygame.quit()
-sys.exit()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
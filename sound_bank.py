@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import wave
+
+import pygame
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Synthesized stand-in sounds
+# Several sound files the game asks for don't ship with it. Rather than leave
+# those effects silent, each has a small recipe here that is synthesized with
+# NumPy the first time the file is missing. The result is written to the cache
+# directory as a WAV named after the recipe's hash, so later launches just
+# load it, and editing a recipe produces a fresh file instead of a stale one.
+#
+# Recipe fields:
+#   wave      - "sine", "square", "saw" or "noise"
+#   freq      - [start, end] frequency in Hz, swept exponentially
+#   duration  - length in seconds (per note when "notes" is given)
+#   noise     - 0.0 to 1.0, how much white noise to mix in
+#   attack    - fade-in time in seconds
+#   decay     - envelope exponent after the attack (higher dies away faster)
+#   volume    - peak level, 0.0 to 1.0
+#   notes     - optional list of frequencies played one after another
+
+SYNTH_AVAILABLE = np is not None
+SAMPLE_RATE = 44100
+
+SYNTH_RECIPES = {
+    "menu": {"wave": "sine", "freq": [880, 880], "duration": 0.06, "noise": 0.0, "attack": 0.005, "decay": 2.0, "volume": 0.5},
+    "boss_hit": {"wave": "square", "freq": [220, 110], "duration": 0.15, "noise": 0.2, "attack": 0.002, "decay": 3.0, "volume": 0.6},
+    "boss_laser_charge": {"wave": "saw", "freq": [200, 1200], "duration": 1.0, "noise": 0.05, "attack": 0.8, "decay": 0.5, "volume": 0.4},
+    "boss_laser_fire": {"wave": "square", "freq": [1200, 800], "duration": 0.5, "noise": 0.3, "attack": 0.01, "decay": 1.5, "volume": 0.5},
+    "boss_stomp": {"wave": "sine", "freq": [70, 30], "duration": 0.4, "noise": 0.5, "attack": 0.005, "decay": 4.0, "volume": 0.9},
+    "boss_punch": {"wave": "noise", "freq": [150, 80], "duration": 0.12, "noise": 1.0, "attack": 0.002, "decay": 3.0, "volume": 0.7},
+    "win": {"wave": "sine", "freq": [0, 0], "duration": 0.15, "noise": 0.0, "attack": 0.01, "decay": 1.0, "volume": 0.5,
+            "notes": [523.25, 659.25, 783.99, 1046.5]},
+}
+
+def recipe_hash(recipe):
+    key = json.dumps({"recipe": recipe, "sample_rate": SAMPLE_RATE}, sort_keys=True)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def _tone(wave_type, start_freq, end_freq, duration, noise, attack, decay, rng):
+    count = max(1, int(duration * SAMPLE_RATE))
+    if start_freq == end_freq:
+        freq = np.full(count, float(start_freq))
+    else:
+        freq = np.geomspace(start_freq, end_freq, count)
+    phase = 2 * np.pi * np.cumsum(freq) / SAMPLE_RATE
+    if wave_type == "square":
+        signal = np.sign(np.sin(phase))
+    elif wave_type == "saw":
+        signal = 2 * ((phase / (2 * np.pi)) % 1.0) - 1
+    elif wave_type == "noise":
+        signal = np.zeros(count)
+    else:
+        signal = np.sin(phase)
+    if noise > 0:
+        signal = (1 - noise) * signal + noise * rng.uniform(-1.0, 1.0, count)
+
+    # Linear attack, then a power-curve decay to silence
+    t = np.arange(count) / SAMPLE_RATE
+    envelope = np.clip(t / attack, 0.0, 1.0) if attack > 0 else np.ones(count)
+    envelope *= (1 - t / duration) ** decay
+    return signal * envelope
+
+def synthesize(recipe):
+    """Returns the recipe rendered as mono int16 samples."""
+    rng = np.random.default_rng(int(recipe_hash(recipe), 16)) # Same recipe, same noise
+    if "notes" in recipe:
+        parts = [_tone(recipe["wave"], note, note, recipe["duration"], recipe["noise"], recipe["attack"], recipe["decay"], rng)
+                 for note in recipe["notes"]]
+        signal = np.concatenate(parts)
+    else:
+        start_freq, end_freq = recipe["freq"]
+        signal = _tone(recipe["wave"], start_freq, end_freq, recipe["duration"], recipe["noise"], recipe["attack"], recipe["decay"], rng)
+    return (np.clip(signal * recipe["volume"], -1.0, 1.0) * 32767).astype(np.int16)
+
+class SoundBank:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def has_recipe(self, name):
+        return name in SYNTH_RECIPES
+
+    def cached_path(self, name):
+        return os.path.join(self.cache_dir, f"{name}-{recipe_hash(SYNTH_RECIPES[name])}.wav")
+
+    def sound(self, name):
+        """Returns a Sound for the named recipe, synthesizing and caching it if needed.
+        Safe to call from a loader worker thread."""
+        path = self.cached_path(name)
+        if not os.path.exists(path):
+            if np is None:
+                raise pygame.error(f"no sound file for '{name}' and NumPy is not available to synthesize one")
+            self._write_wav(path, synthesize(SYNTH_RECIPES[name]))
+            print(f"Synthesized stand-in sound: {name}")
+        return pygame.mixer.Sound(path) # The mixer converts to its own format on load
+
+    def _write_wav(self, path, samples):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with wave.open(temp_path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            f.writeframes(samples.astype("<i2").tobytes())
+        os.replace(temp_path, path)
@@ -0,0 +1,27 @@
+import time
+
+# Startup timing
+# Records how long each startup step takes so we can see where the time goes
+# between launching the game and the first menu frame.
+
+class StartupTimer:
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.last_time = self.start_time
+        self.steps = [] # List of (label, milliseconds) in the order they happened
+
+    def mark(self, label):
+        """Records the time spent since the previous mark under the given label."""
+        now = time.perf_counter()
+        self.steps.append((label, (now - self.last_time) * 1000))
+        self.last_time = now
+
+    def total_ms(self):
+        return (self.last_time - self.start_time) * 1000
+
+    def report(self):
+        """Prints a breakdown of every recorded step and the total startup time."""
+        print("--- Startup time breakdown ---")
+        for label, ms in self.steps:
+            print(f"  {label:<24} {ms:8.1f} ms")
+        print(f"  {'total':<24} {self.total_ms():8.1f} ms")
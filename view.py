@@ -0,0 +1,164 @@
+import pygame
+
+# World view
+# The world is laid out in fixed coordinates (wall rects, sprite sizes, light
+# positions), 800x600 of which fit on the screen. A View draws in those
+# coordinates onto a target surface: positions are taken relative to its
+# origin (the camera's top-left corner, see camera.py) and multiplied by its
+# scale, along with every size. The same drawing
+# code can then render straight onto the screen (scale 1.0) or into a smaller
+# offscreen surface that is scaled up once per frame, which is much cheaper on
+# weak hardware because every full-frame pass (background, lighting) touches
+# a quarter of the pixels at 0.5x.
+#
+# Sprites are scaled once per size and cached. Text is not scaled as a
+# bitmap: render it at font_size() so it stays readable at any scale.
+#
+# The window works the same way: the game keeps its 800x600 logical layout
+# and fit_viewport() picks the largest area of the window with that aspect
+# ratio. Menus and the HUD draw through a View of that area, and mouse
+# positions come back through to_logical().
+
+RENDER_SCALES = (1.0, 0.75, 0.5) # Steps used by the automatic mode, highest quality first
+
+def fit_viewport(window_size, logical_size):
+    """The centered Rect of the window that fits logical_size scaled uniformly, and that scale."""
+    scale = min(window_size[0] / logical_size[0], window_size[1] / logical_size[1])
+    width, height = round(logical_size[0] * scale), round(logical_size[1] * scale)
+    return pygame.Rect((window_size[0] - width) // 2, (window_size[1] - height) // 2, width, height), scale
+
+class View:
+    def __init__(self, surface, scale=1.0, origin=(0, 0)):
+        self.surface = surface
+        self.scale = scale
+        self.scaled_images = {} # (id(image), size) -> (image, scaled copy); the original is kept so its id stays unique
+        self.set_origin(*origin)
+
+    def set_origin(self, x, y):
+        """Sets the world position drawn at the surface's top-left corner (the camera position)."""
+        self.origin = (x, y)
+        self.identity = self.scale == 1.0 and self.origin == (0, 0) # World and surface coordinates are the same
+
+    def subview(self, surface, origin):
+        """A View of another surface at the same scale that shares this one's scaled sprites."""
+        view = View(surface, self.scale, origin)
+        view.scaled_images = self.scaled_images
+        return view
+
+    # --- World to surface coordinates ---
+
+    def to_rect(self, rect):
+        if self.identity:
+            return rect
+        rect = pygame.Rect(rect)
+        origin_x, origin_y = self.origin
+        if self.scale == 1.0:
+            return rect.move(-origin_x, -origin_y)
+        left, top = round((rect.x - origin_x) * self.scale), round((rect.y - origin_y) * self.scale)
+        return pygame.Rect(left, top, max(1, round((rect.right - origin_x) * self.scale) - left),
+                           max(1, round((rect.bottom - origin_y) * self.scale) - top))
+
+    def to_point(self, pos):
+        if self.identity:
+            return pos
+        return round((pos[0] - self.origin[0]) * self.scale), round((pos[1] - self.origin[1]) * self.scale)
+
+    def to_logical(self, pos):
+        """Maps a window position (e.g. the mouse) back to world coordinates. The surface may be a subsurface of the window."""
+        offset_x, offset_y = self.surface.get_abs_offset()
+        if self.scale == 1.0:
+            return pos[0] - offset_x + self.origin[0], pos[1] - offset_y + self.origin[1]
+        return int((pos[0] - offset_x) / self.scale) + self.origin[0], int((pos[1] - offset_y) / self.scale) + self.origin[1]
+
+    def to_length(self, length, minimum=1):
+        return max(minimum, round(length * self.scale))
+
+    def font_size(self, size):
+        return max(8, round(size * self.scale))
+
+    # --- Drawing (arguments in world coordinates) ---
+
+    def fill(self, color):
+        self.surface.fill(color)
+
+    def rect(self, color, rect, width=0, border_radius=0):
+        if self.identity:
+            pygame.draw.rect(self.surface, color, rect, width, border_radius)
+            return
+        pygame.draw.rect(self.surface, color, self.to_rect(rect), self.to_length(width) if width else 0,
+                         self.to_length(border_radius, 0) if border_radius else 0)
+
+    def ellipse(self, color, rect):
+        pygame.draw.ellipse(self.surface, color, self.to_rect(rect))
+
+    def circle(self, color, center, radius):
+        pygame.draw.circle(self.surface, color, self.to_point(center), self.to_length(radius))
+
+    def line(self, color, start, end, width=1):
+        pygame.draw.line(self.surface, color, self.to_point(start), self.to_point(end), self.to_length(width))
+
+    def polygon(self, color, points):
+        pygame.draw.polygon(self.surface, color, [self.to_point(point) for point in points])
+
+    def image(self, image, pos):
+        """Blits a sprite with its top-left corner at pos (a point or a Rect), scaled to the view."""
+        if self.identity:
+            self.surface.blit(image, pos) # The common case, kept cheap for scenes with thousands of sprites
+        elif self.scale == 1.0:
+            self.surface.blit(image, (pos[0] - self.origin[0], pos[1] - self.origin[1]))
+        else:
+            self.surface.blit(self.scaled(image), self.to_point((pos[0], pos[1])))
+
+    def text(self, text_surface, pos=None, center=None, anchor="topleft"):
+        """Blits text rendered at font_size() (so not scaled again) with its anchor (a Rect
+        attribute such as "topleft" or "bottomright") at pos, or centered on center."""
+        if center is not None:
+            self.surface.blit(text_surface, text_surface.get_rect(center=self.to_point(center)))
+        elif anchor == "topleft":
+            self.surface.blit(text_surface, self.to_point(pos))
+        else:
+            self.surface.blit(text_surface, text_surface.get_rect(**{anchor: self.to_point(pos)}))
+
+    def scaled(self, image):
+        width, height = image.get_size()
+        key = (id(image), width, height)
+        cached = self.scaled_images.get(key)
+        if cached is None:
+            size = (self.to_length(width), self.to_length(height))
+            try:
+                scaled = pygame.transform.smoothscale(image, size)
+            except ValueError: # smoothscale only takes 24 and 32 bit surfaces
+                scaled = pygame.transform.scale(image, size)
+            cached = self.scaled_images[key] = (image, scaled)
+        return cached[1]
+
+    def present(self, screen):
+        """Scales an offscreen view up onto the screen. Nothing to do when drawing straight to the screen."""
+        if self.surface is not screen:
+            pygame.transform.scale(self.surface, screen.get_size(), screen)
+
+class AutoRenderScale:
+    """Lowers the render scale one step when frames run over budget, and raises it again once
+    the frame time measured at the current scale says the next step up would still fit."""
+
+    def __init__(self, budget_ms, window=30, scales=RENDER_SCALES):
+        self.budget_ms = budget_ms
+        self.window = window # Frames averaged before each decision
+        self.scales = scales
+        self.samples = []
+
+    def update(self, scale, frame_ms):
+        """Feeds one frame's time. Returns the scale to use from now on."""
+        self.samples.append(frame_ms)
+        if len(self.samples) < self.window:
+            return scale
+        average = sum(self.samples) / len(self.samples)
+        self.samples.clear()
+        steps = [s for s in self.scales if s < scale]
+        if average > self.budget_ms * 0.9 and steps:
+            return steps[0]
+        higher = [s for s in self.scales if s > scale]
+        # Drawing cost grows roughly with the pixel count; only step up with a safety margin
+        if higher and average * (higher[-1] / scale) ** 2 < self.budget_ms * 0.6:
+            return higher[-1]
+        return scale